@@ -0,0 +1,46 @@
+import argparse
+
+from moviepy.editor import *
+
+from code.batch_manager import BatchManager
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stitch the sprint videos of several projects in one run")
+
+    parser.add_argument('projects', metavar='project', type=str, nargs='+',
+                        help='a working directory (with its config.yml) or the path of a config file in one')
+    parser.add_argument('-jobs', metavar='jobs', type=int,
+                        help='tasks and segment renders running at the same time across all projects (defaults to '
+                             'the number of CPUs)')
+    parser.add_argument('-preview', metavar='preview', type=int, nargs='?',
+                        help='Create preview clip in seconds of each video before stitching')
+    parser.add_argument('-assembly', metavar='assembly', type=str, choices=['render', 'copy'],
+                        help='How the final videos are assembled (overrides "assembly" in the configs)')
+    parser.add_argument('-backend', metavar='backend', type=str, choices=['moviepy', 'ffmpeg'],
+                        help='How the segments are rendered (overrides "backend" in the configs)')
+    parser.add_argument('-draft', action='store_true',
+                        help='Render quick low resolution drafts, cached separately in draft/')
+    parser.add_argument('-smart-render', action='store_true', default=None,
+                        help='Only re-encode the parts of a segment with a fade or an overlay on them')
+    parser.add_argument('-text-cache-dir', metavar='text_cache_dir', type=str,
+                        help=f'the rendered text cache shared by the projects (defaults to '
+                             f'{BatchManager.DEFAULT_TEXT_CACHE_DIR})')
+    parser.add_argument('-plan', action='store_true',
+                        help='Print which tasks would run and why, without building anything')
+    args = parser.parse_args()
+
+    projects = []
+    for project in args.projects:
+        if os.path.isfile(project):
+            projects.append((os.path.dirname(project) or ".", os.path.basename(project)))
+        else:
+            projects.append((project, "config.yml"))
+
+    print(f"Stitching {len(projects)} Sprint Videos")
+    batch_manager = BatchManager(projects, jobs=args.jobs, text_cache_dir=args.text_cache_dir,
+                                 subclip_duration=args.preview, assembly=args.assembly, backend=args.backend,
+                                 draft=args.draft, smart_render=args.smart_render)
+    if args.plan:
+        batch_manager.plan()
+    else:
+        batch_manager.run()
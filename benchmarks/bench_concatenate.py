@@ -0,0 +1,51 @@
+"""
+Per frame cost of the final timeline as the number of clips grows.
+
+Compares the old clip by clip concatenate_videoclips chain with TimelineManager's flat timeline.
+
+    python -m benchmarks.bench_concatenate
+"""
+import sys
+import time
+
+from moviepy.editor import *
+
+from code.timeline_manager import TimelineManager
+
+CLIP_COUNTS = [5, 10, 20, 40, 80]
+CLIP_DURATION = 2.0
+FPS = 25
+SIZE = (64, 36)
+
+
+def make_clips(count):
+    return [ColorClip(SIZE, color=(i % 255, 0, 0), duration=CLIP_DURATION).set_fps(FPS) for i in range(count)]
+
+
+def chained(clips):
+    final_clip = None
+    for clip in clips:
+        final_clip = clip if final_clip is None else concatenate_videoclips([final_clip, clip])
+    return final_clip
+
+
+def flat(clips):
+    return TimelineManager().concatenate(clips)
+
+
+def per_frame_cost(timeline, frames=200):
+    times = [timeline.duration * i / frames for i in range(frames)]
+    start = time.perf_counter()
+    for t in times:
+        timeline.get_frame(t)
+    return (time.perf_counter() - start) / frames
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10000)
+    print(f"{'clips':>6} {'chained us/frame':>18} {'flat us/frame':>15}")
+    for count in CLIP_COUNTS:
+        clips = make_clips(count)
+        chained_cost = per_frame_cost(chained(clips))
+        flat_cost = per_frame_cost(flat(clips))
+        print(f"{count:>6} {chained_cost * 1e6:>18.1f} {flat_cost * 1e6:>15.1f}")
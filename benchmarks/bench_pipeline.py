@@ -0,0 +1,208 @@
+"""
+Wall time, frames per second and peak memory of every pipeline stage on synthetic sources.
+
+Generates ffmpeg test pattern sources with a tone at different resolutions, durations and frame rates, plus a matching
+config.yml, and times each stage on its own: ingest, probe, overlay build, segment render, concatenation, watermark
+and final encode. The results are written to JSON, compare two runs with benchmarks.compare.
+
+    python -m benchmarks.bench_pipeline -out=after.json
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+from moviepy.editor import *
+
+from code.video_stitch import VideoData
+
+SOURCES = [
+    {'video': "opening.mp4", 'size': [640, 360], 'fps': 25, 'duration': 4, 'type': 'opening'},
+    {'video': "demo-720p.mp4", 'size': [1280, 720], 'fps': 30, 'duration': 6, 'ticket': "BENCH-1",
+     'description': "A 720p demo at 30 fps", 'title': "Demo"},
+    {'video': "demo-1080p.mp4", 'size': [1920, 1080], 'fps': 24, 'duration': 4, 'ticket': "BENCH-2",
+     'description': "A 1080p demo at 24 fps"},
+    {'video': "demo-480p60.mp4", 'size': [854, 480], 'fps': 60, 'duration': 3, 'ticket': "BENCH-3",
+     'background': [0, 64, 128]},
+    {'video': "closing.mp4", 'size': [640, 360], 'fps': 25, 'duration': 3, 'type': 'closing',
+     'show duration': False},
+]
+# Seconds between RSS samples
+SAMPLE_INTERVAL = 0.01
+
+
+def make_sources(dir_bench, sources):
+    for source in sources:
+        width, height = source['size']
+        duration = source['duration']
+        subprocess.run(f"ffmpeg -y -v error "
+                       f"-f lavfi -i 'testsrc2=size={width}x{height}:rate={source['fps']}:duration={duration}' "
+                       f"-f lavfi -i 'sine=frequency=440:duration={duration}' "
+                       f"-c:v libx264 -preset ultrafast -pix_fmt yuv420p -c:a aac "
+                       f"'{os.path.join(dir_bench, source['video'])}'", shell=True, check=True)
+
+    watermark = np.zeros((100, 300, 4), dtype=np.uint8)
+    watermark[:, :, :3] = 255
+    watermark[:, :, 3] = np.linspace(0, 255, 300, dtype=np.uint8)
+    Image.fromarray(watermark).save(os.path.join(dir_bench, "watermark.png"))
+
+    videos = [{key: value for key, value in source.items() if key not in ('size', 'fps', 'duration')}
+              for source in sources]
+    with open(os.path.join(dir_bench, "config.yml"), 'w') as config_file:
+        json.dump({'Sprint': "Bench", 'Project': "Bench", 'Author': "Bench",
+                   'Watermark': {'path': "watermark.png", 'height-ratio': 0.1}, 'Videos': videos}, config_file,
+                  indent=1)
+
+
+class PeakRss:
+    """
+    Samples the resident set size of this process while a stage runs. ru_maxrss can't be reset between stages.
+    """
+
+    def __init__(self):
+        self.peak = 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop.set()
+        self.thread.join()
+
+    def _sample(self):
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        while True:
+            try:
+                with open("/proc/self/statm") as statm:
+                    self.peak = max(self.peak, int(statm.read().split()[1]) * page_size)
+            except OSError:
+                # No /proc, fall back to the peak of the whole process
+                self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            if self.stop.wait(SAMPLE_INTERVAL):
+                return
+
+
+def measure(results, name, action, frames=None):
+    """
+    Run action as the stage name and record its wall time, frames per second and peak RSS. A failed stage is recorded
+    with its error and the next stages still run.
+    """
+    print(f"Stage '{name}'")
+    with PeakRss() as peak_rss:
+        start = time.perf_counter()
+        try:
+            action()
+            error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        wall = time.perf_counter() - start
+    results[name] = {
+        'wall_s': round(wall, 4),
+        'frames': frames,
+        'fps': round(frames / wall, 2) if frames and not error else None,
+        'peak_rss_mb': round(peak_rss.peak / 1024 ** 2, 1),
+        # ru_maxrss of the biggest ffmpeg run so far
+        'children_peak_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        'error': error,
+    }
+    print(f"  - {wall:.2f}s" + (f", {results[name]['fps']} fps" if results[name]['fps'] else "")
+          + (f", failed: {error}" if error else ""))
+
+
+def read_frames(clip):
+    for i in range(int(clip.duration * clip.fps)):
+        clip.get_frame(i / clip.fps)
+
+
+def commit():
+    try:
+        return subprocess.run("git rev-parse --short HEAD", shell=True, check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except subprocess.CalledProcessError:
+        return None
+
+
+def run(dir_bench, sources, jobs):
+    results = {}
+    video_data = VideoData(dir_bench, "config.yml", jobs=jobs)
+    source_frames = sum(source['duration'] * source['fps'] for source in sources)
+    state = {}
+
+    measure(results, 'ingest', video_data.prepare, source_frames)
+
+    def probe():
+        # Start from an empty probe index
+        video_data.media_probe_manager.index = {}
+        if os.path.isfile(video_data.media_probe_manager.index_file_path):
+            os.remove(video_data.media_probe_manager.index_file_path)
+        video_data.get_max_video_size()
+    measure(results, 'probe', probe, source_frames)
+
+    videos = video_data.get_segment_videos()
+
+    def overlay():
+        for video in videos:
+            video_data.title_clip(video, video['duration'])
+            video_data.text_overlay_manager.video_text_overlay_clip(video, clip_duration=video['duration'])
+    measure(results, 'overlay', overlay)
+
+    measure(results, 'segment', lambda: [video_data.prepare_clip(video).close() for video in videos], source_frames)
+
+    def concatenate():
+        video_data.prepare_clips()
+        state['timeline'] = video_data.concatenate_with_chapters()
+        read_frames(state['timeline'])
+    # The timeline runs at the highest frame rate of its clips
+    timeline_frames = sum(source['duration'] for source in sources) * max(source['fps'] for source in sources)
+    measure(results, 'concatenate', concatenate, int(timeline_frames))
+
+    def watermark():
+        state['final'] = video_data.watermark_manager.embed(state['timeline'])
+        read_frames(state['final'])
+    measure(results, 'watermark', watermark, int(timeline_frames))
+
+    output_file_path = os.path.join(dir_bench, video_data.output_file)
+    measure(results, 'final_encode', lambda: video_data.chunk_render_manager.render(state['final'], output_file_path),
+            int(timeline_frames))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic sources")
+    parser.add_argument('-out', metavar='out', type=str, default="bench.json", help='JSON file for the results')
+    parser.add_argument('-dir', metavar='dir', type=str,
+                        help='keep the sources and renders in this directory instead of a temporary one')
+    parser.add_argument('-jobs', metavar='jobs', type=int, default=1, help='jobs for the pipeline')
+    parser.add_argument('-quick', action='store_true', help='cut every source to 2 seconds')
+    args = parser.parse_args()
+
+    sources = [dict(source, duration=min(source['duration'], 2)) if args.quick else source for source in SOURCES]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dir_bench = args.dir or tmp_dir
+        os.makedirs(dir_bench, exist_ok=True)
+        make_sources(dir_bench, sources)
+        stages = run(dir_bench, sources, args.jobs)
+
+    with open(args.out, 'w') as out_file:
+        json.dump({
+            'commit': commit(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'machine': platform.platform(),
+            'cpus': os.cpu_count(),
+            'jobs': args.jobs,
+            'sources': sources,
+            'stages': stages,
+        }, out_file, indent=1)
+    print(f"Results written to {args.out}")
@@ -0,0 +1,67 @@
+"""
+Frames per second of the final timeline with and without the watermark.
+
+Compares the old full frame CompositeVideoClip with WatermarkManager's prescaled, premultiplied bounding box blend.
+
+    python -m benchmarks.bench_watermark
+"""
+import tempfile
+import time
+from unittest.mock import Mock
+
+import numpy as np
+from moviepy.editor import *
+
+from code.watermark_manager import WatermarkManager
+
+SIZES = [(640, 360), (1280, 720), (1920, 1080)]
+POSITION = ("right", "top")
+HEIGHT_RATIO = 0.1
+FRAMES = 50
+
+
+def make_watermark():
+    watermark = np.zeros((200, 400, 4), dtype=np.uint8)
+    watermark[:, :, :3] = 255
+    watermark[:, :, 3] = np.linspace(0, 255, 400, dtype=np.uint8)
+    return watermark
+
+
+def make_clip(size):
+    # A fresh frame per call, like a decoded video
+    frame = np.random.randint(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    return VideoClip(lambda t: frame.copy(), duration=FRAMES).set_fps(1)
+
+
+def composite(clip, watermark):
+    overlay = ImageClip(watermark, duration=clip.duration)
+    overlay = overlay.resize(height=int(clip.size[1] * HEIGHT_RATIO))
+    overlay = overlay.set_position(pos=POSITION).set_duration(clip.duration)
+    return CompositeVideoClip([clip, overlay])
+
+
+def blended(clip, watermark, asset_cache_dir):
+    config_manager = Mock()
+    # The scaled watermark is cached with the assets
+    config_manager.asset_cache_dir = asset_cache_dir
+    config_manager.watermark = {'position': POSITION, 'height-ratio': HEIGHT_RATIO}
+    watermark_manager = WatermarkManager(config_manager)
+    watermark_manager.watermark = watermark
+    return watermark_manager.embed(clip)
+
+
+def fps(clip):
+    start = time.perf_counter()
+    for t in range(FRAMES):
+        clip.get_frame(t)
+    return FRAMES / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    watermark = make_watermark()
+    print(f"{'size':>10} {'none fps':>10} {'composite fps':>14} {'blend fps':>10}")
+    with tempfile.TemporaryDirectory() as asset_cache_dir:
+        for size in SIZES:
+            clip = make_clip(size)
+            print(f"{size[0]:>5}x{size[1]:<4} {fps(clip):>10.1f} {fps(composite(clip, watermark)):>14.1f} "
+                  f"{fps(blended(clip, watermark, asset_cache_dir)):>10.1f}")
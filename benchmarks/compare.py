@@ -0,0 +1,55 @@
+"""
+Compare two bench_pipeline result files stage by stage.
+
+Exits with 1 when a stage got slower by more than the threshold, so it can guard a commit.
+
+    python -m benchmarks.compare before.json after.json -threshold=10
+"""
+import argparse
+import json
+import sys
+
+
+def change(before, after):
+    if not before or after is None:
+        return "     -"
+    return f"{(after - before) / before * 100:+6.1f}%"
+
+
+def compare(before, after, threshold):
+    """
+    Print the stages of both runs side by side.
+
+    :return: list of stages whose wall time grew by more than threshold percent
+    """
+    print(f"before: {before.get('commit')} {before.get('date')}, after: {after.get('commit')} {after.get('date')}")
+    print(f"{'stage':<14} {'wall s':>15} {'':>7} {'fps':>17} {'':>7} {'peak rss mb':>17} {'':>7}")
+    slower = []
+    for name, stage in after['stages'].items():
+        old = before['stages'].get(name, {})
+        if stage.get('error') or old.get('error'):
+            print(f"{name:<14} failed: {stage.get('error') or old.get('error')}")
+            continue
+        print(f"{name:<14} {old.get('wall_s', 0):>7.2f} {stage['wall_s']:>7.2f}"
+              f" {change(old.get('wall_s'), stage['wall_s'])}"
+              f" {old.get('fps') or 0:>8.1f} {stage['fps'] or 0:>8.1f} {change(old.get('fps'), stage['fps'])}"
+              f" {old.get('peak_rss_mb', 0):>8.1f} {stage['peak_rss_mb']:>8.1f}"
+              f" {change(old.get('peak_rss_mb'), stage['peak_rss_mb'])}")
+        if old.get('wall_s') and (stage['wall_s'] - old['wall_s']) / old['wall_s'] * 100 > threshold:
+            slower.append(name)
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare two bench_pipeline result files")
+    parser.add_argument('before', type=str)
+    parser.add_argument('after', type=str)
+    parser.add_argument('-threshold', metavar='threshold', type=float, default=10,
+                        help='percentage of extra wall time that counts as a regression')
+    args = parser.parse_args()
+
+    with open(args.before) as before_file, open(args.after) as after_file:
+        slower = compare(json.load(before_file), json.load(after_file), args.threshold)
+    if slower:
+        print(f"Slower by more than {args.threshold}%: {', '.join(slower)}")
+        sys.exit(1)
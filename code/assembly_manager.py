@@ -0,0 +1,122 @@
+import subprocess
+from collections import Counter
+
+from moviepy.editor import *
+
+from code.profile_manager import profile_manager
+
+
+class AssemblyManager:
+    """
+    Joins the rendered segments into the final video with ffmpeg's concat demuxer and stream copy.
+
+    Segments whose stream parameters differ from the rest are re-encoded to match first, all others are never decoded.
+    """
+
+    # Stream parameters that have to be the same in every segment for a stream copy join
+    STREAM_KEYS = ('codec', 'profile', 'width', 'height', 'pix_fmt', 'r_frame_rate', 'audio_codec', 'sample_rate',
+                   'channels')
+
+    def __init__(self, config_manager, media_probe_manager, cache_manager):
+        self.config_manager = config_manager
+        self.media_probe_manager = media_probe_manager
+        self.cache_manager = cache_manager
+        self.dir = self.config_manager.dir
+
+    def concat(self, segment_file_paths, output_file_path):
+        """
+        ffmpeg -f concat -safe 0 -i segments.txt -c copy output.mp4
+
+        :param segment_file_paths: list of segment paths, in timeline order
+        :param output_file_path:
+        :return: the start time of every segment in the output
+        """
+        if not self.media_probe_manager.has_ffprobe():
+            raise Exception("Stream copy assembly needs ffprobe to compare the segments, install it next to ffmpeg "
+                            "or use -assembly render")
+        params = [self.probe(file_path) for file_path in segment_file_paths]
+        reference, _ = Counter(param['streams'] for param in params).most_common(1)[0]
+
+        start_times = []
+        total_duration = 0
+        file_paths = []
+        for file_path, param in zip(segment_file_paths, params):
+            if param['streams'] != reference:
+                print(f"  - Segment '{os.path.basename(file_path)}' does not match, re-encoding")
+                file_path = self.conform(file_path, dict(reference))
+            file_paths.append(file_path)
+            start_times.append(total_duration)
+            total_duration += param['duration']
+
+        print(f"Joining {len(file_paths)} segments with stream copy")
+        self.join(file_paths, output_file_path)
+
+        return start_times
+
+    def join(self, file_paths, output_file_path, audio_file_path=None):
+        """
+        Join files with the same stream parameters with stream copy, nothing is decoded.
+
+        :param file_paths: list of paths, in timeline order
+        :param output_file_path:
+        :param audio_file_path: audio track to use instead of the audio of the files
+        """
+        list_file_path = os.path.splitext(output_file_path)[0] + ".segments.txt"
+        with open(list_file_path, 'w') as list_file:
+            for file_path in file_paths:
+                escaped = os.path.abspath(file_path).replace("'", "'\\''")
+                list_file.write(f"file '{escaped}'\n")
+
+        audio = f"-i '{audio_file_path}' -map 0:v -map 1:a " if audio_file_path else ""
+        command = (f"ffmpeg -y -f concat -safe 0 -i '{list_file_path}' {audio}-c copy -movflags +faststart "
+                   f"'{output_file_path}'")
+        try:
+            with profile_manager.span("ffmpeg join", 'ffmpeg', files=len(file_paths)):
+                subprocess.run(command, shell=True, check=True)
+        finally:
+            os.remove(list_file_path)
+
+    def conform(self, input_file_path, reference):
+        """
+        Re-encode a segment to the reference stream parameters, the result is cached in cache/conform.
+        """
+        # Segment names are already content keys
+        segment_key = os.path.splitext(os.path.basename(input_file_path))[0]
+        conform_key = self.cache_manager.key('conform', segment_key, reference)
+        conform_file_path = self.cache_manager.get_path('conform', conform_key, '.mp4')
+
+        if not os.path.isfile(conform_file_path):
+            tmp_file_path = conform_file_path + '.part'
+            video_filter = (f"scale={reference['width']}:{reference['height']},fps={reference['r_frame_rate']},"
+                            f"format={reference['pix_fmt']}")
+            if 'sample_rate' not in reference:
+                audio = "-an"
+            else:
+                audio = f"-c:a aac -ar {reference['sample_rate']} -ac {reference['channels']}"
+                if 'sample_rate' not in dict(self.probe(input_file_path)['streams']):
+                    # Silent track for segments without audio, so the audio stream runs through the whole video
+                    audio = f"-f lavfi -i anullsrc -map 0:v -map 1:a -shortest {audio}"
+            command = (f"ffmpeg -y -i '{input_file_path}' {audio} -vf '{video_filter}' -c:v libx264 "
+                       f"-preset medium -f mp4 '{tmp_file_path}'")
+            try:
+                with profile_manager.span("ffmpeg conform", 'ffmpeg', file=os.path.basename(input_file_path)):
+                    subprocess.run(command, shell=True, check=True)
+                os.replace(tmp_file_path, conform_file_path)
+            finally:
+                if os.path.isfile(tmp_file_path):
+                    os.remove(tmp_file_path)
+
+        self.cache_manager.touch('conform', conform_file_path)
+        return conform_file_path
+
+    def probe(self, file_path):
+        """
+        Read the stream parameters that have to match for a stream copy join.
+
+        :return: {'duration': float, 'streams': tuple of (name, value) pairs}
+        """
+        info = self.media_probe_manager.probe(file_path)
+        return {
+            'duration': info['duration'],
+            'streams': tuple((key, info[key]) for key in self.STREAM_KEYS if key in info),
+        }
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import time
+import uuid
+
+import numpy as np
+import requests
+from moviepy.editor import *
+
+
+class AssetCacheManager:
+    """
+    Keeps small remote assets, like the watermark image, in a cache shared by every working directory.
+
+    A fetched asset is stored with its ETag and Last-Modified headers. Within asset_max_age seconds of the last check
+    the cached copy is used without asking the server, after that it is revalidated with a conditional request, which
+    costs a 304 and no body when nothing changed. When the server can't be reached the cached copy is used, so a run
+    works offline once the asset has been fetched. Arrays derived from an asset (decoded or scaled images) are cached
+    next to it as .npz files, keyed by what they were made from.
+    """
+
+    DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sprint_video_stitcher", "assets")
+    TIMEOUT = 5
+
+    def __init__(self, config_manager):
+        self.config_manager = config_manager
+
+    def get_dir(self):
+        dir_assets = self.config_manager.asset_cache_dir or self.DEFAULT_DIR
+        os.makedirs(dir_assets, exist_ok=True)
+        return dir_assets
+
+    def fetch(self, url):
+        """
+        The cached copy of url, fetched or revalidated when it is missing or older than asset_max_age.
+
+        :param url: asset URL
+        :return: (file path, sha256 of the content)
+        """
+        info_file_path = os.path.join(self.get_dir(), hashlib.sha1(url.encode('utf-8')).hexdigest() + ".json")
+        info = self._read_info(info_file_path)
+        if info is not None and not os.path.isfile(self._get_file_path(info['sha256'])):
+            info = None
+        if info is not None and time.time() - info['checked'] < self.config_manager.asset_max_age:
+            return self._get_file_path(info['sha256']), info['sha256']
+
+        headers = {}
+        if info is not None and info.get('etag'):
+            headers['If-None-Match'] = info['etag']
+        if info is not None and info.get('last_modified'):
+            headers['If-Modified-Since'] = info['last_modified']
+
+        try:
+            response = requests.get(url, headers=headers, timeout=self.TIMEOUT)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except requests.RequestException as e:
+            if info is None:
+                raise Exception(f"Could not fetch {url} and there is no cached copy: {e}")
+            print(f"Could not revalidate {url} ({type(e).__name__}), using the cached copy")
+            return self._get_file_path(info['sha256']), info['sha256']
+
+        if response.status_code == 304:
+            info['checked'] = time.time()
+        else:
+            # Content is stored under its hash, so the info never points at a file that is half replaced
+            info = {'url': url,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'sha256': hashlib.sha256(response.content).hexdigest(),
+                    'checked': time.time()}
+            tmp_file_path = self._tmp(self._get_file_path(info['sha256']))
+            with open(tmp_file_path, 'wb') as asset_file:
+                asset_file.write(response.content)
+            os.replace(tmp_file_path, self._get_file_path(info['sha256']))
+        self._write_info(info_file_path, info)
+        return self._get_file_path(info['sha256']), info['sha256']
+
+    def array(self, key, build):
+        """
+        A numpy array derived from an asset, built once and then loaded from the cache.
+
+        :param key: JSON serialisable list of everything the array is made from
+        :param build: function that makes the array
+        :return: numpy array
+        """
+        file_path = os.path.join(self.get_dir(), hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest() + ".npz")
+        try:
+            with np.load(file_path) as cached:
+                return cached['array']
+        except (OSError, KeyError, ValueError):
+            pass
+
+        array = build()
+        # np.savez adds .npz to names without it, the temporary name keeps the extension
+        tmp_file_path = self._tmp(file_path) + ".npz"
+        np.savez(tmp_file_path, array=array)
+        os.replace(tmp_file_path, file_path)
+        return array
+
+    def _get_file_path(self, sha256):
+        return os.path.join(self.get_dir(), sha256)
+
+    def _read_info(self, file_path):
+        try:
+            with open(file_path) as info_file:
+                return json.load(info_file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_info(self, file_path, info):
+        tmp_file_path = self._tmp(file_path)
+        with open(tmp_file_path, 'w') as info_file:
+            json.dump(info, info_file, indent=1)
+        os.replace(tmp_file_path, file_path)
+
+    def _tmp(self, file_path):
+        # Workers of a run may write the same asset at once, each writes its own file and the last rename wins
+        return f"{file_path}.{uuid.uuid4().hex}.part"
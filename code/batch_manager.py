@@ -0,0 +1,182 @@
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from moviepy.editor import *
+
+from code.build_graph_manager import BuildGraphManager
+from code.chunk_render_manager import ChunkRenderManager
+from code.segment_render_manager import SegmentRenderManager
+from code.video_stitch import VideoData
+
+
+class BatchManager:
+    """
+    Builds the videos of several projects in one run, e.g. the sprint video of every team.
+
+    The task graphs of all projects run as one graph on a shared, bounded pool: jobs threads for the tasks and one
+    process pool for the segment renders and the chunks of the final encodes, so the ingest of one project overlaps
+    the renders of another and no more than jobs tasks run at a time. A source that several projects use, like a
+    shared intro or outro, is ingested once and linked into the other working directories along with its probe.
+    Rendered text goes to one shared cache, the downloads and the watermark come from the user cache already.
+    """
+
+    DEFAULT_TEXT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sprint_video_stitcher", "text")
+
+    def __init__(self, projects, jobs=None, text_cache_dir=None, **options):
+        """
+        :param projects: list of (working directory, config file name)
+        :param jobs: tasks and segment renders running at the same time, across all projects
+        :param text_cache_dir: the text cache shared by the projects
+        :param options: VideoData arguments for every project, e.g. draft or backend
+        """
+        self.jobs = max(1, int(jobs or os.cpu_count() or 1))
+        self.text_cache_dir = text_cache_dir or self.DEFAULT_TEXT_CACHE_DIR
+        self.video_data = {}
+        for dir, config in projects:
+            label = self.get_label(dir, config)
+            self.video_data[label] = VideoData(dir=dir, config=config, jobs=self.jobs,
+                                               text_cache_dir=self.text_cache_dir, **options)
+        # Transport stream key -> (label, file path) of the project that ingested it first
+        self.ingested = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+        self.linked = 0
+
+    def get_label(self, dir, config):
+        """
+        :return: a unique name for the project, its directory name and the config when it isn't config.yml
+        """
+        label = os.path.basename(os.path.normpath(os.path.abspath(dir)))
+        if config != "config.yml":
+            label = f"{label}:{os.path.splitext(config)[0]}"
+        count = sum(existing.split('#')[0] == label for existing in self.video_data)
+        return f"{label}#{count + 1}" if count else label
+
+    def run(self):
+        """
+        Build every project, a project that fails does not stop the others.
+
+        :return: dict of task name -> (status, seconds, message), task names are prefixed with the project label
+        """
+        start = time.perf_counter()
+        executor = ProcessPoolExecutor(max_workers=self.jobs) if self.jobs > 1 else None
+        try:
+            for video_data in self.video_data.values():
+                video_data.segment_render_manager = SegmentRenderManager(video_data, jobs=self.jobs,
+                                                                         executor=executor)
+                video_data.chunk_render_manager = ChunkRenderManager(video_data, jobs=self.jobs, executor=executor)
+            results = self.build_graph().run()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        seconds = time.perf_counter() - start
+
+        for video_data in self.video_data.values():
+            video_data.cache_manager.prune()
+        self.print_report(results, seconds)
+
+        failed = [name for name, result in results.items() if result[0] == BuildGraphManager.FAILED]
+        if failed:
+            raise Exception(f"Batch failed for {len(failed)} tasks")
+        return results
+
+    def plan(self):
+        """
+        Print which tasks the batch would build and why, without rendering anything
+        """
+        self.build_graph().print_plan()
+
+    def build_graph(self):
+        """
+        The graphs of all projects as one, with the ingest of shared sources deduplicated
+        """
+        graph = BuildGraphManager(None, jobs=self.jobs)
+        for label, video_data in self.video_data.items():
+            project_graph = video_data.build_graph()
+            # Named as in VideoData.build_graph
+            for name, videos in video_data.ingest_manager.group(video_data.videos).items():
+                project_graph.tasks[f"ingest:{name}"].action = self.ingest_action(label, videos[0], name)
+            graph.include(project_graph, f"{label}/")
+        return graph
+
+    def ingest_action(self, label, video, name):
+        """
+        VideoData.ingest_action, but a source that another project ingested already is linked instead of converted
+        """
+        video_data = self.video_data[label]
+        ingest = video_data.ingest_action(video, os.path.join(video_data.dir, name))
+
+        def action():
+            video_data.download_manager.download(video)
+            if not os.path.isfile(video_data.ingest_manager.get_file_path(video)):
+                return ingest()
+
+            key = video_data.transport_stream_manager.get_key(video)
+            with self.lock:
+                lock = self.locks.setdefault(key, threading.Lock())
+            # The first project converts the source, the others wait for it and link the result
+            with lock:
+                if key in self.ingested:
+                    self.link(self.ingested[key], label, video)
+                ingest()
+                self.ingested.setdefault(key, (label, video_data.transport_stream_manager.get_file_path(video)))
+        return action
+
+    def link(self, source, label, video):
+        """
+        Hard link (or copy) the transport stream another project made into the working directory of label, and
+        record its probe there so it is not probed again.
+
+        :param source: (label, file path) of the transport stream
+        """
+        source_label, source_file_path = source
+        video_data = self.video_data[label]
+        file_path = video_data.transport_stream_manager.get_file_path(video)
+        if os.path.isfile(file_path) or not os.path.isfile(source_file_path):
+            return
+
+        tmp_file_path = file_path + '.part'
+        try:
+            try:
+                os.link(source_file_path, tmp_file_path)
+            except OSError:
+                shutil.copyfile(source_file_path, tmp_file_path)
+            os.replace(tmp_file_path, file_path)
+        finally:
+            if os.path.isfile(tmp_file_path):
+                os.remove(tmp_file_path)
+
+        info = self.video_data[source_label].media_probe_manager.probe(source_file_path)
+        video_data.media_probe_manager.add(file_path, info)
+        with self.lock:
+            self.linked += 1
+        print(f"  - {video['video']}: shared with {source_label}")
+
+    def print_report(self, results, seconds):
+        """
+        Print what every project built and the throughput of the whole batch
+        """
+        print("Batch report:")
+        total_work = 0
+        total_duration = 0
+        for label, video_data in self.video_data.items():
+            project_results = [result for name, result in results.items() if name.startswith(f"{label}/")]
+            counts = {status: sum(result[0] == status for result in project_results)
+                      for status in (BuildGraphManager.RUN, BuildGraphManager.UP_TO_DATE, BuildGraphManager.FAILED)}
+            work = sum(result[1] for result in project_results)
+            # Known once the videos are sized, the output is the segments back to back
+            duration = sum(video.get('duration', 0) for video in video_data.get_segment_videos())
+            output_file_path = os.path.join(video_data.dir, video_data.output_file)
+            size = os.path.getsize(output_file_path) if os.path.isfile(output_file_path) else 0
+            print(f"  {label}: {counts[BuildGraphManager.RUN]} tasks run, "
+                  f"{counts[BuildGraphManager.UP_TO_DATE]} up to date, {counts[BuildGraphManager.FAILED]} failed, "
+                  f"{work:.1f}s of work, {duration:.1f}s of video ({size / 1024 ** 2:.1f} MB)")
+            total_work += work
+            total_duration += duration
+
+        print(f"  Total: {len(self.video_data)} projects in {seconds:.1f}s with {self.jobs} jobs, "
+              f"{total_work:.1f}s of work ({total_work / max(seconds, 0.001):.1f}x parallel)")
+        print(f"  Throughput: {total_duration:.1f}s of video, {total_duration / max(seconds, 0.001):.1f}x realtime, "
+              f"{self.linked} shared sources ingested once")
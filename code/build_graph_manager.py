@@ -0,0 +1,260 @@
+import json
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from moviepy.editor import *
+
+from code.profile_manager import profile_manager
+
+
+class Task:
+    """
+    A step of the pipeline.
+
+    :param name: stable, unique name, used to record the fingerprint and timings between runs
+    :param action: callable that builds the outputs
+    :param deps: names of the tasks that have to finish first
+    :param fingerprint: callable returning a JSON serialisable value over all inputs, may raise while the inputs are
+                        not built yet
+    :param outputs: callable returning the paths the task writes
+    :param keyed_outputs: the output paths are derived from the fingerprint, so existing outputs are up to date
+    :param always: run on every build, and while planning, e.g. cheap steps that set up state for later tasks.
+                   They don't make the tasks after them stale.
+    """
+
+    def __init__(self, name, action, deps=(), fingerprint=None, outputs=None, keyed_outputs=False, always=False):
+        self.name = name
+        self.action = action
+        self.deps = list(deps)
+        self.fingerprint = fingerprint or (lambda: None)
+        self.outputs = outputs or (lambda: [])
+        self.keyed_outputs = keyed_outputs
+        self.always = always
+
+
+class BuildGraphManager:
+    """
+    Runs the pipeline as a graph of tasks, make style: a task only runs when its outputs are missing, its input
+    fingerprint changed since the last build, or a task it depends on ran.
+
+    Fingerprints and per task timings are kept in cache/build_state.json, or draft/cache/build_state.json for drafts.
+    The graphs of several projects can be run as one, see include, each keeps its state in its own working directory.
+    """
+
+    RUN = 'run'
+    UP_TO_DATE = 'up to date'
+    FAILED = 'failed'
+    SKIPPED = 'skipped'
+
+    def __init__(self, config_manager, jobs=1, draft=False):
+        """
+        :param config_manager: None for a graph that only runs the tasks of included graphs, it has no state file
+        """
+        self.config_manager = config_manager
+        self.dir = None
+        self.state_file_path = None
+        if config_manager is not None:
+            self.dir = os.path.join(self.config_manager.dir, "draft") if draft else self.config_manager.dir
+            self.state_file_path = os.path.join(self.dir, "cache/build_state.json")
+        self.jobs = max(1, int(jobs or 1))
+        self.tasks = {}
+        # prefix -> included graph, see include
+        self.graphs = {}
+        self.lock = threading.Lock()
+
+    def add(self, task):
+        if task.name in self.tasks:
+            raise Exception(f"Task '{task.name}' is defined twice")
+        missing = [dep for dep in task.deps if dep not in self.tasks]
+        if missing:
+            raise Exception(f"Task '{task.name}' depends on unknown tasks {missing}")
+        self.tasks[task.name] = task
+        return task
+
+    def include(self, graph, prefix):
+        """
+        Add all tasks of graph, with prefix in front of their names. They run on this graph's threads, next to its
+        other tasks, but their fingerprints and timings stay in the state file of graph.
+
+        :param graph: BuildGraphManager, e.g. of another project
+        :param prefix: unique per included graph, e.g. "team-a/"
+        """
+        if prefix in self.graphs:
+            raise Exception(f"A graph is already included as '{prefix}'")
+        for task in graph.tasks.values():
+            self.add(Task(prefix + task.name, task.action, deps=[prefix + dep for dep in task.deps],
+                          fingerprint=task.fingerprint, outputs=task.outputs, keyed_outputs=task.keyed_outputs,
+                          always=task.always))
+        self.graphs[prefix] = graph
+
+    def plan(self):
+        """
+        Work out which tasks would run and why, without building anything. Tasks marked always are run while
+        planning when everything they depend on is up to date, so the tasks after them can be fingerprinted.
+
+        :return: list of (task name, will run, reason) in build order
+        """
+        state = self._read_state()
+        will_run = set()
+        blocked = set()
+        plan = []
+        for task in self.tasks.values():
+            reason = self._stale_reason(task, state, [dep for dep in task.deps if dep in will_run])
+            if task.always:
+                if any(dep in will_run or dep in blocked for dep in task.deps):
+                    blocked.add(task.name)
+                else:
+                    task.action()
+            elif reason:
+                will_run.add(task.name)
+            plan.append((task.name, bool(reason), reason or self.UP_TO_DATE))
+        return plan
+
+    def print_plan(self):
+        plan = self.plan()
+        print("Build plan:")
+        for name, run, reason in plan:
+            print(f"  {'RUN ' if run else 'SKIP'} {name}: {reason}")
+        print(f"{sum(run for _, run, _ in plan)} of {len(plan)} tasks would run")
+
+    def run(self):
+        """
+        Build all stale tasks, independent tasks run in parallel on up to jobs threads.
+        A failing task does not stop the tasks that don't depend on it.
+
+        :return: dict of task name -> (status, seconds, message)
+        """
+        state = self._read_state()
+        results = {}
+        ran = set()
+        pending = dict(self.tasks)
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            running = {}
+            while pending or running:
+                for name, task in list(pending.items()):
+                    statuses = [results[dep][0] for dep in task.deps if dep in results]
+                    if len(statuses) < len(task.deps):
+                        continue
+                    del pending[name]
+                    if any(status in (self.FAILED, self.SKIPPED) for status in statuses):
+                        results[name] = (self.SKIPPED, 0, "a dependency failed")
+                        continue
+                    reason = self._stale_reason(task, state, [dep for dep in task.deps if dep in ran])
+                    if not reason:
+                        results[name] = (self.UP_TO_DATE, 0, self.UP_TO_DATE)
+                        continue
+                    print(f"Task {name}: {reason}")
+                    running[executor.submit(self._run_task, task, state)] = name
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    if results[name][0] == self.RUN and not self.tasks[name].always:
+                        ran.add(name)
+
+        self._write_state(state)
+        self.print_summary(results)
+        return results
+
+    def print_summary(self, results):
+        print("Build summary:")
+        for status in (self.RUN, self.UP_TO_DATE, self.FAILED, self.SKIPPED):
+            names = [name for name, result in results.items() if result[0] == status]
+            print(f"  {status}: {len(names)}")
+            if status in (self.FAILED, self.SKIPPED):
+                for name in names:
+                    print(f"    - {name}: {results[name][2]}")
+
+        timings = sorted(((result[1], name) for name, result in results.items() if result[0] == self.RUN),
+                         reverse=True)
+        if timings:
+            print("Task timings:")
+            for seconds, name in timings:
+                print(f"  {seconds:8.2f}s {name}")
+
+    def _run_task(self, task, state):
+        start = time.perf_counter()
+        try:
+            with profile_manager.span(task.name, 'task'):
+                task.action()
+            fingerprint = task.fingerprint()
+        except Exception as e:
+            seconds = time.perf_counter() - start
+            print(f"Task {task.name} failed: {type(e).__name__}: {e}")
+            return self.FAILED, seconds, f"{type(e).__name__}: {e}"
+
+        seconds = time.perf_counter() - start
+        with self.lock:
+            state[task.name] = {'fingerprint': fingerprint, 'seconds': seconds, 'finished': time.time()}
+        return self.RUN, seconds, "built"
+
+    def _stale_reason(self, task, state, rebuilt_deps):
+        """
+        :return: why the task has to run, or None when it is up to date
+        """
+        if task.always:
+            return 'runs every build'
+        if rebuilt_deps:
+            return f"{rebuilt_deps[0]} runs first" if len(rebuilt_deps) == 1 \
+                else f"{len(rebuilt_deps)} dependencies run first"
+        try:
+            fingerprint = task.fingerprint()
+            outputs = task.outputs()
+        except Exception:
+            return 'inputs not built yet'
+        missing = [output for output in outputs if not os.path.isfile(output)]
+        if missing:
+            return f"output {os.path.basename(missing[0])} missing"
+        if task.keyed_outputs:
+            return None
+        recorded = state.get(task.name)
+        if recorded is None:
+            return 'never built'
+        if self._normalise(fingerprint) != recorded.get('fingerprint'):
+            return 'inputs changed'
+        return None
+
+    def _normalise(self, value):
+        # Compare fingerprints the way they come back from the state file
+        return json.loads(json.dumps(value, sort_keys=True, default=str))
+
+    def _read_state(self):
+        state = self._read_state_file()
+        for prefix, graph in self.graphs.items():
+            state.update({prefix + name: entry for name, entry in graph._read_state().items()})
+        return state
+
+    def _read_state_file(self):
+        if self.state_file_path is None:
+            return {}
+        try:
+            with open(self.state_file_path) as state_file:
+                return json.load(state_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_state(self, state):
+        state = self._normalise(state)
+        for prefix, graph in self.graphs.items():
+            graph._write_state({name[len(prefix):]: entry for name, entry in state.items() if name.startswith(prefix)})
+        state = {name: entry for name, entry in state.items()
+                 if not any(name.startswith(prefix) for prefix in self.graphs)}
+        if self.state_file_path is None:
+            return
+
+        dir_state = os.path.dirname(self.state_file_path)
+        if not os.path.exists(dir_state):
+            os.makedirs(dir_state, exist_ok=True)
+        # Keep the state of tasks that are not part of this graph, e.g. videos that are skipped for now
+        merged = self._read_state_file()
+        merged.update(state)
+        fd, tmp_file_path = tempfile.mkstemp(dir=dir_state, suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(merged, tmp_file, indent=1, sort_keys=True)
+        os.replace(tmp_file_path, self.state_file_path)
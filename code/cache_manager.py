@@ -0,0 +1,216 @@
+import fcntl
+import hashlib
+import json
+import tempfile
+import threading
+import time
+
+from moviepy.editor import *
+
+
+class CacheManager:
+    """
+    One cache layer for the rendered files in stage/, ts/, cache/, cache/conform/ and cache/chunks/.
+
+    File names are content derived keys: a hash over everything that affects the output, starting from a fingerprint
+    of the source file. A changed input therefore never picks up a stale file, it just gets a new key.
+    Every file used by a run is recorded with its size and last use in cache/manifest.json, and the least recently
+    used files are evicted once the total size goes past the cap.
+
+    Draft runs keep the same layout in a separate draft/ directory, so proxies never mix with full renders.
+    """
+
+    # The stages this cache manages, with their directory relative to the working directory
+    STAGES = {
+        'stage': "stage/",
+        'ts': "ts/",
+        'segment': "cache/",
+        'conform': "cache/conform/",
+        'chunk': "cache/chunks/",
+    }
+    # Bytes read from the start and the end of a source for its fingerprint
+    FINGERPRINT_BYTES = 1024 ** 2
+    # Seconds since its last write after which a .part file counts as left over from an interrupted render, younger
+    # ones may still be written by another run
+    PART_MAX_AGE = 3600
+
+    def __init__(self, config_manager, max_size_gb=None, draft=False):
+        self.config_manager = config_manager
+        self.dir = os.path.join(self.config_manager.dir, "draft") if draft else self.config_manager.dir
+        self.manifest_file_path = os.path.join(self.dir, "cache/manifest.json")
+        self.max_size = (max_size_gb if max_size_gb else self.config_manager.cache_size_gb) * 1024 ** 3
+        self.fingerprints = {}
+        self.lock = threading.Lock()
+
+    def get_dir(self, stage):
+        dir_stage = os.path.join(self.dir, self.STAGES[stage])
+        if not os.path.exists(dir_stage):
+            os.makedirs(dir_stage, exist_ok=True)
+        return dir_stage
+
+    def get_path(self, stage, key, ext):
+        return os.path.join(self.get_dir(stage), key + ext)
+
+    def key(self, *parts):
+        """
+        :param parts: JSON serialisable values that affect the output
+        :return: hex digest over all parts
+        """
+        key_str = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha1(key_str.encode('utf-8')).hexdigest()
+
+    def fingerprint(self, file_path):
+        """
+        Content derived fingerprint of a file: its size plus a hash of its first and last megabyte.
+        Memoised while the size and modification time stay the same.
+        """
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+        with self.lock:
+            fingerprint = self.fingerprints.get(memo_key)
+        if fingerprint is None:
+            digest = hashlib.sha1(str(stat.st_size).encode('utf-8'))
+            with open(file_path, 'rb') as source_file:
+                digest.update(source_file.read(self.FINGERPRINT_BYTES))
+                if stat.st_size > 2 * self.FINGERPRINT_BYTES:
+                    source_file.seek(-self.FINGERPRINT_BYTES, os.SEEK_END)
+                    digest.update(source_file.read(self.FINGERPRINT_BYTES))
+            fingerprint = digest.hexdigest()
+            with self.lock:
+                self.fingerprints[memo_key] = fingerprint
+        return fingerprint
+
+    def touch(self, stage, file_path):
+        """
+        Record that file_path was created or used by this run.
+        """
+        if not os.path.isfile(file_path):
+            return
+        entry = {'stage': stage, 'size': os.path.getsize(file_path), 'last_used': time.time()}
+        self._update_manifest(lambda manifest: manifest.update({self._relpath(file_path): entry}))
+
+    def stats(self):
+        """
+        :return: dict of stage -> {'files': int, 'size': bytes}, plus 'total' and 'max_size'
+        """
+        manifest = self._read_manifest()
+        stats = {stage: {'files': 0, 'size': 0} for stage in self.STAGES}
+        for entry in manifest.values():
+            stats[entry['stage']]['files'] += 1
+            stats[entry['stage']]['size'] += entry['size']
+        stats['total'] = {
+            'files': sum(stage['files'] for stage in stats.values()),
+            'size': sum(stage['size'] for stage in stats.values()),
+        }
+        stats['untracked'] = {
+            'files': len(self._untracked_files(manifest)),
+            'size': sum(os.path.getsize(file_path) for file_path in self._untracked_files(manifest)),
+        }
+        stats['max_size'] = self.max_size
+        return stats
+
+    def prune(self, max_size=None, untracked=False):
+        """
+        Evict the least recently used files until the cache fits in max_size.
+
+        :param max_size: bytes, defaults to the configured cap
+        :param untracked: also remove files in the cache directories that are not in the manifest, such as files
+                          from older versions or interrupted renders. A .part file written to within PART_MAX_AGE is
+                          kept, another run may be writing it.
+        :return: (files removed, bytes freed)
+        """
+        max_size = self.max_size if max_size is None else max_size
+        removed = []
+
+        def evict(manifest):
+            # Drop entries whose files were removed by hand
+            for relpath in [relpath for relpath in manifest if not os.path.isfile(self._abspath(relpath))]:
+                del manifest[relpath]
+
+            total_size = sum(entry['size'] for entry in manifest.values())
+            for relpath, entry in sorted(manifest.items(), key=lambda item: item[1]['last_used']):
+                if total_size <= max_size:
+                    break
+                removed.append((self._abspath(relpath), entry['size']))
+                total_size -= entry['size']
+                del manifest[relpath]
+
+            if untracked:
+                removed.extend((file_path, os.path.getsize(file_path))
+                               for file_path in self._untracked_files(manifest))
+
+            for file_path, _ in removed:
+                try:
+                    os.remove(file_path)
+                except FileNotFoundError:
+                    pass
+
+        self._update_manifest(evict)
+        return len(removed), sum(size for _, size in removed)
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"Cache in {self.dir}:")
+        for name in list(self.STAGES) + ['total', 'untracked']:
+            print(f"  {name}: {stats[name]['files']} files, {self._format_size(stats[name]['size'])}")
+        print(f"  max size: {self._format_size(stats['max_size'])}")
+
+    def _untracked_files(self, manifest):
+        tracked = {self._abspath(relpath) for relpath in manifest}
+        part_min_mtime = time.time() - self.PART_MAX_AGE
+        untracked = []
+        for stage, dir_stage in self.STAGES.items():
+            dir_stage = os.path.join(self.dir, dir_stage)
+            if not os.path.isdir(dir_stage):
+                continue
+            entries = list(os.scandir(dir_stage))
+            if stage == 'chunk':
+                # A directory of checkpoints per final encode
+                entries += [chunk for entry in entries if entry.is_dir() for chunk in os.scandir(entry.path)]
+            for entry in entries:
+                is_media = entry.name.endswith(('.mp4', '.m4a', '.ts', '.part'))
+                if not entry.is_file() or not is_media or os.path.abspath(entry.path) in tracked:
+                    continue
+                # Temp files end in .part, or in .part.mp4 where ffmpeg needs the extension for the format
+                is_part = entry.name.endswith('.part') or '.part.' in entry.name
+                if is_part and entry.stat().st_mtime > part_min_mtime:
+                    continue
+                untracked.append(entry.path)
+        return untracked
+
+    def _update_manifest(self, update):
+        """
+        Read, update and write the manifest under a file lock, worker processes share it.
+        """
+        dir_manifest = os.path.dirname(self.manifest_file_path)
+        if not os.path.exists(dir_manifest):
+            os.makedirs(dir_manifest, exist_ok=True)
+
+        with open(self.manifest_file_path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            manifest = self._read_manifest()
+            update(manifest)
+            fd, tmp_file_path = tempfile.mkstemp(dir=dir_manifest, suffix='.tmp')
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump(manifest, tmp_file, indent=1, sort_keys=True)
+            os.replace(tmp_file_path, self.manifest_file_path)
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_file_path) as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _relpath(self, file_path):
+        return os.path.relpath(os.path.abspath(file_path), os.path.abspath(self.dir))
+
+    def _abspath(self, relpath):
+        return os.path.join(os.path.abspath(self.dir), relpath)
+
+    def _format_size(self, size):
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024 or unit == 'GB':
+                return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+            size /= 1024
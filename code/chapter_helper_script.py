@@ -1,39 +1,27 @@
-import re
+import argparse
+import os
 
-chapters = list()
+from code.chapter_manager import ChapterManager
 
-with open('chapters.txt', 'r') as f:
-   for line in f:
-      x = re.match(r"(\d):(\d{2}):(\d{2}) (.*)", line)
-      hrs = int(x.group(1))
-      mins = int(x.group(2))
-      secs = int(x.group(3))
-      title = x.group(4)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Add chapters from a chapters.txt of \"h:mm:ss title\" lines")
 
-      minutes = (hrs * 60) + mins
-      seconds = secs + (minutes * 60)
-      timestamp = (seconds * 1000)
-      chap = {
-         "title": title,
-         "startTime": timestamp
-      }
-      chapters.append(chap)
+    parser.add_argument('-chapters', metavar='chapters', type=str, default="chapters.txt",
+                        help='the chapter list, one "h:mm:ss title" line per chapter')
+    parser.add_argument('-video', metavar='video', type=str,
+                        help='mux the chapters straight into this video with stream copy')
+    parser.add_argument('-metadata', metavar='metadata', type=str, default="FFMETADATAFILE",
+                        help='without -video, append the chapters to this ffmpeg metadata file')
+    args = parser.parse_args()
 
-text = ""
+    chapter_manager = ChapterManager(None)
+    with open(args.chapters, 'r') as chapters_file:
+        chapters = chapter_manager.parse(chapters_file)
 
-for i in range(len(chapters)-1):
-   chap = chapters[i]
-   title = chap['title']
-   start = chap['startTime']
-   end = chapters[i+1]['startTime']-1
-   text += f"""
-[CHAPTER]
-TIMEBASE=1/1000
-START={start}
-END={end}
-title={title}
-"""
-
-
-with open("FFMETADATAFILE", "a") as myfile:
-    myfile.write(text)
\ No newline at end of file
+    if args.video:
+        chapter_manager.write(args.video, chapters)
+    else:
+        # The last chapter has no END, ffmpeg ends it at the end of the video
+        header = not os.path.isfile(args.metadata)
+        with open(args.metadata, 'a') as metadata_file:
+            metadata_file.write(chapter_manager.ffmetadata(chapters, header=header))
@@ -0,0 +1,122 @@
+import re
+import subprocess
+
+from moviepy.editor import *
+
+from code.profile_manager import profile_manager
+
+
+class ChapterManager:
+    """
+    Chapters for the final video, one per clip, titled with its ticket and description.
+
+    The chapters are muxed into the output with stream copy, so nothing is encoded again, and written next to it as
+    YouTube chapter text (<output>.chapters.txt) to paste into the video description.
+
+    Chapters are dicts with the 'title', the 'start' and the 'end' in seconds. The end is None when it is not known,
+    ffmpeg then ends the chapter where the next one starts, or at the end of the file.
+    """
+
+    def __init__(self, config_manager):
+        self.config_manager = config_manager
+
+    def get_chapters(self, videos, start_times, duration=None):
+        """
+        :param videos: video config dicts, in timeline order
+        :param start_times: start time in seconds of every video in the output
+        :param duration: length of the output in seconds, if known
+        :return: list of chapters
+        """
+        ends = list(start_times[1:]) + [duration]
+        return [{'title': self.get_title(video), 'start': start, 'end': end}
+                for video, start, end in zip(videos, start_times, ends)]
+
+    def get_title(self, video):
+        title = " ".join(str(video[key]) for key in ('ticket', 'description') if video.get(key))
+        return title or video.get('title') or os.path.splitext(os.path.basename(video['video']))[0]
+
+    def parse(self, lines):
+        """
+        Chapters from "h:mm:ss title" or "m:ss title" lines, like chapters.txt or YouTube chapter text.
+
+        :param lines: iterable of lines, lines that don't start with a timestamp are skipped
+        :return: list of chapters
+        """
+        chapters = []
+        for line in lines:
+            match = re.match(r"\s*(?:(\d+):)?(\d{1,2}):(\d{2})\s+(.*\S)", line)
+            if match is None:
+                continue
+            hours, minutes, seconds, title = match.groups()
+            start = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+            chapters.append({'title': title, 'start': start, 'end': None})
+
+        for chapter, next_chapter in zip(chapters, chapters[1:]):
+            chapter['end'] = next_chapter['start']
+        return chapters
+
+    def ffmetadata(self, chapters, header=True):
+        """
+        :param chapters: list of chapters
+        :param header: start with the ;FFMETADATA1 line, leave it out to append to an existing metadata file
+        :return: the chapters in ffmpeg's metadata format
+        """
+        lines = [";FFMETADATA1"] if header else []
+        for chapter in chapters:
+            lines.extend(["", "[CHAPTER]", "TIMEBASE=1/1000", f"START={round(chapter['start'] * 1000)}"])
+            if chapter['end'] is not None:
+                lines.append(f"END={round(chapter['end'] * 1000)}")
+            lines.append(f"title={self._escape(chapter['title'])}")
+        return "\n".join(lines) + "\n"
+
+    def youtube(self, chapters):
+        """
+        :return: one "m:ss title" line per chapter, as YouTube reads them from a video description
+        """
+        return "".join(f"{self._timestamp(chapter['start'])} {chapter['title']}\n" for chapter in chapters)
+
+    def write(self, video_file_path, chapters):
+        """
+        Mux the chapters into video_file_path and write the YouTube chapter text next to it.
+
+        :return: path of the chapter text
+        """
+        self.mux(video_file_path, chapters)
+        text_file_path = os.path.splitext(video_file_path)[0] + ".chapters.txt"
+        with open(text_file_path, 'w') as text_file:
+            text_file.write(self.youtube(chapters))
+        print(f"Chapters: {len(chapters)} chapters added to {video_file_path}, YouTube chapters in {text_file_path}")
+        return text_file_path
+
+    def mux(self, video_file_path, chapters):
+        """
+        ffmpeg -i video.mp4 -i FFMETADATAFILE -map 0 -map_metadata 0 -map_chapters 1 -c copy video.mp4
+
+        Replaces the chapters of video_file_path, the streams and the other metadata are copied as they are.
+        """
+        base, extension = os.path.splitext(video_file_path)
+        metadata_file_path = base + ".ffmetadata"
+        # Keeps the extension, ffmpeg picks the muxer by it
+        tmp_file_path = base + ".chapters" + extension
+        with open(metadata_file_path, 'w') as metadata_file:
+            metadata_file.write(self.ffmetadata(chapters))
+
+        command = (f"ffmpeg -y -v error -i '{video_file_path}' -i '{metadata_file_path}' -map 0 -map_metadata 0 "
+                   f"-map_chapters 1 -c copy -movflags +faststart '{tmp_file_path}'")
+        try:
+            with profile_manager.span("ffmpeg chapters", 'ffmpeg', chapters=len(chapters)):
+                subprocess.run(command, shell=True, check=True)
+            os.replace(tmp_file_path, video_file_path)
+        finally:
+            os.remove(metadata_file_path)
+            if os.path.isfile(tmp_file_path):
+                os.remove(tmp_file_path)
+
+    def _escape(self, value):
+        # Special characters of the metadata format are escaped with a backslash
+        return re.sub(r"([=;#\\\n])", r"\\\1", value)
+
+    def _timestamp(self, seconds):
+        minutes, seconds = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
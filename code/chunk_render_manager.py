@@ -0,0 +1,166 @@
+import json
+import math
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from moviepy.editor import *
+
+from code.profile_manager import profile_manager
+
+# One final timeline per project and worker process, built for the first chunk the worker encodes
+_worker_timelines = {}
+
+
+def _encode_chunk(options, start_frame, end_frame, fps, file_path):
+    """
+    Encode frames [start_frame, end_frame) of the final timeline in a worker process.
+
+    :param options: the VideoData constructor arguments
+    :return: file_path
+    """
+    from code.video_stitch import VideoData
+
+    key = tuple(sorted(options.items()))
+    if key not in _worker_timelines:
+        video_data = VideoData(**options)
+        video_data.get_max_video_size()
+        _worker_timelines[key] = (video_data, video_data.final_clip())
+    video_data, timeline = _worker_timelines[key]
+
+    ChunkRenderManager.encode(timeline, start_frame, end_frame, fps, file_path, video_data.get_preset())
+    profile_manager.flush()
+    return file_path
+
+
+class ChunkRenderManager:
+    """
+    Encodes the final timeline in fixed time chunks on worker processes and joins them with stream copy.
+
+    Chunks are checkpoints: they are written to cache/chunks/<key>/ next to a manifest, and a run that was killed only
+    encodes the chunks that are missing. The key covers the timeline and the chunk layout, so a changed timeline never
+    picks up old chunks. The layout only depends on chunk_seconds, so a run with another number of jobs resumes too.
+    The audio is encoded once for the whole timeline, so there are no gaps at the chunk joins.
+    """
+
+    def __init__(self, video_data, jobs=None, executor=None):
+        """
+        :param executor: a ProcessPoolExecutor shared with other projects, see BatchManager. It is not shut down here.
+        """
+        self.video_data = video_data
+        self.config_manager = video_data.config_manager
+        self.cache_manager = video_data.cache_manager
+        # -jobs or jobs: in the config, the available cores when neither is set. 1 encodes in this process.
+        self.jobs = max(1, int(jobs)) if jobs else (os.cpu_count() or 1)
+        self.executor = executor
+
+    def render(self, timeline, output_file_path):
+        """
+        :param timeline: the final clip
+        :param output_file_path:
+        """
+        fps = timeline.fps
+        chunks = self.get_chunks(timeline.duration, fps)
+        dir_chunks = os.path.join(self.cache_manager.get_dir('chunk'), self.get_key(fps, chunks))
+        os.makedirs(dir_chunks, exist_ok=True)
+
+        manifest = {
+            'fps': fps,
+            'chunks': [{'start_frame': start_frame, 'end_frame': end_frame, 'file': f"{i:05d}.mp4",
+                        'done': os.path.isfile(os.path.join(dir_chunks, f"{i:05d}.mp4"))}
+                       for i, (start_frame, end_frame) in enumerate(chunks)],
+            'audio': {'file': "audio.m4a", 'done': os.path.isfile(os.path.join(dir_chunks, "audio.m4a"))}
+                     if timeline.audio is not None else None,
+        }
+        self._write_manifest(dir_chunks, manifest)
+
+        pending = [chunk for chunk in manifest['chunks'] if not chunk['done']]
+        print(f"Encoding {len(pending)} of {len(chunks)} chunks with {min(self.jobs, max(1, len(pending)))} jobs")
+        if self.jobs == 1:
+            for chunk in pending:
+                self.encode(timeline, chunk['start_frame'], chunk['end_frame'], fps,
+                            os.path.join(dir_chunks, chunk['file']), self.video_data.get_preset())
+                self._done(dir_chunks, manifest, chunk)
+            self._encode_audio(timeline, dir_chunks, manifest)
+        elif pending:
+            executor = self.executor or ProcessPoolExecutor(max_workers=min(self.jobs, len(pending)))
+            try:
+                futures = {executor.submit(_encode_chunk, self.video_data.segment_render_manager.get_options(),
+                                           chunk['start_frame'], chunk['end_frame'], fps,
+                                           os.path.join(dir_chunks, chunk['file'])): chunk for chunk in pending}
+                # The audio is encoded here while the workers encode the video
+                self._encode_audio(timeline, dir_chunks, manifest)
+                for future in as_completed(futures):
+                    future.result()
+                    self._done(dir_chunks, manifest, futures[future])
+            finally:
+                if executor is not self.executor:
+                    executor.shutdown()
+        else:
+            self._encode_audio(timeline, dir_chunks, manifest)
+
+        audio_file_path = os.path.join(dir_chunks, manifest['audio']['file']) if manifest['audio'] else None
+        file_paths = [os.path.join(dir_chunks, chunk['file']) for chunk in manifest['chunks']]
+        print(f"Joining {len(chunks)} chunks with stream copy")
+        self.video_data.assembly_manager.join(file_paths, output_file_path, audio_file_path=audio_file_path)
+        # The checkpoints are only needed until the output is written
+        shutil.rmtree(dir_chunks)
+
+    def get_chunks(self, duration, fps):
+        """
+        Split the timeline on frame boundaries, in chunks of chunk_seconds. The last chunk takes what is left.
+
+        :return: list of (start_frame, end_frame)
+        """
+        frames = math.ceil(round(duration * fps, 6))
+        chunk_frames = max(1, math.ceil(round(self.config_manager.chunk_seconds * fps, 6)))
+        return [(start_frame, min(start_frame + chunk_frames, frames))
+                for start_frame in range(0, frames, chunk_frames)]
+
+    def get_key(self, fps, chunks):
+        return self.cache_manager.key('chunks', self.video_data.get_assembly_fingerprint(), list(self.video_data.size),
+                                      fps, chunks, self.video_data.get_preset())
+
+    @staticmethod
+    def encode(timeline, start_frame, end_frame, fps, file_path, preset):
+        # Half a frame short of the end, so moviepy's frame loop stops exactly before end_frame
+        chunk = timeline.subclip(start_frame / fps, (end_frame - 0.5) / fps)
+        tmp_file_path = os.path.splitext(file_path)[0] + ".part.mp4"
+        try:
+            with profile_manager.frame_loop(f"encode chunk {os.path.basename(file_path)}"):
+                chunk.write_videofile(tmp_file_path, fps=fps, codec='libx264', audio=False, preset=preset,
+                                      logger=None)
+            os.replace(tmp_file_path, file_path)
+        finally:
+            if os.path.isfile(tmp_file_path):
+                os.remove(tmp_file_path)
+
+    def _encode_audio(self, timeline, dir_chunks, manifest):
+        if manifest['audio'] is None or manifest['audio']['done']:
+            return
+        file_path = os.path.join(dir_chunks, manifest['audio']['file'])
+        tmp_file_path = os.path.splitext(file_path)[0] + ".part.m4a"
+        try:
+            with profile_manager.span("encode audio", 'frames'):
+                timeline.audio.write_audiofile(tmp_file_path, fps=44100, codec='aac', logger=None)
+            os.replace(tmp_file_path, file_path)
+        finally:
+            if os.path.isfile(tmp_file_path):
+                os.remove(tmp_file_path)
+        manifest['audio']['done'] = True
+        self._write_manifest(dir_chunks, manifest)
+        self.cache_manager.touch('chunk', file_path)
+
+    def _done(self, dir_chunks, manifest, chunk):
+        chunk['done'] = True
+        self._write_manifest(dir_chunks, manifest)
+        # Counted in the cache size, and evicted with it when a timeline that changed since left them behind
+        self.cache_manager.touch('chunk', os.path.join(dir_chunks, chunk['file']))
+        done = sum(chunk['done'] for chunk in manifest['chunks'])
+        print(f"  - Chunk {chunk['file']} encoded ({done}/{len(manifest['chunks'])})")
+
+    def _write_manifest(self, dir_chunks, manifest):
+        fd, tmp_file_path = tempfile.mkstemp(dir=dir_chunks, suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(manifest, tmp_file, indent=1)
+        os.replace(tmp_file_path, os.path.join(dir_chunks, "manifest.json"))
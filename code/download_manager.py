@@ -0,0 +1,247 @@
+import fcntl
+import hashlib
+import json
+import shutil
+import ssl
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from moviepy.editor import *
+
+
+class DownloadManager:
+    """
+    Downloads remote sources (youtube-url or url in the config) into a cache shared by every working directory.
+
+    Downloads are keyed by the URL and the stream choice, so the same video in two sprint configs is fetched once. A
+    download goes to a .part file and continues from where it stopped with a Range request, after a dropped connection
+    or on the next run. The ETag or Last-Modified of the download is kept next to the .part file and sent as If-Range,
+    so a file that changed on the server is downloaded again instead of continued. The size and the sha256 are checked
+    before the file is moved into the cache, and the file is then linked (or copied) into the working directory for
+    StageVideoManager.
+    """
+
+    DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sprint_video_stitcher", "downloads")
+    # A dropped connection loses at most the chunk being read
+    CHUNK_SIZE = 64 * 1024
+    # Attempts per download, every attempt continues the partial file
+    RETRIES = 5
+    TIMEOUT = 30
+
+    def __init__(self, config_manager, jobs=None):
+        self.config_manager = config_manager
+        self.jobs = jobs
+
+    def get_dir(self):
+        dir_downloads = self.config_manager.download_cache_dir or self.DEFAULT_DIR
+        os.makedirs(dir_downloads, exist_ok=True)
+        return dir_downloads
+
+    def run(self, videos):
+        """
+        Download every remote source that is missing from the working directory, on a thread pool.
+
+        :param videos: list of video config dicts
+        :return: dict of file path -> error message, for the downloads that failed
+        """
+        pending = {}
+        for video in videos:
+            file_path = self.get_file_path(video)
+            if self.get_url(video) and not os.path.isfile(file_path):
+                pending.setdefault(file_path, video)
+        if not pending:
+            return {}
+
+        jobs = max(1, int(self.jobs or self.config_manager.download_jobs))
+        print(f"Downloading {len(pending)} videos with {jobs} jobs")
+        errors = {}
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(self.download, video): file_path for file_path, video in pending.items()}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    print(f"  - {os.path.basename(futures[future])}: downloaded")
+                except Exception as e:
+                    errors[futures[future]] = f"{type(e).__name__}: {e}"
+                    print(f"  - {os.path.basename(futures[future])}: failed, {errors[futures[future]]}")
+        return errors
+
+    def download(self, video):
+        """
+        Put the remote source of video in the working directory, from the cache when it was downloaded before.
+
+        :param video: video config dict
+        :return: the file path, or None when the video has no remote source
+        """
+        url = self.get_url(video)
+        file_path = self.get_file_path(video)
+        if not url or os.path.isfile(file_path):
+            return None
+
+        key = hashlib.sha1(json.dumps([url, self.get_stream(video)]).encode('utf-8')).hexdigest()
+        cache_file_path = os.path.join(self.get_dir(), key + os.path.splitext(file_path)[1])
+
+        # One download per key, also across processes and working directories
+        with open(cache_file_path + ".lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            info = self._read_info(cache_file_path)
+            if info is None or not self._is_intact(cache_file_path, info):
+                # Stream URLs expire, they are only looked up when there is something to download
+                stream_url, stream_id, size = self.resolve(video)
+                info = self.fetch(stream_url, cache_file_path, size=size, sha256=video.get('sha256'))
+                info.update({'url': url, 'stream': stream_id})
+                self._write_info(cache_file_path, info)
+
+        if video.get('sha256') and video['sha256'] != info['sha256']:
+            raise Exception(f"sha256 of {url} is {info['sha256']}, the config expects {video['sha256']}")
+
+        self._place(cache_file_path, file_path)
+        return file_path
+
+    def get_stream(self, video):
+        """
+        Which stream of the source is downloaded, part of the cache key
+        """
+        return 'progressive-mp4-highest' if video.get('youtube-url') else 'direct'
+
+    def resolve(self, video):
+        """
+        :return: (URL to download, stream id, expected size or None)
+        """
+        if video.get('youtube-url'):
+            return self._resolve_youtube(video['youtube-url'])
+        return video['url'], 'direct', None
+
+    def fetch(self, url, file_path, size=None, sha256=None):
+        """
+        Download url to file_path, continuing file_path.part when it is there.
+
+        :param size: expected size, taken from the response when None
+        :param sha256: expected sha256, if known
+        :return: dict with the size and sha256 of the file
+        """
+        part_file_path = file_path + ".part"
+        expected_size = size
+        for attempt in range(1, self.RETRIES + 1):
+            offset = os.path.getsize(part_file_path) if os.path.isfile(part_file_path) else 0
+            # The validator and size of the response the partial file came from, so a changed file is not continued
+            part_info = (self._read_info(part_file_path) or {}) if offset else {}
+            size = expected_size or part_info.get('size')
+            headers = {'Range': f"bytes={offset}-"} if offset else {}
+            if part_info.get('validator'):
+                headers['If-Range'] = part_info['validator']
+            try:
+                with requests.get(url, headers=headers, stream=True, timeout=self.TIMEOUT) as response:
+                    if response.status_code == 416:
+                        # Nothing left after offset, the partial file is complete when it has the full size
+                        total = int(response.headers.get('Content-Range', '/0').split('/')[-1])
+                        if total == offset and size in (None, offset):
+                            size = offset
+                            break
+                        self._discard(part_file_path, url, "the partial file does not match")
+                        continue
+                    response.raise_for_status()
+                    if response.status_code == 206:
+                        content_range = response.headers['Content-Range'].split(' ')[-1]
+                        total = int(content_range.split('/')[-1])
+                        if int(content_range.split('-')[0]) != offset or (size is not None and total != size):
+                            self._discard(part_file_path, url, "the server sent another range")
+                            continue
+                        size = total
+                        mode = 'ab'
+                    else:
+                        # The server ignored the Range header or the file changed since, start over
+                        size = expected_size or int(response.headers.get('Content-Length', 0)) or None
+                        mode = 'wb'
+                        self._write_info(part_file_path, {'validator': self._get_validator(response), 'size': size})
+                    with open(part_file_path, mode) as part_file:
+                        for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                            part_file.write(chunk)
+                if size is None or os.path.getsize(part_file_path) == size:
+                    break
+                if os.path.getsize(part_file_path) > size:
+                    self._discard(part_file_path, url, "the partial file is too large")
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                print(f"  - Download of {url} stopped ({type(e).__name__}), attempt {attempt} of {self.RETRIES}")
+        else:
+            raise Exception(f"Download of {url} did not finish after {self.RETRIES} attempts")
+
+        actual_size = os.path.getsize(part_file_path)
+        if size is not None and actual_size != size:
+            self._remove_part(part_file_path)
+            raise Exception(f"Download of {url} has {actual_size} bytes, expected {size}")
+        info = {'size': actual_size, 'sha256': self._sha256(part_file_path)}
+        if sha256 and info['sha256'] != sha256:
+            self._remove_part(part_file_path)
+            raise Exception(f"sha256 of {url} is {info['sha256']}, the config expects {sha256}")
+        os.replace(part_file_path, file_path)
+        self._remove_part(part_file_path)
+        return info
+
+    def get_url(self, video):
+        return video.get('youtube-url') or video.get('url')
+
+    def get_file_path(self, video):
+        return os.path.join(self.config_manager.dir, video['video'])
+
+    def _resolve_youtube(self, url):
+        # Only needed for YouTube sources
+        from pytube import YouTube
+
+        # Ignore SSL
+        # Resolves: urllib.error.URLError: <urlopen error [SSL: CERTIFICATE_VERIFY_FAILED] certificate verify failed
+        ssl._create_default_https_context = ssl._create_unverified_context
+
+        # The progressive mp4 stream with the highest resolution
+        stream = YouTube(url).streams.filter(file_extension='mp4', progressive=True).get_highest_resolution()
+        return stream.url, f"itag-{stream.itag}", stream.filesize
+
+    def _get_validator(self, response):
+        # A weak ETag can't be used in If-Range
+        etag = response.headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            return etag
+        return response.headers.get('Last-Modified')
+
+    def _discard(self, part_file_path, url, reason):
+        print(f"  - Download of {url} starts over, {reason}")
+        self._remove_part(part_file_path)
+
+    def _remove_part(self, part_file_path):
+        # The partial file and the info of the response it came from
+        for file_path in (part_file_path, part_file_path + ".json"):
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+    def _is_intact(self, file_path, info):
+        return os.path.isfile(file_path) and os.path.getsize(file_path) == info['size']
+
+    def _place(self, cache_file_path, file_path):
+        # Link into the working directory, copy when it is on another filesystem
+        tmp_file_path = file_path + ".part"
+        if os.path.isfile(tmp_file_path):
+            os.remove(tmp_file_path)
+        try:
+            os.link(cache_file_path, tmp_file_path)
+        except OSError:
+            shutil.copyfile(cache_file_path, tmp_file_path)
+        os.replace(tmp_file_path, file_path)
+
+    def _sha256(self, file_path):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as source_file:
+            for chunk in iter(lambda: source_file.read(self.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _read_info(self, file_path):
+        try:
+            with open(file_path + ".json") as info_file:
+                return json.load(info_file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_info(self, file_path, info):
+        with open(file_path + ".json.part", 'w') as info_file:
+            json.dump(info, info_file, indent=1)
+        os.replace(file_path + ".json.part", file_path + ".json")
@@ -0,0 +1,181 @@
+import subprocess
+import tempfile
+
+import numpy as np
+from PIL import Image
+from moviepy.editor import *
+
+from code.profile_manager import profile_manager
+from code.watermark_manager import resolve_position
+
+
+class FilterGraphManager:
+    """
+    Renders a segment with a single ffmpeg filtergraph instead of compositing every frame in Python.
+
+    The overlays (title, ticket, description, countdown and watermark) are rendered once to PNG layers, in the same
+    layout as the moviepy backend, and ffmpeg overlays them on the video in their time windows. Like moviepy's fades,
+    the fades take a layer's colour to black and leave its transparency alone.
+    """
+
+    def __init__(self, video_data):
+        self.video_data = video_data
+        self.config_manager = video_data.config_manager
+
+    def render(self, video, file_path, watermark=False):
+        """
+        Render the segment of video to file_path.
+
+        :param video: video config dict, including the size and duration from get_max_video_size
+        :param file_path: segment path
+        :param watermark: burn the watermark in
+        """
+        video_data = self.video_data
+        source_file_path = video_data.transport_stream_manager.get_file_path(video)
+        info = video_data.media_probe_manager.probe(source_file_path)
+        start, _ = video_data.get_subclip_times(video)
+        duration = video_data.get_clip_duration(video, info['duration'])
+        fps = info.get('fps') or 25
+
+        dir_layers = video_data.cache_manager.get_dir('segment')
+        with tempfile.TemporaryDirectory(dir=dir_layers, prefix='layers-') as tmp_dir:
+            layers = self.get_layers(video, duration, (info['width'], info['height']), watermark, tmp_dir)
+            inputs, filtergraph = self.filtergraph(source_file_path, start, duration, fps,
+                                                   (info['width'], info['height']), video_data.size,
+                                                   video.get('background', False), layers)
+
+            # Write via a temp file so an interrupted render is never picked up as cached
+            tmp_file_path = os.path.splitext(file_path)[0] + ".part.mp4"
+            command = (f"ffmpeg -y -v error {' '.join(inputs)} -filter_complex '{filtergraph}' "
+                       f"-map '[out]' -map '0:a?' -t {duration} -c:v libx264 -preset {video_data.get_preset()} "
+                       f"-pix_fmt yuv420p {self.get_audio_codec(video, info)} '{tmp_file_path}'")
+            with profile_manager.span("ffmpeg filtergraph", 'ffmpeg', video=video['video'], layers=len(layers)):
+                subprocess.run(command, shell=True, check=True)
+            os.replace(tmp_file_path, file_path)
+
+    def get_audio_codec(self, video, info):
+        """
+        A background replaces the video and leaves the audio untouched, so AAC audio is copied instead of re-encoded.
+        The video is then a solid colour from the encoder, and the segment renders in about the time of a remux.
+
+        :return: ffmpeg audio codec arguments
+        """
+        if video.get('background', False) and info.get('audio_codec') == 'aac':
+            return "-c:a copy"
+        return "-c:a aac -ar 44100"
+
+    def get_layers(self, video, duration, source_size, watermark, tmp_dir):
+        """
+        Render the overlays of video to PNG files, bottom layer first.
+
+        :return: list of dicts with the 'path' (a %05d pattern for layers that change every second), 'x', 'y',
+                 'duration', 'fadein', 'fadeout' and 'fps'
+        """
+        video_data = self.video_data
+        canvas = video_data.size
+        layers = []
+
+        # The title is centred on the video, which sits in the top left corner of the canvas
+        title_clip = video_data.title_clip(video, duration)
+        if title_clip is not None:
+            layers.append({'clip': title_clip, 'fadein': None, 'fadeout': None, 'fps': None, 'size': source_size})
+
+        layers.extend(video_data.text_overlay_manager.video_text_overlay_layers(video, clip_duration=duration))
+
+        specs = []
+        for i, layer in enumerate(layers):
+            clip = layer['clip']
+            path = os.path.join(tmp_dir, f"layer{i}")
+            if layer['fps']:
+                # One frame per second, every frame is the same size so it keeps its position
+                os.makedirs(path)
+                for second in range(max(1, int(np.ceil(clip.duration)))):
+                    rgba = self._rgba(clip, second)
+                    Image.fromarray(rgba).save(os.path.join(path, f"{second:05d}.png"))
+                x, y = resolve_position(clip.pos(0), layer.get('size', canvas), rgba.shape[1::-1])
+                path = os.path.join(path, "%05d.png")
+            else:
+                rgba = self._rgba(clip, 0)
+                x, y = resolve_position(clip.pos(0), layer.get('size', canvas), rgba.shape[1::-1])
+                # Only keep the visible part
+                rows, columns = np.nonzero(rgba[:, :, 3])
+                if not len(rows):
+                    continue
+                rgba = rgba[rows.min():rows.max() + 1, columns.min():columns.max() + 1]
+                x, y = x + columns.min(), y + rows.min()
+                path += ".png"
+                Image.fromarray(rgba).save(path)
+            specs.append({'path': path, 'x': x, 'y': y, 'duration': min(clip.duration, duration),
+                          'fadein': layer['fadein'], 'fadeout': layer['fadeout'], 'fps': layer['fps']})
+
+        if watermark:
+            x, y, rgba = video_data.watermark_manager.image(tuple(canvas))
+            if rgba is not None:
+                path = os.path.join(tmp_dir, "watermark.png")
+                Image.fromarray(rgba).save(path)
+                specs.append({'path': path, 'x': x, 'y': y, 'duration': duration, 'fadein': None, 'fadeout': None,
+                              'fps': None})
+
+        return specs
+
+    def filtergraph(self, source_file_path, start, duration, fps, source_size, canvas, background, layers):
+        """
+        :return: (list of ffmpeg input arguments, filtergraph with its output labelled [out])
+        """
+        inputs = [f"-ss {start} -t {duration} -i '{source_file_path}'"]
+        filters = []
+
+        if background:
+            # The background replaces the video and keeps its audio, it is not faded. Only the audio is read.
+            inputs = [f"-ss {start} -t {duration} -vn -i '{source_file_path}'"]
+            color = "0x{:02x}{:02x}{:02x}".format(*map(int, background))
+            inputs.append(f"-f lavfi -i 'color=c={color}:s={source_size[0]}x{source_size[1]}:r={fps}:d={duration}'")
+            video = "[1:v]"
+        else:
+            fades = []
+            if self.video_data.fadein:
+                fades.append(f"fade=t=in:st=0:d={self.video_data.fadein}")
+            if self.video_data.fadeout:
+                fades.append(f"fade=t=out:st={max(0, duration - self.video_data.fadeout)}:d={self.video_data.fadeout}")
+            video = "[0:v]"
+            if fades:
+                filters.append(f"[0:v]{','.join(fades)}[base]")
+                video = "[base]"
+
+        # The video sits in the top left corner of the canvas, like CompositeVideoClip puts it. The layers are blended
+        # in RGB like moviepy does, blending in subsampled YUV would blur their edges.
+        filters.append(f"{video}pad={canvas[0]}:{canvas[1]}:0:0:black,setsar=1,format=gbrp[v0]")
+        video = "[v0]"
+
+        for i, layer in enumerate(layers):
+            index = len(inputs)
+            if layer['fps']:
+                inputs.append(f"-framerate {layer['fps']} -i '{layer['path']}'")
+                chain = [f"[{index}:v]format=rgba"]
+            else:
+                inputs.append(f"-i '{layer['path']}'")
+                # Decode the still once and repeat it at the video frame rate
+                chain = [f"[{index}:v]format=rgba,loop=loop=-1:size=1,setpts=N/{fps}/TB,"
+                         f"trim=duration={layer['duration']}"]
+
+            if layer['fadein'] or layer['fadeout']:
+                fades = []
+                if layer['fadein']:
+                    fades.append(f"fade=t=in:st=0:d={layer['fadein']}")
+                if layer['fadeout']:
+                    fades.append(f"fade=t=out:st={max(0, layer['duration'] - layer['fadeout'])}:d={layer['fadeout']}")
+                # Fade the colour only, the fade filter would fade the alpha channel too
+                chain.append(f"split[c{i}][a{i}];[a{i}]alphaextract[m{i}];"
+                             f"[c{i}]format=rgb24,{','.join(fades)}[f{i}];[f{i}][m{i}]alphamerge")
+            filters.append(f"{','.join(chain)}[l{i}]")
+            filters.append(f"{video}[l{i}]overlay=x={layer['x']}:y={layer['y']}:format=gbrp:"
+                           f"enable=between(t\\,0\\,{layer['duration']})[v{i + 1}]")
+            video = f"[v{i + 1}]"
+
+        filters.append(f"{video}format=yuv420p[out]")
+        return inputs, ';'.join(filters)
+
+    def _rgba(self, clip, t):
+        frame = clip.get_frame(t)
+        mask = clip.mask.get_frame(t) if clip.mask is not None else np.ones(frame.shape[:2])
+        return np.dstack([frame, np.round(mask * 255)]).astype(np.uint8)
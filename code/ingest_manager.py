@@ -0,0 +1,113 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from code.download_manager import DownloadManager
+
+
+class IngestManager:
+    """
+    Runs the ingest steps (download -> stage -> ts) for every video on a bounded worker pool.
+
+    The steps for one video always run in order on the same worker, while different videos run side by side.
+    Each step is a blocking ffmpeg subprocess, so threads are enough to keep the cores busy. The remote sources are
+    downloaded first, on the download pool of the DownloadManager.
+    """
+
+    CONVERTED = 'converted'
+    CACHED = 'cached'
+    SKIPPED = 'skipped'
+    FAILED = 'failed'
+
+    def __init__(self, config_manager, stage_video_manager, transport_stream_manager, jobs=1, download_manager=None):
+        self.config_manager = config_manager
+        self.dir = self.config_manager.dir
+        self.stage_video_manager = stage_video_manager
+        self.transport_stream_manager = transport_stream_manager
+        self.download_manager = download_manager if download_manager else DownloadManager(config_manager)
+        self.jobs = max(1, int(jobs or 1))
+
+    def run(self, videos):
+        """
+        Ingest all videos and print a summary.
+
+        Videos sharing the same source file are only converted once.
+
+        :param videos: list of video config dicts
+        :return: dict of source file path -> (status, message)
+        """
+        batches = {os.path.join(self.dir, name): group for name, group in self.group(videos).items()}
+
+        # A failed download is reported by ingest below
+        self.download_manager.run([batch[0] for batch in batches.values()])
+
+        print(f"Ingesting {len(batches)} videos with {self.jobs} jobs")
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = {executor.submit(self.ingest, batch[0]): file_path for file_path, batch in batches.items()}
+            for future in as_completed(futures):
+                file_path = futures[future]
+                results[file_path] = future.result()
+                print(f"  - {os.path.basename(file_path)}: {results[file_path][0]}")
+
+        self.print_summary(results)
+        return results
+
+    def group(self, videos):
+        """
+        Videos that share a source and its conversion are ingested once. Drafts are staged from the start of the
+        video, so a source used with two starts is ingested twice, the second time as "name#2".
+
+        :param videos: list of video config dicts
+        :return: dict of name -> list of video config dicts, in config order
+        """
+        groups = {}
+        commands = {}
+        for video in videos:
+            # The transport stream key needs the source on disk, the conversion command is known up front
+            command = self.stage_video_manager.get_command(video)
+            source_commands = commands.setdefault(video['video'], [])
+            if command not in source_commands:
+                source_commands.append(command)
+            index = source_commands.index(command)
+            name = f"{video['video']}#{index + 1}" if index else video['video']
+            groups.setdefault(name, []).append(video)
+        return groups
+
+    def ingest(self, video):
+        """
+        Download, stage and convert a single video to a transport stream.
+        Any error is caught and reported so that the other videos carry on.
+
+        :param video:
+        :return: (status, message)
+        """
+        file_path = self.get_file_path(video)
+        try:
+            self.download_manager.download(video)
+
+            if not os.path.isfile(file_path):
+                return self.SKIPPED, f"{file_path} does not exists"
+
+            ts_file_path = self.transport_stream_manager.get_file_path(video)
+            if os.path.isfile(ts_file_path):
+                self.transport_stream_manager.cache_manager.touch('ts', ts_file_path)
+                return self.CACHED, ts_file_path
+
+            stage_file_path = self.stage_video_manager.convert(file_path, video)
+            self.transport_stream_manager.convert(stage_file_path, video)
+            return self.CONVERTED, ts_file_path
+        except Exception as e:
+            return self.FAILED, f"{type(e).__name__}: {e}"
+
+    def print_summary(self, results):
+        print("Ingest summary:")
+        for status in (self.CONVERTED, self.CACHED, self.SKIPPED, self.FAILED):
+            file_paths = [file_path for file_path, result in results.items() if result[0] == status]
+            print(f"  {status}: {len(file_paths)}")
+            if status in (self.SKIPPED, self.FAILED):
+                for file_path in file_paths:
+                    print(f"    - {os.path.basename(file_path)}: {results[file_path][1]}")
+
+    def get_file_path(self, video):
+        return os.path.join(self.dir, video['video'])
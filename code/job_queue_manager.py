@@ -0,0 +1,244 @@
+import json
+import socket
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+
+from moviepy.editor import *
+
+
+class JobQueueManager:
+    """
+    A job queue in a shared directory, so several hosts can render one project without a queue service.
+
+    jobs/<id>.json holds a job, claimed/<id>.lock the claim of the worker running it and done/<id>.json or
+    failed/<id>.json its result. A worker claims a job by creating its lock file with O_EXCL, which only one worker
+    can do, and touches the lock every heartbeat_interval seconds while the job runs. A lock that was not touched for
+    stale_after seconds belongs to a worker that died, and the next worker takes the job over. A job that failed or
+    went stale is retried until it was attempted max_attempts times.
+
+    Jobs only run once every job they depend on is done, and fail when one of those failed.
+    """
+
+    PENDING = 'pending'
+    CLAIMED = 'claimed'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, dir_queue, heartbeat_interval=5, stale_after=60, max_attempts=3):
+        self.dir = dir_queue
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        for name in ('jobs', 'claimed', 'done', 'failed'):
+            os.makedirs(os.path.join(self.dir, name), exist_ok=True)
+
+    def add(self, job_id, payload, deps=()):
+        """
+        Queue a job, unless a job with the same id is queued already. A job that failed is queued again.
+
+        :param job_id: unique id, also the file name
+        :param payload: JSON serialisable job description handed to the worker
+        :param deps: ids of the jobs that have to be done first
+        :return: True when the job was added
+        """
+        if os.path.isfile(self._path('jobs', job_id)) and self._status(job_id) != self.FAILED:
+            return False
+        self._write(self._path('jobs', job_id), {'id': job_id, 'payload': payload, 'deps': list(deps), 'attempts': []})
+        if os.path.isfile(self._path('failed', job_id)):
+            os.remove(self._path('failed', job_id))
+        return True
+
+    def status(self):
+        """
+        :return: dict of job id to PENDING, CLAIMED, DONE or FAILED
+        """
+        return {job_id: self._status(job_id) for job_id in self._job_ids()}
+
+    def result(self, job_id):
+        return self._read(self._path('done', job_id))['result']
+
+    def claim(self, worker_id):
+        """
+        Claim the first job that is ready to run.
+
+        :return: the job dict, with the 'token' of the claim, or None when no job is ready
+        """
+        for job_id in self._job_ids():
+            if self._status(job_id) in (self.DONE, self.FAILED):
+                continue
+            job = self._read(self._path('jobs', job_id))
+            dep_status = [self._status(dep) for dep in job['deps']]
+            if any(status not in (self.DONE, self.FAILED) for status in dep_status):
+                continue
+
+            token = self._lock(job_id, worker_id)
+            if token is None:
+                continue
+            # Re-read under the lock, a stale claim was just recorded as an attempt
+            job = self._read(self._path('jobs', job_id))
+            job['token'] = token
+            if os.path.isfile(self._path('done', job_id)) or os.path.isfile(self._path('failed', job_id)):
+                self._unlock(job_id, token)
+            elif self.FAILED in dep_status:
+                self.fail(job, "A job it depends on failed", retry=False)
+            elif len(job['attempts']) >= self.max_attempts:
+                self.fail(job, f"Gave up after {len(job['attempts'])} attempts", retry=False)
+            else:
+                return job
+        return None
+
+    def complete(self, job, result=None):
+        self._write(self._path('done', job['id']), {'id': job['id'], 'result': result})
+        self._unlock(job['id'], job['token'])
+
+    def fail(self, job, error, retry=True):
+        """
+        Record a failed attempt. The job goes back to pending unless it ran out of attempts.
+        """
+        job = dict(job)
+        token = job.pop('token')
+        if retry:
+            job['attempts'] = job['attempts'] + [{'worker': token.split('/')[0], 'error': error}]
+            self._write(self._path('jobs', job['id']), job)
+        if not retry or len(job['attempts']) >= self.max_attempts:
+            self._write(self._path('failed', job['id']), {'id': job['id'], 'error': error,
+                                                         'attempts': job['attempts']})
+        self._unlock(job['id'], token)
+
+    def work(self, handler, worker_id=None, poll_interval=1, wait=False):
+        """
+        Claim and run jobs until none are left.
+
+        :param handler: callable taking a job payload and returning a JSON serialisable result
+        :param worker_id: name in the claims, defaults to host and pid
+        :param poll_interval: seconds between looking for jobs while jobs are still running elsewhere
+        :param wait: keep polling for new jobs instead of returning once every job is done or failed
+        :return: dict with the number of jobs this worker completed and failed
+        """
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        counts = {self.DONE: 0, self.FAILED: 0}
+        while True:
+            job = self.claim(worker_id)
+            if job is None:
+                if not wait and all(status in (self.DONE, self.FAILED) for status in self.status().values()):
+                    return counts
+                time.sleep(poll_interval)
+                continue
+
+            print(f"[{worker_id}] Running job '{job['id']}'")
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=self._heartbeat, args=(job['id'], stop), daemon=True)
+            heartbeat.start()
+            try:
+                result = handler(job['payload'])
+            except Exception as e:
+                stop.set()
+                print(f"[{worker_id}] Job '{job['id']}' failed: {e}")
+                self.fail(job, traceback.format_exc())
+                counts[self.FAILED] += 1
+            else:
+                stop.set()
+                self.complete(job, result)
+                print(f"[{worker_id}] Job '{job['id']}' done")
+                counts[self.DONE] += 1
+            heartbeat.join()
+
+    def print_stats(self):
+        statuses = list(self.status().values())
+        print(", ".join(f"{statuses.count(status)} {status}"
+                        for status in (self.PENDING, self.CLAIMED, self.DONE, self.FAILED)))
+
+    def _lock(self, job_id, worker_id):
+        """
+        Create the lock of job_id, taking it over when it went stale.
+
+        :return: the claim token, or None when another worker holds the lock
+        """
+        lock_path = self._path('claimed', job_id, ".lock")
+        token = f"{worker_id}/{uuid.uuid4().hex}"
+        stale_worker = None
+        for _ in range(2):
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                stale_worker = self._remove_stale(job_id, lock_path, token)
+                if stale_worker is None:
+                    return None
+                continue
+            with os.fdopen(fd, 'w') as lock_file:
+                lock_file.write(token)
+            if stale_worker is not None:
+                # The run that went stale counts as an attempt
+                job = self._read(self._path('jobs', job_id))
+                job['attempts'].append({'worker': stale_worker, 'error': "No heartbeat"})
+                self._write(self._path('jobs', job_id), job)
+            return token
+        return None
+
+    def _remove_stale(self, job_id, lock_path, token):
+        """
+        Move a stale lock out of the way. Only one worker can rename the lock, the others see it gone.
+
+        :return: the worker of the stale claim, or None when the lock is not stale
+        """
+        try:
+            if time.time() - os.path.getmtime(lock_path) < self.stale_after:
+                return None
+            stale_path = f"{lock_path}.{token.split('/')[1]}.stale"
+            os.rename(lock_path, stale_path)
+        except FileNotFoundError:
+            return None
+
+        with open(stale_path) as stale_file:
+            stale_worker = stale_file.read().split('/')[0]
+        os.remove(stale_path)
+        print(f"Reclaiming job '{job_id}' from '{stale_worker}', no heartbeat for {self.stale_after} seconds")
+        return stale_worker
+
+    def _unlock(self, job_id, token):
+        # A worker whose claim went stale and was taken over must not remove the new claim
+        lock_path = self._path('claimed', job_id, ".lock")
+        try:
+            with open(lock_path) as lock_file:
+                if lock_file.read() == token:
+                    os.remove(lock_path)
+        except FileNotFoundError:
+            pass
+
+    def _heartbeat(self, job_id, stop):
+        lock_path = self._path('claimed', job_id, ".lock")
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                os.utime(lock_path)
+            except FileNotFoundError:
+                pass
+
+    def _status(self, job_id):
+        if os.path.isfile(self._path('done', job_id)):
+            return self.DONE
+        if os.path.isfile(self._path('failed', job_id)):
+            return self.FAILED
+        if os.path.isfile(self._path('claimed', job_id, ".lock")):
+            return self.CLAIMED
+        return self.PENDING
+
+    def _job_ids(self):
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(os.path.join(self.dir, 'jobs'))
+                      if name.endswith(".json"))
+
+    def _path(self, name, job_id, ext=".json"):
+        return os.path.join(self.dir, name, job_id + ext)
+
+    def _read(self, file_path):
+        with open(file_path) as json_file:
+            return json.load(json_file)
+
+    def _write(self, file_path, data):
+        # Write via a temp file so other hosts never read half a job
+        fd, tmp_file_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(data, tmp_file, indent=1)
+        os.replace(tmp_file_path, file_path)
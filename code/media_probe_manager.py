@@ -0,0 +1,185 @@
+import fcntl
+import json
+import shutil
+import subprocess
+import tempfile
+import threading
+from fractions import Fraction
+
+from moviepy.editor import *
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+from code.profile_manager import profile_manager
+
+
+class MediaProbeManager:
+    """
+    Index of media metadata read with ffprobe, stored in cache/probe.json in the working directory.
+
+    Entries are keyed by path and are only trusted while the file size and modification time still match, so every
+    stage can ask for the dimensions, duration, frame rate, codecs and keyframes without opening a VideoFileClip.
+
+    Without ffprobe the dimensions, duration, frame rate and sample rate are read from ffmpeg's output like moviepy
+    does, which is enough to size and render the video. Those entries are probed again once ffprobe is installed.
+    Stream copy assembly needs the codecs and smart render the keyframes, they need ffprobe.
+    """
+
+    VERSION = 2
+
+    def __init__(self, config_manager):
+        self.config_manager = config_manager
+        self.dir = self.config_manager.dir
+        self.index_file_path = os.path.join(self.dir, "cache/probe.json")
+        self.lock = threading.Lock()
+        self.index = self._read_index()
+
+    def probe(self, file_path):
+        """
+        :param file_path:
+        :return: dict with width, height, duration, start_time, fps, codec, pix_fmt, profile, r_frame_rate, keyframes,
+                 keyframe_times and, when there is an audio stream, audio_codec, sample_rate and channels. The
+                 keyframe times are timestamps in the file, transport streams usually start after 0, see start_time.
+                 Without ffprobe only width, height, duration, start_time, fps and sample_rate.
+        """
+        stat = os.stat(file_path)
+        key = os.path.abspath(file_path)
+
+        with self.lock:
+            entry = self.index.get(key)
+        has_ffprobe = self.has_ffprobe()
+        if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            if entry.get('ffprobe', True) or not has_ffprobe:
+                return entry['info']
+
+        with profile_manager.span("ffprobe", 'ffmpeg', file=os.path.basename(file_path)):
+            info = self._probe(file_path)
+        with self.lock:
+            self.index[key] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'info': info, 'ffprobe': has_ffprobe}
+            self._write_index({key: self.index[key]})
+        return info
+
+    def add(self, file_path, info):
+        """
+        Record info for file_path without probing it, e.g. for a link to a file another project probed already
+        """
+        stat = os.stat(file_path)
+        key = os.path.abspath(file_path)
+        with self.lock:
+            self.index[key] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'info': info,
+                               'ffprobe': self.has_ffprobe()}
+            self._write_index({key: self.index[key]})
+
+    def has_ffprobe(self):
+        return shutil.which('ffprobe') is not None
+
+    def _probe(self, file_path):
+        if not self.has_ffprobe():
+            return self._read_infos(file_path)
+        result = self._ffprobe(f"ffprobe -v error -show_format -show_streams -of json '{file_path}'", file_path)
+        data = json.loads(result.stdout)
+
+        info = {'duration': float(data.get('format', {}).get('duration', 0)),
+                'start_time': float(data.get('format', {}).get('start_time', 0))}
+        for stream in data.get('streams', []):
+            if stream.get('codec_type') == 'video' and 'codec' not in info:
+                width, height = stream.get('width'), stream.get('height')
+                if self._rotation(stream) in (90, 270):
+                    width, height = height, width
+                info.update({
+                    'width': width,
+                    'height': height,
+                    'codec': stream.get('codec_name'),
+                    'profile': stream.get('profile'),
+                    'pix_fmt': stream.get('pix_fmt'),
+                    'r_frame_rate': stream.get('r_frame_rate'),
+                    'fps': self._fps(stream),
+                })
+            elif stream.get('codec_type') == 'audio' and 'audio_codec' not in info:
+                info.update({
+                    'audio_codec': stream.get('codec_name'),
+                    'sample_rate': int(stream.get('sample_rate', 0)),
+                    'channels': stream.get('channels'),
+                })
+
+        if 'codec' in info:
+            info['keyframe_times'] = self._keyframe_times(file_path)
+            info['keyframes'] = len(info['keyframe_times'])
+        return info
+
+    def _keyframe_times(self, file_path):
+        # Only reads the packet headers, nothing is decoded
+        command = (f"ffprobe -v error -select_streams v:0 -show_entries packet=pts_time,flags -of csv=p=0 "
+                   f"'{file_path}'")
+        result = self._ffprobe(command, file_path)
+        keyframe_times = []
+        for line in result.stdout.splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags and pts_time not in ('', 'N/A'):
+                keyframe_times.append(float(pts_time))
+        return sorted(keyframe_times)
+
+    def _ffprobe(self, command, file_path):
+        try:
+            return subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"ffprobe could not read '{file_path}' (exit status {e.returncode}): "
+                            f"{e.stderr.strip()}")
+
+    def _read_infos(self, file_path):
+        """
+        The part of the probe moviepy's ffmpeg reader knows: no codecs, pixel format or keyframes
+        """
+        infos = ffmpeg_parse_infos(file_path)
+        info = {'duration': infos['duration'], 'start_time': 0.0}
+        if infos['video_found']:
+            width, height = infos['video_size']
+            if infos.get('video_rotation', 0) in (90, 270):
+                width, height = height, width
+            info.update({'width': width, 'height': height, 'fps': infos['video_fps']})
+        if infos['audio_found']:
+            info['sample_rate'] = infos['audio_fps']
+        return info
+
+    def _fps(self, stream):
+        for key in ('avg_frame_rate', 'r_frame_rate'):
+            rate = stream.get(key, '0/0')
+            try:
+                fps = Fraction(rate)
+            except (ValueError, ZeroDivisionError):
+                continue
+            if fps > 0:
+                return float(fps)
+        return None
+
+    def _rotation(self, stream):
+        rotation = stream.get('tags', {}).get('rotate')
+        for side_data in stream.get('side_data_list', []):
+            rotation = side_data.get('rotation', rotation)
+        return abs(int(float(rotation))) % 360 if rotation is not None else 0
+
+    def _read_index(self):
+        try:
+            with open(self.index_file_path) as index_file:
+                data = json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+        return data.get('entries', {}) if data.get('version') == self.VERSION else {}
+
+    def _write_index(self, entries):
+        """
+        Merge entries into the index on disk. Other processes may update it at the same time, so the merge happens
+        under a file lock and the index is replaced atomically.
+        """
+        dir_index = os.path.dirname(self.index_file_path)
+        if not os.path.exists(dir_index):
+            os.makedirs(dir_index, exist_ok=True)
+
+        with open(self.index_file_path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            index = self._read_index()
+            index.update(entries)
+            fd, tmp_file_path = tempfile.mkstemp(dir=dir_index, suffix='.part')
+            with os.fdopen(fd, 'w') as tmp_file:
+                json.dump({'version': self.VERSION, 'entries': index}, tmp_file)
+            os.replace(tmp_file_path, self.index_file_path)
+        self.index.update(index)
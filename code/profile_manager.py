@@ -0,0 +1,152 @@
+import cProfile
+import json
+import pstats
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from moviepy.editor import *
+
+
+class ProfileManager:
+    """
+    Records where a run spends its time as Chrome trace events, viewable in Perfetto or chrome://tracing.
+
+    Stages, per clip tasks and ffmpeg runs are wrapped in spans. Every process buffers its own events and flushes them
+    to profile/parts/, worker processes after each task, and merge combines the parts into profile/trace.json. With
+    python set, the Python frame loops (the moviepy writes) also run under cProfile, merged into profile/python.prof.
+
+    There is one ProfileManager per process, profile_manager below. It does nothing until it is enabled.
+    """
+
+    def __init__(self):
+        self.dir = None
+        self.python = False
+        self.events = []
+        self.profiler = None
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.dir is not None
+
+    def enable(self, dir_profile, python=False):
+        """
+        :param dir_profile: directory for the trace, shared by all processes of a run
+        :param python: also profile the Python frame loops with cProfile
+        """
+        self.dir = dir_profile
+        self.python = python
+        os.makedirs(os.path.join(self.dir, "parts"), exist_ok=True)
+
+    def reset(self):
+        """
+        Remove the parts of an earlier run, before any worker starts
+        """
+        if self.enabled:
+            shutil.rmtree(os.path.join(self.dir, "parts"), ignore_errors=True)
+            os.makedirs(os.path.join(self.dir, "parts"), exist_ok=True)
+        self.events = []
+
+    @contextmanager
+    def span(self, name, category='pipeline', **args):
+        """
+        Record the time spent in the with block as one trace event.
+
+        :param name: shown on the event
+        :param category: groups events, e.g. 'task', 'clip' or 'ffmpeg'
+        :param args: shown with the event, must be JSON serialisable
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.time_ns() // 1000
+        try:
+            yield
+        finally:
+            event = {'name': name, 'cat': category, 'ph': 'X', 'ts': start, 'dur': time.time_ns() // 1000 - start,
+                     'pid': os.getpid(), 'tid': threading.get_native_id(), 'args': args}
+            with self.lock:
+                self.events.append(event)
+
+    @contextmanager
+    def frame_loop(self, name):
+        """
+        A span that also runs under cProfile when python profiling is on. cProfile only follows the thread that
+        enabled it, so frame loops on other threads of the same process are left out while one is profiled.
+        """
+        with self.span(name, 'frames'):
+            with self.lock:
+                profiler = cProfile.Profile() if self.python and self.profiler is None else None
+                if profiler is not None:
+                    self.profiler = profiler
+            if profiler is None:
+                yield
+                return
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                self.profiler = None
+                profiler.dump_stats(os.path.join(self.dir, "parts", f"{os.getpid()}-{uuid.uuid4().hex}.prof"))
+
+    def flush(self):
+        """
+        Write the buffered events of this process to a part file
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            # A forked worker starts with a copy of the parent's buffer, those events are the parent's to write
+            events = [event for event in self.events if event['pid'] == os.getpid()]
+            self.events = []
+        if events:
+            file_path = os.path.join(self.dir, "parts", f"{os.getpid()}-{uuid.uuid4().hex}.json")
+            with open(file_path, 'w') as part_file:
+                json.dump(events, part_file)
+
+    def merge(self):
+        """
+        Combine the parts of every process into profile/trace.json and profile/python.prof.
+
+        :return: path of the trace, or None when profiling is off
+        """
+        if not self.enabled:
+            return None
+        self.flush()
+        dir_parts = os.path.join(self.dir, "parts")
+        events = []
+        stats = None
+        for name in sorted(os.listdir(dir_parts)):
+            file_path = os.path.join(dir_parts, name)
+            if name.endswith(".json"):
+                with open(file_path) as part_file:
+                    events.extend(json.load(part_file))
+            elif name.endswith(".prof"):
+                if stats is None:
+                    stats = pstats.Stats(file_path)
+                else:
+                    stats.add(file_path)
+
+        main_pid = os.getpid()
+        for pid in sorted({event['pid'] for event in events}):
+            events.append({'name': 'process_name', 'ph': 'M', 'pid': pid,
+                           'args': {'name': "main" if pid == main_pid else f"worker {pid}"}})
+
+        trace_file_path = os.path.join(self.dir, "trace.json")
+        with open(trace_file_path, 'w') as trace_file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+        print(f"Profile: {len(events)} trace events written to {trace_file_path}, open it in https://ui.perfetto.dev")
+
+        if stats is not None:
+            stats_file_path = os.path.join(self.dir, "python.prof")
+            stats.dump_stats(stats_file_path)
+            print(f"Profile: Python frame loops written to {stats_file_path}, the slowest functions:")
+            stats.sort_stats('cumulative').print_stats(15)
+        return trace_file_path
+
+
+profile_manager = ProfileManager()
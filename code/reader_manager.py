@@ -0,0 +1,129 @@
+import threading
+from collections import OrderedDict
+
+from moviepy.editor import *
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+
+class LazyVideoFileClip(VideoClip):
+    """
+    Stands in for a VideoFileClip without holding a reader. The ReaderManager opens the ffmpeg readers the first time
+    a frame or audio chunk is asked for, and may close them again at any time.
+    """
+
+    def __init__(self, reader_manager, file_path, infos, audio=True):
+        # Set make_frame after the constructor, VideoClip reads a frame to find the size otherwise
+        VideoClip.__init__(self)
+        self.make_frame = lambda t: reader_manager.get_frame(file_path, t)
+        self.reader_manager = reader_manager
+        self.filename = file_path
+        self.duration = self.end = infos['video_duration']
+        self.fps = infos['video_fps']
+        self.size = infos['video_size']
+        self.rotation = infos['video_rotation']
+
+        if audio and infos['audio_found']:
+            self.audio = reader_manager.audio_clip(file_path, self.duration)
+
+    def close(self):
+        self.reader_manager.close(self.filename)
+
+
+class ReaderManager:
+    """
+    Opens the ffmpeg readers of the source and segment files on demand and keeps at most max_open_readers of them.
+
+    Every VideoFileClip holds an ffmpeg process for its frames and one for its audio until it is closed, so a timeline
+    of a hundred clips runs into process and file descriptor limits. Clips from this manager only open their readers
+    when the timeline reaches them, the least recently used readers are closed once the cap is reached, and the
+    timeline closes the readers of the clips it has moved past.
+    """
+
+    # What AudioFileClip decodes to by default, like VideoFileClip
+    AUDIO_FPS = 44100
+    AUDIO_CHANNELS = 2
+
+    def __init__(self, config_manager, max_open_readers=None):
+        self.config_manager = config_manager
+        self.max_open_readers = max(1, max_open_readers or self.config_manager.max_open_readers)
+        # (file path, 'video' or 'audio') -> open clip, least recently used first
+        self.readers = OrderedDict()
+        self.infos = {}
+        # Reads and closes are serialised, a reader must not be closed while another thread reads from it
+        self.lock = threading.RLock()
+
+    def clip(self, file_path, audio=True):
+        """
+        :param file_path: video file
+        :param audio: add the audio track
+        :return: LazyVideoFileClip, nothing is opened until a frame is read
+        """
+        return LazyVideoFileClip(self, file_path, self.get_infos(file_path), audio=audio)
+
+    def audio_clip(self, file_path, duration=None):
+        """
+        :param file_path: video or audio file
+        :param duration: seconds, read from the file when None
+        :return: AudioClip of the audio track, its reader is only opened when a chunk is read
+        """
+        if duration is None:
+            duration = self.get_infos(file_path)['duration']
+        # Same as for the frames, AudioClip reads the first chunk to count the channels
+        clip = AudioClip(duration=duration)
+        clip.make_frame = lambda t: self.get_audio_frame(file_path, t)
+        clip.fps = self.AUDIO_FPS
+        clip.nchannels = self.AUDIO_CHANNELS
+        return clip
+
+    def get_infos(self, file_path):
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime)
+        with self.lock:
+            if key not in self.infos:
+                # Only runs ffmpeg -i, no reader is started
+                self.infos[key] = ffmpeg_parse_infos(file_path)
+            return self.infos[key]
+
+    def get_frame(self, file_path, t):
+        with self.lock:
+            return self._reader(file_path, 'video').get_frame(t)
+
+    def get_audio_frame(self, file_path, t):
+        with self.lock:
+            return self._reader(file_path, 'audio').get_frame(t)
+
+    def close(self, *file_paths):
+        """
+        Close the readers of file_paths, they are opened again when they are needed
+        """
+        with self.lock:
+            for file_path in file_paths:
+                for kind in ('video', 'audio'):
+                    reader = self.readers.pop((file_path, kind), None)
+                    if reader is not None:
+                        reader.close()
+
+    def close_all(self):
+        with self.lock:
+            self.close(*{file_path for file_path, _ in self.readers})
+
+    def open_count(self):
+        return len(self.readers)
+
+    def _reader(self, file_path, kind):
+        key = (file_path, kind)
+        reader = self.readers.get(key)
+        if reader is not None:
+            self.readers.move_to_end(key)
+            return reader
+
+        while len(self.readers) >= self.max_open_readers:
+            _, oldest = self.readers.popitem(last=False)
+            oldest.close()
+
+        if kind == 'video':
+            reader = VideoFileClip(file_path, audio=False)
+        else:
+            reader = AudioFileClip(file_path, fps=self.AUDIO_FPS, nbytes=2)
+        self.readers[key] = reader
+        return reader
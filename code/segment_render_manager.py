@@ -0,0 +1,124 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from code.profile_manager import profile_manager
+
+# One VideoData per project and worker process, so the config, watermark and overlay managers are only set up once
+_worker_video_data = {}
+
+
+def _render_segment(options, size, videos, video):
+    """
+    Render a single segment in a worker process. Runs in its own process, so it opens its own moviepy/ffmpeg readers.
+
+    :param options: the VideoData constructor arguments (dir, config, subclip_duration, assembly, backend, draft)
+    :param size: the canvas size fixed by VideoData.get_max_video_size
+    :param videos: all video config dicts, with the size and duration from get_max_video_size
+    :param video: the video config dict, including the size and duration from get_max_video_size
+    :return: the path of the rendered segment
+    """
+    from code.video_stitch import VideoData
+
+    key = tuple(sorted(options.items()))
+    # Set up again when the config changed since, e.g. between the builds of watch mode
+    mtime = os.path.getmtime(os.path.join(options['dir'], options['config']))
+    mtime_cached, video_data = _worker_video_data.get(key, (None, None))
+    if video_data is None or mtime_cached != mtime:
+        video_data = VideoData(**options)
+        _worker_video_data[key] = (mtime, video_data)
+
+    video_data.size = size
+    video_data.config_manager.size = size
+    # Sized as in the parent, the table of contents lists the durations and its segment key covers every video
+    for worker_video, sized_video in zip(video_data.videos, videos):
+        worker_video.update(sized_video)
+
+    file_path = video_data.render_segment(video)
+    profile_manager.flush()
+    return file_path
+
+
+class SegmentRenderManager:
+    """
+    Fans the per clip segment renders of VideoData.prepare_clip out over worker processes.
+
+    Once the canvas size is known the segments don't depend on each other. Every worker writes its segment to the
+    cache, so the serial prepare_clips pass that follows only reads them back from disk.
+    """
+
+    def __init__(self, video_data, jobs=1, executor=None):
+        """
+        :param executor: a ProcessPoolExecutor shared with other projects, see BatchManager. It is not shut down here.
+        """
+        self.video_data = video_data
+        self.jobs = max(1, int(jobs or 1))
+        self.executor = executor
+        self.shared = executor is not None
+        self.lock = threading.Lock()
+
+    def render(self, videos):
+        """
+        Render all segments that are not cached yet.
+
+        :param videos: list of video config dicts
+        :return: list of rendered segment paths
+        """
+        pending = {}
+        for video in videos:
+            file_path = self.video_data.get_segment_path(video)
+            if not os.path.isfile(file_path):
+                pending.setdefault(file_path, video)
+
+        if not pending:
+            return []
+
+        print(f"Rendering {len(pending)} segments with {self.jobs} jobs")
+        options = self.get_options()
+        rendered = []
+        with ProcessPoolExecutor(max_workers=min(self.jobs, len(pending))) as executor:
+            futures = [executor.submit(_render_segment, options, self.video_data.size, self.video_data.videos, video)
+                       for video in pending.values()]
+            for future in as_completed(futures):
+                file_path = future.result()
+                print(f"  - Segment '{os.path.basename(file_path)}' rendered")
+                rendered.append(file_path)
+        return rendered
+
+    def render_one(self, video):
+        """
+        Render one segment, in a worker process of a pool that lives until shutdown when jobs > 1, so the build graph
+        can hand segments out one at a time.
+
+        :param video: video config dict
+        :return: the segment path
+        """
+        if self.jobs == 1:
+            return self.video_data.render_segment(video)
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.jobs)
+        file_path = self.executor.submit(_render_segment, self.get_options(), self.video_data.size,
+                                         self.video_data.videos, video).result()
+        print(f"  - Segment '{os.path.basename(file_path)}' rendered")
+        return file_path
+
+    def shutdown(self):
+        if self.executor is not None and not self.shared:
+            self.executor.shutdown()
+            self.executor = None
+        self.lock = threading.Lock()
+
+    def get_options(self):
+        return {
+            'dir': self.video_data.dir,
+            'config': self.video_data.config,
+            'subclip_duration': self.video_data.subclip_duration,
+            'assembly': self.video_data.assembly,
+            'backend': self.video_data.backend,
+            'draft': self.video_data.draft,
+            'profile': self.video_data.profile,
+            'smart_render': self.video_data.smart_render,
+            'text_cache_dir': self.video_data.config_manager.text_cache_dir,
+        }
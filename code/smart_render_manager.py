@@ -0,0 +1,172 @@
+import subprocess
+import tempfile
+
+from moviepy.editor import *
+
+from code.profile_manager import profile_manager
+
+
+class SmartRenderManager:
+    """
+    Renders a segment by re-encoding only where something is drawn on the video, and stream copying the rest.
+
+    The fades, the description bar and the other overlays give the time windows that have to be encoded. Everything
+    between them is cut from the transport stream at its keyframes and copied as it is, so only the GOPs around the
+    windows are decoded and encoded again. The parts are joined with the concat demuxer, which puts the parameter sets
+    of every part in band, so encoded and copied parts can follow each other. The audio is encoded once for the whole
+    segment and muxed over the joined video. A clip with a title, a background or a watermark has nothing to copy and
+    is rendered as a whole, as is a source that doesn't match the canvas or the encoder. So are clips with a ticket or
+    the countdown, both are drawn until the end of the clip.
+    """
+
+    # Shorter stretches are encoded with the windows around them, a copy has to be worth a cut
+    MIN_COPY_SECONDS = 1.0
+
+    def __init__(self, video_data):
+        self.video_data = video_data
+
+    def render(self, video, clip, file_path, watermark=False):
+        """
+        Write clip, the composited segment of video, to file_path.
+
+        :param video: video config dict
+        :param clip: the segment as prepare_clip builds it, the encoded parts are cut from it
+        :param file_path: segment path
+        :param watermark: the watermark is burnt into clip
+        :return: False when there is nothing to copy, the caller then renders the whole clip
+        """
+        video_data = self.video_data
+        source_file_path = video_data.transport_stream_manager.get_file_path(video)
+        info = video_data.media_probe_manager.probe(source_file_path)
+        if not self.is_compatible(info):
+            return False
+
+        start, _ = video_data.get_subclip_times(video)
+        keyframe_times = [time - info.get('start_time', 0) for time in info['keyframe_times']]
+        parts = self.plan(self.get_windows(video, clip.duration, watermark), keyframe_times, start, clip.duration)
+        if not any(kind == 'copy' for kind, _, _ in parts):
+            print("  - Smart render: the fades and overlays leave nothing to copy, rendering the whole segment")
+            return False
+
+        copied = sum(end - part_start for kind, part_start, end in parts if kind == 'copy')
+        print(f"  - Smart render: copying {copied:.1f} of {clip.duration:.1f} seconds")
+        dir_parts = video_data.cache_manager.get_dir('segment')
+        with tempfile.TemporaryDirectory(dir=dir_parts, prefix='smart-') as tmp_dir:
+            copy_file_paths = self.cut(source_file_path, start, parts, info['fps'], tmp_dir)
+            part_file_paths = []
+            for i, (kind, part_start, end) in enumerate(parts):
+                if kind == 'copy':
+                    part_file_paths.append(copy_file_paths.pop(0))
+                    continue
+                part_file_path = os.path.join(tmp_dir, f"encode{i:03d}.mp4")
+                video_data.write_videofile(clip.subclip(part_start, end).without_audio(), part_file_path)
+                part_file_paths.append(part_file_path)
+            self.join(part_file_paths, source_file_path, start, clip.duration, file_path)
+        return True
+
+    def is_compatible(self, info):
+        """
+        Copied GOPs and encoded parts can only be joined when the source is what the encoder writes for the canvas
+        """
+        return (info.get('codec') == 'h264' and info.get('pix_fmt') == 'yuv420p' and bool(info.get('fps'))
+                and [info.get('width'), info.get('height')] == list(self.video_data.size)
+                and bool(info.get('keyframe_times')))
+
+    def get_windows(self, video, duration, watermark=False):
+        """
+        Where the clip has to be encoded: the fades and every overlay, merged.
+
+        :return: sorted list of (start, end) in seconds of the clip
+        """
+        video_data = self.video_data
+        if watermark or video.get('background', False) or video.get('title', False):
+            return [(0, duration)]
+
+        windows = []
+        if video_data.fadein:
+            windows.append((0, video_data.fadein))
+        if video_data.fadeout:
+            windows.append((duration - video_data.fadeout, duration))
+        for layer in video_data.text_overlay_manager.video_text_overlay_layers(video, clip_duration=duration):
+            layer_start = layer['clip'].start
+            windows.append((layer_start, min(duration, layer_start + (layer['clip'].duration or duration))))
+
+        merged = []
+        for window_start, window_end in sorted((max(0, a), min(duration, b)) for a, b in windows):
+            if merged and window_start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], window_end))
+            else:
+                merged.append((window_start, window_end))
+        return merged
+
+    def plan(self, windows, keyframe_times, start, duration):
+        """
+        Split the clip into parts to encode and parts to copy. A copy runs from a keyframe to a keyframe, the encoded
+        parts take the windows and whatever is left of the GOPs around them.
+
+        :param windows: from get_windows
+        :param keyframe_times: keyframe times of the source, in seconds from its start
+        :param start: where the clip starts in the source
+        :param duration: of the clip
+        :return: list of ('encode' or 'copy', start, end) in seconds of the clip, covering the whole clip
+        """
+        keyframes = [time - start for time in keyframe_times if 0 <= time - start < duration]
+        parts = []
+        position = 0
+        for window_start, window_end in list(windows) + [(duration, duration)]:
+            copy_start = min((time for time in keyframes if time >= position), default=None)
+            copy_end = max((time for time in keyframes if time <= window_start), default=None)
+            if copy_start is not None and copy_end is not None and copy_end - copy_start >= self.MIN_COPY_SECONDS:
+                self._add(parts, 'encode', position, copy_start)
+                self._add(parts, 'copy', copy_start, copy_end)
+                position = copy_end
+            self._add(parts, 'encode', position, max(position, window_end))
+            position = max(position, window_end)
+        return parts
+
+    def cut(self, source_file_path, start, parts, fps, tmp_dir):
+        """
+        Cut the copied parts out of the source at their keyframes with the segment muxer, in one pass and with
+        stream copy.
+
+        :return: list of file paths, one per copied part, in order
+        """
+        times = []
+        for kind, part_start, end in parts:
+            if kind == 'copy':
+                times.extend([part_start, end])
+        # Pieces 1, 3, 5, ... lie between the start and the end of a copied part. A copy from the very start of the
+        # source needs no cut, its piece is the first one.
+        first = 1
+        if start + times[0] <= 0:
+            times, first = times[1:], 0
+        # Half a frame early, the muxer cuts at the first keyframe at or after a time
+        segment_times = ','.join(f"{start + time - 0.5 / fps:.6f}" for time in times)
+        # Nothing after the last cut is needed
+        command = (f"ffmpeg -y -v error -t {start + times[-1] + 1} -i '{source_file_path}' -map 0:v:0 -c copy "
+                   f"-f segment -segment_format mp4 -segment_times {segment_times} -reset_timestamps 1 "
+                   f"'{os.path.join(tmp_dir, 'copy%03d.mp4')}'")
+        with profile_manager.span("ffmpeg cut", 'ffmpeg', parts=(len(times) + 1) // 2):
+            subprocess.run(command, shell=True, check=True)
+        return [os.path.join(tmp_dir, f"copy{i:03d}.mp4") for i in range(first, len(times) + 1, 2)]
+
+    def join(self, part_file_paths, source_file_path, start, duration, file_path):
+        """
+        Join the parts with the concat demuxer and stream copy, and encode the audio of the source under them
+        """
+        list_file_path = os.path.join(os.path.dirname(part_file_paths[0]), "parts.txt")
+        with open(list_file_path, 'w') as list_file:
+            list_file.writelines(f"file '{part_file_path}'\n" for part_file_path in part_file_paths)
+        command = (f"ffmpeg -y -v error -f concat -safe 0 -i '{list_file_path}' -ss {start} -t {duration} "
+                   f"-i '{source_file_path}' -map 0:v -map '1:a?' -c:v copy -c:a aac -ar 44100 -t {duration} "
+                   f"-movflags +faststart '{file_path}'")
+        with profile_manager.span("ffmpeg smart join", 'ffmpeg', parts=len(part_file_paths)):
+            subprocess.run(command, shell=True, check=True)
+
+    def _add(self, parts, kind, start, end):
+        if end <= start:
+            return
+        if parts and parts[-1][0] == kind and parts[-1][2] >= start:
+            parts[-1] = (kind, parts[-1][1], end)
+        else:
+            parts.append((kind, start, end))
@@ -2,6 +2,8 @@ import subprocess
 
 from moviepy.editor import *
 
+from code.profile_manager import profile_manager
+
 
 class StageVideoManager:
     """
@@ -9,16 +11,20 @@ class StageVideoManager:
     are picked up.
     """
 
-    def __init__(self, config_manager):
+    COMMAND = "ffmpeg -y -i '{input}' -c:v libx264 -c:a aac -f mp4 '{output}'"
+    # Only the audio of a background source is used, its video only gives the size and duration and is copied as it is
+    BACKGROUND_COMMAND = "ffmpeg -y -i '{input}' -c:v copy -c:a aac -f mp4 '{output}'"
+    # Draft proxies: seek to the part that is used before decoding, scale down and encode as fast as possible
+    DRAFT_COMMAND = ("ffmpeg -y -ss {start} {duration}-i '{input}' "
+                     "-vf 'scale=trunc(iw*{scale}/2)*2:trunc(ih*{scale}/2)*2' "
+                     "-c:v libx264 -preset ultrafast -c:a aac -f mp4 '{output}'")
+
+    def __init__(self, config_manager, cache_manager, draft_scale=None, subclip_duration=None):
         self.config_manager = config_manager
+        self.cache_manager = cache_manager
         self.dir = self.config_manager.dir
-        self.dir_ts = os.path.join(self.dir, "stage/")
-        self.setup_path()
-
-    def setup_path(self):
-        # Create subdirectory "ts" if not exists and then check .ts files.
-        if not os.path.exists(self.dir_ts):
-            os.makedirs(self.dir_ts)
+        self.draft_scale = draft_scale
+        self.subclip_duration = subclip_duration
 
     def convert(self, input_filepath, video):
         """
@@ -30,15 +36,38 @@ class StageVideoManager:
         """
         stage_file_path = self.get_file_path(video)
         if not os.path.isfile(stage_file_path):
-            command = f"ffmpeg -i '{input_filepath}' -c:v libx264 -c:a aac '{stage_file_path}'"
-            subprocess.run(command, shell=True, check=True)
+            # Write to a temp file first, a failed conversion must not leave a partial file behind
+            tmp_file_path = stage_file_path + '.part'
+            command = self.get_command(video).format(input=input_filepath, output=tmp_file_path)
+            try:
+                with profile_manager.span("ffmpeg stage", 'ffmpeg', video=video['video']):
+                    subprocess.run(command, shell=True, check=True)
+                os.replace(tmp_file_path, stage_file_path)
+            finally:
+                if os.path.isfile(tmp_file_path):
+                    os.remove(tmp_file_path)
+        self.cache_manager.touch('stage', stage_file_path)
         return stage_file_path
 
+    def get_command(self, video):
+        if not self.draft_scale:
+            return self.BACKGROUND_COMMAND if video.get('background', False) else self.COMMAND
+
+        # Start where the video starts and cut to the -preview duration, see VideoData.get_subclip_times.
+        # The "duration" of a video is left to video_clip, get_max_video_size updates it after ingest.
+        duration = f"-t {self.subclip_duration} " if self.subclip_duration is not None else ""
+        return self.DRAFT_COMMAND.format(start=video.get('start', 0), duration=duration, scale=self.draft_scale,
+                                         input='{input}', output='{output}')
+
+    def get_key(self, video):
+        """
+        Key over the source content and the conversion command
+        """
+        return self.cache_manager.key('stage', self.cache_manager.fingerprint(self._get_file_path(video)),
+                                      self.get_command(video))
+
     def get_file_path(self, video):
-        file_path = self._get_file_path(video)
-        filename_without_ext = os.path.splitext(os.path.basename(file_path))[0]
-        stage_file_path = os.path.join(self.dir_ts, filename_without_ext + '.mp4')
-        return stage_file_path
+        return self.cache_manager.get_path('stage', self.get_key(video), '.mp4')
 
     def _get_file_path(self, video):
         return os.path.join(self.dir, video['video'])
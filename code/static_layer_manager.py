@@ -0,0 +1,111 @@
+import numpy as np
+from moviepy.editor import *
+
+
+class StaticLayerManager:
+    """
+    Flattens overlay layers that don't change over time into one RGBA image.
+
+    Text, badges and bars are ImageClips, or composites of them, that look the same on every frame apart from their
+    fades. A CompositeVideoClip blits each of them again on every frame, so the table of contents costs a blit per row.
+    Static layers that share their timing are rasterized once into one ImageClip, cropped to what they cover, and their
+    fades are applied as one scalar per frame. A frame then costs one blit however many layers went in.
+    """
+
+    def is_static(self, clip):
+        """
+        :return: True when every frame of clip is the same: ImageClips, and composites of them at fixed positions
+        """
+        if clip.mask is not None and not self.is_static(clip.mask):
+            return False
+        if isinstance(clip, CompositeVideoClip):
+            # A composite keeps its class through clip.fl (e.g. a fade), only its own make_frame is known to be still
+            if not clip.make_frame.__qualname__.startswith('CompositeVideoClip.'):
+                return False
+            return all(self.is_static(layer) and self._is_fixed(layer, clip) for layer in clip.clips)
+        return isinstance(clip, ImageClip)
+
+    def flatten(self, clips, size):
+        """
+        Rasterize static clips into one image.
+
+        :param clips: static clips, composited in order
+        :param size: (width, height) of the canvas they are positioned on
+        :return: ImageClip with the transparency as mask, positioned at the bounding box of the clips. None when
+                 nothing is visible.
+        """
+        canvas = CompositeVideoClip(clips, size=size)
+        alpha = canvas.mask.get_frame(0)
+        rows, columns = np.nonzero(alpha)
+        if not len(rows):
+            return None
+        # The canvas is composited onto black, so its colour is premultiplied by alpha. The mask applies alpha again
+        # when the image is composited, undo it first so soft edges don't come out darker.
+        rgb = canvas.get_frame(0).astype(float)
+        visible = alpha > 0
+        rgb[visible] /= alpha[visible][:, np.newaxis]
+        rgb = np.clip(np.round(rgb), 0, 255).astype(np.uint8)
+        top, bottom, left, right = rows.min(), rows.max() + 1, columns.min(), columns.max() + 1
+        image = ImageClip(rgb[top:bottom, left:right])
+        image = image.set_mask(ImageClip(alpha[top:bottom, left:right], ismask=True))
+        return image.set_position((int(left), int(top)))
+
+    def flatten_layers(self, layers, size):
+        """
+        Flatten neighbouring static layers that share their start, duration and fades into one layer. Layers that
+        change over time stay as they are, so the stacking order is kept.
+
+        :param layers: list of dicts with the 'clip', its 'fadein', 'fadeout' and 'fps', see
+                       TextOverlayManager.video_text_overlay_layers
+        :param size: (width, height) of the canvas
+        :return: list of layer dicts
+        """
+        groups = []
+        for layer in layers:
+            timing = (layer['clip'].start, layer['clip'].duration, layer['fadein'], layer['fadeout'])
+            static = layer['fps'] is None and self.is_static(layer['clip'])
+            if static and groups and groups[-1][0] == timing:
+                groups[-1][1].append(layer)
+            else:
+                groups.append((timing if static else None, [layer]))
+
+        flattened = []
+        for timing, group in groups:
+            if timing is None:
+                flattened.extend(group)
+                continue
+            clip = self.flatten([layer['clip'].set_start(0) for layer in group], size)
+            if clip is not None:
+                start, duration, fadein, fadeout = timing
+                clip = clip.set_start(start).set_duration(duration)
+                flattened.append({'clip': clip, 'fadein': fadein, 'fadeout': fadeout, 'fps': None})
+        return flattened
+
+    def fade(self, clip, fadein=None, fadeout=None):
+        """
+        Fade the colour of clip in from and out to black, like vfx.fadein and vfx.fadeout, as one scalar per frame.
+        The mask is left alone.
+
+        :param fadein: seconds, or None
+        :param fadeout: seconds, or None
+        """
+        if not fadein and not fadeout:
+            return clip
+        duration = clip.duration
+
+        def fl(get_frame, t):
+            factor = 1.0
+            if fadein:
+                factor = min(factor, t / fadein)
+            if fadeout:
+                factor = min(factor, (duration - t) / fadeout)
+            frame = get_frame(t)
+            return frame if factor >= 1 else max(0.0, factor) * frame
+
+        return clip.fl(fl)
+
+    def _is_fixed(self, layer, composite):
+        # Shown for the whole composite at one position
+        if layer.start > 0 or (layer.end is not None and composite.end is not None and layer.end < composite.end):
+            return False
+        return layer.pos(0) == layer.pos(composite.duration or 0)
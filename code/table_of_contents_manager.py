@@ -1,14 +1,26 @@
 from moviepy.editor import *
 
+from code.text_cache_manager import TextCacheManager
+from code.profile_manager import profile_manager
+from code.static_layer_manager import StaticLayerManager
+
 
 class TableOfContentsManager:
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, show_preview=False):
         self.config_manager = config_manager
+        # Pops up a window with the table of contents while rendering, and waits for it to be closed
+        self.show_preview = show_preview
         self.videos = self.config_manager.videos
         self.toc_fade_time = self.config_manager.toc_fade_time
         self.txt_ticket_fontsize = self.config_manager.txt_ticket_fontsize
+        self.text_cache_manager = TextCacheManager(self.config_manager)
+        self.static_layer_manager = StaticLayerManager()
 
     def prepare_clip(self, video, clip):
+        with profile_manager.span("table of contents", 'clip', video=video['video']):
+            return self._prepare_clip(video, clip)
+
+    def _prepare_clip(self, video, clip):
         toc_clip = None
         if video.get("show toc", False):
             black_clip_length = self.toc_fade_time - 1
@@ -42,16 +54,16 @@ class TableOfContentsManager:
         offset_x_middle = 0
 
         # Add Title and Header Line
-        title = TextClip("List of demo videos", fontsize=self.txt_ticket_fontsize * 2,
+        title = self.text_cache_manager.text_clip("List of demo videos", fontsize=self.txt_ticket_fontsize * 2,
                          color="orange").set_position(('center', offset_y))
         offset_y = (title.h * 2) + margin
 
         header = [
-            TextClip("Ticket", fontsize=self.txt_ticket_fontsize,
+            self.text_cache_manager.text_clip("Ticket", fontsize=self.txt_ticket_fontsize,
                      color="orange").set_position(('left', offset_y)).margin(margin),
-            TextClip("Description", fontsize=self.txt_ticket_fontsize,
+            self.text_cache_manager.text_clip("Description", fontsize=self.txt_ticket_fontsize,
                      color="orange").set_position(('center', offset_y)).margin(margin),
-            TextClip("Length", fontsize=self.txt_ticket_fontsize,
+            self.text_cache_manager.text_clip("Length", fontsize=self.txt_ticket_fontsize,
                      color="orange").set_position(('right', offset_y)).margin(margin),
         ]
         offset_y += (header[0].h * 2) + margin
@@ -63,14 +75,14 @@ class TableOfContentsManager:
         for video in self.videos:
             if video.get('type', 'video') == 'video' and video.get('show on toc', True):
                 txt_ticket = (
-                    TextClip(video.get("ticket", "-"), fontsize=self.txt_ticket_fontsize,
+                    self.text_cache_manager.text_clip(video.get("ticket", "-"), fontsize=self.txt_ticket_fontsize,
                              color="yellow")
                     .set_position(('left', offset_y))
                     .margin(left=margin, right=margin, )
                 )
 
                 txt_duration = (
-                    TextClip(
+                    self.text_cache_manager.text_clip(
                         self._duration_str(video.get("duration")),
                         fontsize=self.txt_ticket_fontsize,
                         color="yellow"
@@ -80,7 +92,7 @@ class TableOfContentsManager:
                 )
 
                 txt_description = (
-                    TextClip(video.get("description", "-"), fontsize=self.txt_ticket_fontsize,
+                    self.text_cache_manager.text_clip(video.get("description", "-"), fontsize=self.txt_ticket_fontsize,
                              color="white")
                     .margin(left=margin, right=margin, )
                 )
@@ -111,22 +123,17 @@ class TableOfContentsManager:
         toc_text = "\n".join(toc)
         print(f"Table of Contents:\n{toc_text}")
 
-        result = (
-            self._composite_video_clip(clips)
-            .set_duration(self.toc_fade_time)
-            .fx(vfx.fadeout, 1.0)
-            .fx(vfx.fadein, 1.0)  # for smooth fadeout
-        )
+        # The rows don't change over time, so they are drawn once into one image and only faded per frame
+        print(f"  - Flatten: {len(clips)} clips")
+        result = self.static_layer_manager.flatten(clips, self.config_manager.size)
+        if result is None:
+            return None
 
-        if result:
+        if self.show_preview:
             result.show()
 
-        result = (
-            result
-            .fx(vfx.fadeout, 1.0)
-            .fx(vfx.fadein, 1.0)  # for smooth fadeout
-        )
-        return result
+        result = result.set_duration(self.toc_fade_time)
+        return self.static_layer_manager.fade(result, fadein=1.0, fadeout=1.0)  # for smooth fadeout
 
     def _composite_video_clip(self, clips):
         clips = [clip for clip in clips if clip is not None]
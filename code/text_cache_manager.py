@@ -0,0 +1,105 @@
+import hashlib
+import json
+import tempfile
+
+import numpy as np
+from moviepy.editor import *
+
+
+class TextCacheManager:
+    """
+    Disk backed cache of rendered TextClip images.
+
+    TextClip shells out to ImageMagick for every render. The RGB and alpha of each render are stored as a compressed
+    npz file keyed on everything that affects the image, so a warm run makes no ImageMagick calls at all.
+    The least recently used files are evicted once the cache grows past its size cap. The cache lives in cache/text/
+    of the working directory, or in text_cache_dir when several projects share it.
+    """
+
+    def __init__(self, config_manager, max_size_mb=None):
+        self.config_manager = config_manager
+        self.dir = self.config_manager.dir
+        self.dir_text = self.config_manager.text_cache_dir or os.path.join(self.dir, "cache/text/")
+        self.max_size = (max_size_mb if max_size_mb else self.config_manager.text_cache_size_mb) * 1024 ** 2
+        self.hits = 0
+        self.misses = 0
+
+    def text_clip(self, txt, font='Courier', fontsize=None, color='black', bg_color='transparent', size=None):
+        """
+        Drop-in for TextClip(txt, size=size, color=color, bg_color=bg_color, fontsize=fontsize, font=font)
+
+        :return: ImageClip with the text, and its transparency as mask
+        """
+        key = self.get_key(txt, font, fontsize, color, bg_color, size)
+        file_path = os.path.join(self.dir_text, key + ".npz")
+
+        image = self._read(file_path)
+        if image is None:
+            self.misses += 1
+            txt_clip = TextClip(txt, size=size, color=color, bg_color=bg_color, fontsize=fontsize, font=font)
+            rgb = txt_clip.get_frame(0).astype(np.uint8)
+            if txt_clip.mask is not None:
+                alpha = np.round(txt_clip.mask.get_frame(0) * 255).astype(np.uint8)
+            else:
+                alpha = np.full(rgb.shape[:2], 255, dtype=np.uint8)
+            txt_clip.close()
+            image = (rgb, alpha)
+            self._write(file_path, rgb, alpha)
+        else:
+            self.hits += 1
+
+        rgb, alpha = image
+        return ImageClip(rgb).set_mask(ImageClip(1.0 * alpha / 255, ismask=True))
+
+    def get_key(self, txt, font, fontsize, color, bg_color, size):
+        key = json.dumps([txt, font, fontsize, color, bg_color, list(size) if size else None])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _read(self, file_path):
+        try:
+            with np.load(file_path) as data:
+                image = (data['rgb'], data['alpha'])
+        except (OSError, KeyError, ValueError):
+            return None
+        # Mark as recently used for the eviction
+        try:
+            os.utime(file_path)
+        except OSError:
+            pass
+        return image
+
+    def _write(self, file_path, rgb, alpha):
+        if not os.path.exists(self.dir_text):
+            os.makedirs(self.dir_text, exist_ok=True)
+
+        # Write via a temp file, other processes may be reading the same key
+        fd, tmp_file_path = tempfile.mkstemp(dir=self.dir_text, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                np.savez_compressed(tmp_file, rgb=rgb, alpha=alpha)
+            os.replace(tmp_file_path, file_path)
+        finally:
+            if os.path.isfile(tmp_file_path):
+                os.remove(tmp_file_path)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used files until the cache fits in its size cap.
+        """
+        entries = []
+        for entry in os.scandir(self.dir_text):
+            if entry.name.endswith('.npz'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, file_path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
@@ -1,17 +1,45 @@
 from moviepy.editor import *
 
+from code.countdown_manager import CountdownManager
+from code.profile_manager import profile_manager
+from code.static_layer_manager import StaticLayerManager
+from code.text_cache_manager import TextCacheManager
+
 
 class TextOverlayManager:
 
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, show_preview=False):
         self.config_manager = config_manager
+        # Pops up a window with each overlay while rendering, and waits for it to be closed
+        self.show_preview = show_preview
 
         self.txt_ticket_fontsize = self.config_manager.txt_ticket_fontsize
         self.fadein = self.config_manager.fadein
         self.fadeout = self.config_manager.fadeout
+        self.text_cache_manager = TextCacheManager(self.config_manager)
+        self.countdown_manager = CountdownManager(self.config_manager, self.text_cache_manager)
+        self.static_layer_manager = StaticLayerManager()
 
     def video_text_overlay_clip(self, video, clip_duration, description_duration=3, margin=5):
+        with profile_manager.span("text overlay", 'clip', video=video['video']):
+            layers = self.video_text_overlay_layers(video, clip_duration, description_duration, margin)
+            # The ticket and the description bar are still apart from their fades, they are blitted as one image each
+            layers = self.static_layer_manager.flatten_layers(layers, self.config_manager.size)
+
+            # Process and return
+            clips = [self._fade(layer) for layer in layers]
+            result = self._composite_video_clip(clips)
+        if result and self.show_preview:
+            result.show()
+        return result
+
+    def video_text_overlay_layers(self, video, clip_duration, description_duration=3, margin=5):
+        """
+        The overlays of a video as positioned clips without their fades, so every render backend shares the layout.
 
+        :return: list of dicts with the 'clip', its 'fadein' and 'fadeout' in seconds and its 'fps': 1 for layers that
+                 change every second, None for still ones
+        """
         ticket_clip, ticket_width = self._render_ticket_clip(clip_duration, margin, video)
         # duration_clip, duration_width = self._render_duration_clip(clip_duration, description_duration, margin, video)
         duration_clip, duration_width = self._render_remaining_duration_clip(video=video, duration=clip_duration,
@@ -20,21 +48,24 @@ class TextOverlayManager:
 
         timelapse_clip = None  # self.render_timelapse_clip(video, clip_duration)
 
-        # Process and return
-        clips = [ticket_clip, txt_clip, duration_clip, timelapse_clip, ]
-        result = self._composite_video_clip(clips)
-        # This will show a preview to the user while rendering, comment out to use:
-        # if result:
-        #     result.show()
-        return result
+        layers = [
+            {'clip': ticket_clip, 'fadein': None, 'fadeout': self.fadeout, 'fps': None},
+            {'clip': txt_clip, 'fadein': self.fadein, 'fadeout': None, 'fps': None},
+            {'clip': duration_clip, 'fadein': None, 'fadeout': None, 'fps': 1},
+            {'clip': timelapse_clip, 'fadein': None, 'fadeout': None, 'fps': 1},
+        ]
+        return [layer for layer in layers if layer['clip'] is not None]
+
+    def _fade(self, layer):
+        return self.static_layer_manager.fade(layer['clip'], fadein=layer['fadein'], fadeout=layer['fadeout'])
 
     def _render_duration_clip(self, clip_duration, description_duration, margin, video):
         # Display duration of clip
         duration_width = 0
         duration_clip = None
         if video.get('show duration', True):
-            txt = TextClip(f"{int(clip_duration)} sec", font="Amiri-Bold", fontsize=self.txt_ticket_fontsize,
-                           color='blue').set_duration(
+            txt = self.text_cache_manager.text_clip(f"{int(clip_duration)} sec", font="Amiri-Bold",
+                                                    fontsize=self.txt_ticket_fontsize, color='blue').set_duration(
                 description_duration).fx(vfx.fadeout, self.fadeout)
             duration_clip = (
                 txt.on_color(size=(txt.w + 6, txt.h + 6),
@@ -48,32 +79,12 @@ class TextOverlayManager:
             txt.close()
         return duration_clip, duration_width
 
-    def _render_remaining_duration_clip(self, video, duration, margin, time_step=1):
-        # Display duration of clip
+    def _render_remaining_duration_clip(self, video, duration, margin):
+        # Display duration of clip, counting down every second
         duration_width = 0
         timelapse_bar = None
         if video.get('show duration', True):
-            txt_clips = []
-            for i in range(int(duration), 0, -time_step):
-                minutes, secs = divmod(i, 60)
-                time_format = "{:02d}:{:02d}".format(minutes, secs, duration // 60, duration % 60)
-
-                txt = (TextClip(time_format, font="Amiri-Bold", fontsize=self.txt_ticket_fontsize,
-                                color='white').set_duration(time_step)
-                       # .fx(vfx.fadeout, self.fadeout) # Enable the fadeout/in if you want a cool "flash" effect
-                       )
-                txt = (
-                    txt.on_color(size=(txt.w + 6, txt.h + 6),
-                                 color=(255, 0, 0))
-                    .margin(1)
-                    .margin(bottom=margin, left=margin, right=margin, opacity=0.0)
-                )
-                txt_clips.append(txt)
-                txt.close()
-
-            timelapse_bar = concatenate_videoclips(txt_clips, method="compose")
-            timelapse_bar = timelapse_bar.set_duration(duration).set_position(('right', 'bottom'))
-            duration_width = timelapse_bar.w - margin
+            timelapse_bar, duration_width = self.countdown_manager.clip(duration, margin)
 
         return timelapse_bar, duration_width
 
@@ -86,7 +97,8 @@ class TextOverlayManager:
             width, _ = self.config_manager.size
             width = width - left_offset - margin - right_offset
 
-            txt = TextClip(description, font="Amiri-Bold", fontsize=self.txt_ticket_fontsize, color='black')
+            txt = self.text_cache_manager.text_clip(description, font="Amiri-Bold",
+                                                    fontsize=self.txt_ticket_fontsize, color='black')
             txt_clip = (
                 txt.on_color(size=(max(1 - width, txt.w + 6), txt.h + 6),
                              color=3 * [255])
@@ -96,17 +108,17 @@ class TextOverlayManager:
             )
             # Full width hack
             bg_clip = (
-                TextClip("n/a", font="Amiri-Bold", fontsize=self.txt_ticket_fontsize, color='white')
+                self.text_cache_manager.text_clip("n/a", font="Amiri-Bold", fontsize=self.txt_ticket_fontsize,
+                                                  color='white')
                 .on_color(size=(width, txt.h + 6),
                           color=3 * [255])
                 .margin(1)
                 .margin(bottom=margin, left=left_offset, opacity=0.0)
                 .set_pos(('left', 'bottom'))
             )
-            # keep these two the same
-            fadein = self.fadein
-            txt_clip = txt_clip.set_duration(description_duration).fx(vfx.fadein, fadein)
-            bg_clip = bg_clip.set_duration(txt_clip.duration).fx(vfx.fadein, fadein)
+            # keep these two the same, the layer fades in as one
+            txt_clip = txt_clip.set_duration(description_duration)
+            bg_clip = bg_clip.set_duration(txt_clip.duration)
 
             # Render into single clip
             txt_clip = self._composite_video_clip([bg_clip, txt_clip, ])
@@ -120,7 +132,8 @@ class TextOverlayManager:
 
         ticket = video.get('ticket', None)
         if ticket is not None:
-            txt = TextClip(ticket, font="Amiri-Bold", fontsize=self.txt_ticket_fontsize, color="red")
+            txt = self.text_cache_manager.text_clip(ticket, font="Amiri-Bold", fontsize=self.txt_ticket_fontsize,
+                                                    color="red")
             ticket_clip = (
                 txt.on_color(size=(txt.w + 6, txt.h + 6),
                              color=3 * [255])
@@ -129,7 +142,7 @@ class TextOverlayManager:
                 .set_pos(('left', pos_y))
             )
             ticket_width = ticket_clip.w
-            ticket_clip = ticket_clip.set_duration(clip_duration).fx(vfx.fadeout, self.fadeout)
+            ticket_clip = ticket_clip.set_duration(clip_duration)
             txt.close()
         return ticket_clip, ticket_width
 
@@ -142,7 +155,7 @@ class TextOverlayManager:
                 minutes, secs = divmod(i, 60)
                 # format as MM:SS
                 time_format = "{:02d}:{:02d}/{:02d}:{:02d}".format(minutes, secs, duration // 60, duration % 60)
-                txt = TextClip(time_format, fontsize=self.txt_ticket_fontsize, color='white')
+                txt = self.text_cache_manager.text_clip(time_format, fontsize=self.txt_ticket_fontsize, color='white')
                 txt = txt.set_duration(1).set_pos(('right', 'bottom'))
                 txt_clips.append(txt)
 
@@ -0,0 +1,92 @@
+import bisect
+
+import numpy as np
+from moviepy.editor import *
+
+
+class TimelineManager:
+    """
+    Builds the final timeline from the prepared clips in one flat pass.
+
+    moviepy's concatenate_videoclips scans every clip to find the one playing at time t, and chaining it clip by clip
+    nests the composites N levels deep. Here the clip start times are kept in a sorted list, so every video frame and
+    audio chunk is looked up with a binary search, whatever the number of clips.
+    """
+
+    def concatenate(self, clips, release=None):
+        """
+        :param clips: list of clips, played one after the other
+        :param release: called with the index of a clip once the video frames have moved on to another clip, e.g. to
+                        close its readers
+        :return: the timeline clip, its start_times attribute holds the start time of every clip
+        """
+        start_times = []
+        total_duration = 0
+        for clip in clips:
+            start_times.append(total_duration)
+            total_duration += clip.duration
+
+        timeline = VideoClip(make_frame=self._make_frame(clips, start_times, 'get_frame', release))
+        timeline = timeline.set_duration(total_duration)
+        timeline.size = (max(clip.w for clip in clips), max(clip.h for clip in clips))
+
+        fps = [clip.fps for clip in clips if getattr(clip, 'fps', None)]
+        if fps:
+            timeline.fps = max(fps)
+
+        if any(clip.mask is not None for clip in clips):
+            masks = [clip.mask if clip.mask is not None else
+                     ColorClip(clip.size, color=1, ismask=True, duration=clip.duration) for clip in clips]
+            mask = VideoClip(ismask=True, make_frame=self._make_frame(masks, start_times, 'get_frame'))
+            timeline.mask = mask.set_duration(total_duration)
+
+        if any(clip.audio is not None for clip in clips):
+            timeline.audio = self._concatenate_audio(clips, start_times, total_duration)
+
+        timeline.start_times = start_times
+        return timeline
+
+    def _make_frame(self, clips, start_times, method, release=None):
+        last = len(clips) - 1
+        current = [None]
+
+        def make_frame(t):
+            i = min(max(bisect.bisect_right(start_times, t) - 1, 0), last)
+            if release is not None and current[0] != i:
+                if current[0] is not None:
+                    release(current[0])
+                current[0] = i
+            return getattr(clips[i], method)(t - start_times[i])
+
+        return make_frame
+
+    def _concatenate_audio(self, clips, start_times, total_duration):
+        audios = [clip.audio for clip in clips]
+        nchannels = max(audio.nchannels for audio in audios if audio is not None)
+        fps = max(audio.fps for audio in audios if audio is not None)
+        starts = np.array(start_times)
+
+        def make_frame(t):
+            is_scalar = np.isscalar(t)
+            t = np.atleast_1d(np.asarray(t, dtype=float))
+            indexes = np.clip(np.searchsorted(starts, t, side='right') - 1, 0, len(audios) - 1)
+            frame = np.zeros((len(t), nchannels))
+
+            # An audio chunk spans at most a couple of clips, only those are asked for their samples
+            for i in np.unique(indexes):
+                audio = audios[i]
+                if audio is None:
+                    continue
+                in_clip = indexes == i
+                samples = audio.get_frame(t[in_clip] - starts[i])
+                frame[in_clip] = samples.reshape(-1, audio.nchannels) if audio.nchannels > 1 \
+                    else np.reshape(samples, (-1, 1))
+
+            return frame[0] if is_scalar else frame
+
+        # make_frame is set afterwards, AudioClip would read the first chunk to count the channels and open a reader
+        audio = AudioClip(duration=total_duration)
+        audio.make_frame = make_frame
+        audio.nchannels = nchannels
+        audio.fps = fps
+        return audio
@@ -2,31 +2,39 @@ import subprocess
 
 from moviepy.editor import *
 
+from code.profile_manager import profile_manager
+
 
 class TransportStreamManager:
 
-    def __init__(self, config_manager):
+    COMMAND = "ffmpeg -y -i '{input}' -c copy -bsf:v h264_mp4toannexb -f mpegts '{output}'"
+
+    def __init__(self, config_manager, cache_manager, stage_video_manager):
         self.config_manager = config_manager
+        self.cache_manager = cache_manager
+        self.stage_video_manager = stage_video_manager
         self.dir = self.config_manager.dir
-        self.dir_ts = os.path.join(self.dir, "ts/")
-        self.setup_path()
-
-    def setup_path(self):
-        # Create subdirectory "ts" if not exists and then check .ts files.
-        if not os.path.exists(self.dir_ts):
-            os.makedirs(self.dir_ts)
 
     def convert(self, input_filepath, video):
         ts_file_path = self.get_file_path(video)
         if not os.path.isfile(ts_file_path):
-            command = f"ffmpeg -i '{input_filepath}' -c copy -bsf:v h264_mp4toannexb -f mpegts '{ts_file_path}'"
-            subprocess.run(command, shell=True, check=True)
+            # Write to a temp file first, a failed conversion must not leave a partial file behind
+            tmp_file_path = ts_file_path + '.part'
+            command = self.COMMAND.format(input=input_filepath, output=tmp_file_path)
+            try:
+                with profile_manager.span("ffmpeg ts", 'ffmpeg', video=video['video']):
+                    subprocess.run(command, shell=True, check=True)
+                os.replace(tmp_file_path, ts_file_path)
+            finally:
+                if os.path.isfile(tmp_file_path):
+                    os.remove(tmp_file_path)
+        self.cache_manager.touch('ts', ts_file_path)
+
+    def get_key(self, video):
+        """
+        Key over the staged video it is converted from and the conversion command
+        """
+        return self.cache_manager.key('ts', self.stage_video_manager.get_key(video), self.COMMAND)
 
     def get_file_path(self, video):
-        file_path = self._get_file_path(video)
-        filename_without_ext = os.path.splitext(os.path.basename(file_path))[0]
-        ts_file_path = os.path.join(self.dir_ts, filename_without_ext + '.ts')
-        return ts_file_path
-
-    def _get_file_path(self, video):
-        return os.path.join(self.dir, video['video'])
+        return self.cache_manager.get_path('ts', self.get_key(video), '.ts')
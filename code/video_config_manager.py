@@ -16,6 +16,21 @@ class VideoConfigManager:
         self.fadeout = None
         self.fadein = None
         self.toc_fade_time = 5.0
+        self.jobs = None
+        self.assembly = None
+        self.backend = None
+        self.text_cache_size_mb = 256
+        self.text_cache_dir = None
+        self.cache_size_gb = 20
+        self.draft_scale = 0.5
+        self.chunk_seconds = 60
+        self.max_open_readers = 16
+        self.download_cache_dir = None
+        self.download_jobs = 4
+        self.asset_cache_dir = None
+        self.asset_max_age = 3600
+        self.chapters = True
+        self.smart_render = False
 
     def load_and_verify_config(self, config_file):
         """
@@ -32,6 +47,22 @@ class VideoConfigManager:
         self.txt_ticket_fontsize = self._get_config_value(config_dict, 'txt_ticket_fontsize', 22)
         self.fadein = self._get_config_value(config_dict, 'fadein', 1.0)
         self.fadeout = self._get_config_value(config_dict, 'fadeout', 1.0)
+        # None when not set, the final encode then uses every core
+        self.jobs = self._get_config_value(config_dict, 'jobs', None)
+        self.assembly = self._get_config_value(config_dict, 'assembly', 'render')
+        self.backend = self._get_config_value(config_dict, 'backend', 'moviepy')
+        self.text_cache_size_mb = self._get_config_value(config_dict, 'text_cache_size_mb', 256)
+        self.text_cache_dir = self._get_config_value(config_dict, 'text_cache_dir', None)
+        self.cache_size_gb = self._get_config_value(config_dict, 'cache_size_gb', 20)
+        self.draft_scale = self._get_config_value(config_dict, 'draft_scale', 0.5)
+        self.chunk_seconds = self._get_config_value(config_dict, 'chunk_seconds', 60)
+        self.max_open_readers = self._get_config_value(config_dict, 'max_open_readers', 16)
+        self.download_cache_dir = self._get_config_value(config_dict, 'download_cache_dir', None)
+        self.download_jobs = self._get_config_value(config_dict, 'download_jobs', 4)
+        self.asset_cache_dir = self._get_config_value(config_dict, 'asset_cache_dir', None)
+        self.asset_max_age = self._get_config_value(config_dict, 'asset_max_age', 3600)
+        self.chapters = self._get_config_value(config_dict, 'chapters', True)
+        self.smart_render = self._get_config_value(config_dict, 'smart_render', False)
 
         self.output_file = self._generate_output_file_name(config_dict) if not self.output_file else self.output_file
         self.opening_videos = [video for video in self.videos if video.get('type') == 'opening']
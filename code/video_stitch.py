@@ -1,38 +1,94 @@
 from moviepy.editor import *
 
-import hashlib
-import json
-
-from moviepy.editor import *
-
+from code.assembly_manager import AssemblyManager
+from code.build_graph_manager import BuildGraphManager, Task
+from code.cache_manager import CacheManager
+from code.chapter_manager import ChapterManager
+from code.chunk_render_manager import ChunkRenderManager
+from code.download_manager import DownloadManager
+from code.filtergraph_manager import FilterGraphManager
+from code.ingest_manager import IngestManager
+from code.job_queue_manager import JobQueueManager
+from code.media_probe_manager import MediaProbeManager
+from code.profile_manager import profile_manager
+from code.reader_manager import ReaderManager
+from code.segment_render_manager import SegmentRenderManager
+from code.smart_render_manager import SmartRenderManager
 from code.stage_video_manager import StageVideoManager
 from code.table_of_contents_manager import TableOfContentsManager
+from code.text_cache_manager import TextCacheManager
 from code.text_overlay_manager import TextOverlayManager
+from code.timeline_manager import TimelineManager
 from code.transport_stream_manager import TransportStreamManager
 from code.video_config_manager import VideoConfigManager
 from code.watermark_manager import WatermarkManager
-from code.youtube_manager import youtube_download
 
 
 class VideoData:
-    def __init__(self, dir, config, subclip_duration=None, output_file=None):
+    # Bump when a change to the rendering changes the segments, so cached segments are not reused
+    SEGMENT_VERSION = 3
+
+    def __init__(self, dir, config, subclip_duration=None, output_file=None, jobs=None, assembly=None, backend=None,
+                 draft=False, profile=None, show_preview=False, smart_render=None, text_cache_dir=None):
         self.config_manager = VideoConfigManager(dir)
         self.config_manager.load_and_verify_config(config)
+        # A batch shares the rendered text between its projects
+        if text_cache_dir:
+            self.config_manager.text_cache_dir = text_cache_dir
+        # 'trace' records a Chrome trace of the run in profile/, 'python' adds cProfile for the frame loops
+        self.profile = profile
+        if profile:
+            profile_manager.enable(os.path.join(self.config_manager.dir, "profile"), python=profile == 'python')
+        # A draft renders low resolution proxies into draft/, with the text scaled along so the layout matches
+        self.draft = draft
+        self.scale = self.config_manager.draft_scale if draft else 1
+        if draft:
+            fontsize = self.config_manager.txt_ticket_fontsize
+            self.config_manager.txt_ticket_fontsize = max(1, round(fontsize * self.scale))
+            self.config_manager.output_file = os.path.splitext(self.config_manager.output_file)[0] + ".draft.mp4"
         self.watermark_manager = WatermarkManager(self.config_manager)
-        self.transport_stream_manager = TransportStreamManager(self.config_manager)  # used twice
-        self.text_overlay_manager = TextOverlayManager(self.config_manager)
-        self.table_of_contents_manager = TableOfContentsManager(self.config_manager)
-        self.stage_video_manager = StageVideoManager(self.config_manager)
+        self.cache_manager = CacheManager(self.config_manager, draft=draft)
+        self.stage_video_manager = StageVideoManager(self.config_manager, self.cache_manager,
+                                                     draft_scale=self.scale if draft else None,
+                                                     subclip_duration=subclip_duration)
+        self.transport_stream_manager = TransportStreamManager(self.config_manager, self.cache_manager,
+                                                               self.stage_video_manager)  # used twice
+        # show_preview pops up the overlays and the table of contents while rendering, for a local run only
+        self.text_overlay_manager = TextOverlayManager(self.config_manager, show_preview=show_preview)
+        self.text_cache_manager = TextCacheManager(self.config_manager)
+        self.table_of_contents_manager = TableOfContentsManager(self.config_manager, show_preview=show_preview)
+        self.timeline_manager = TimelineManager()
+        self.media_probe_manager = MediaProbeManager(self.config_manager)
+        # Every source and segment is read through here, so the number of open ffmpeg readers stays capped
+        self.reader_manager = ReaderManager(self.config_manager)
+        self.chapter_manager = ChapterManager(self.config_manager)
+        self.assembly_manager = AssemblyManager(self.config_manager, self.media_probe_manager, self.cache_manager)
+        self.jobs = jobs if jobs else (self.config_manager.jobs or 1)
+        self.download_manager = DownloadManager(self.config_manager)
+        self.ingest_manager = IngestManager(self.config_manager, self.stage_video_manager,
+                                            self.transport_stream_manager, jobs=self.jobs,
+                                            download_manager=self.download_manager)
 
         self.clips = None
+        # Source file path -> (status, message) of the ingests the last run did, for the summary
+        self.ingest_results = {}
+        # The segment file behind each clip, so the timeline can close its readers once it is past it
+        self.clip_paths = None
         self.videos = self.config_manager.videos
         self.closing_videos = self.config_manager.closing_videos
         self.opening_videos = self.config_manager.opening_videos
         self.sprint = self.config_manager.sprint
         self.project = self.config_manager.project
         self.dir = dir
+        self.config = config
 
         self.subclip_duration = subclip_duration
+        # 'render' re-encodes the whole timeline, 'copy' joins the cached segments with stream copy
+        self.assembly = assembly if assembly else self.config_manager.assembly
+        # 'moviepy' composites the segments frame by frame in Python, 'ffmpeg' renders them with one filtergraph
+        self.backend = backend if backend else self.config_manager.backend
+        # Re-encode only where an overlay or a fade is drawn on a segment, and stream copy the GOPs in between
+        self.smart_render = smart_render if smart_render is not None else self.config_manager.smart_render
         self.output_file = self.config_manager.output_file
         self.size = None
 
@@ -42,29 +98,177 @@ class VideoData:
         # hard coded for now
         self.toc_fade_time = self.config_manager.toc_fade_time
 
+        self.segment_render_manager = SegmentRenderManager(self, jobs=self.jobs)
+        self.filtergraph_manager = FilterGraphManager(self)
+        self.smart_render_manager = SmartRenderManager(self)
+        self.chunk_render_manager = ChunkRenderManager(self, jobs=jobs if jobs else self.config_manager.jobs)
+
     def run(self):
+        profile_manager.reset()
+        self.ingest_results = {}
+        try:
+            with profile_manager.span("run", project=self.project):
+                results = self.build_graph().run()
+                self.segment_render_manager.shutdown()
+        finally:
+            profile_manager.merge()
+        self.cache_manager.prune()
+        self.print_ingest_summary(results)
+
+        failed = [name for name, result in results.items() if result[0] == BuildGraphManager.FAILED]
+        if failed:
+            raise Exception(f"Build failed for {len(failed)} tasks")
+
+    def plan(self):
+        """
+        Print which tasks a run would build and why, without rendering anything
+        """
+        self.build_graph().print_plan()
+
+    def build_graph(self):
+        """
+        The pipeline as a task graph: ingest every source, size the canvas, render every segment, assemble.
+
+        Ingest and segment outputs are named after their cache keys, so they are up to date as long as the file is
+        there. The assembly is rebuilt when a segment ran or the list of segments changed.
+        :return: BuildGraphManager
+        """
+        graph = BuildGraphManager(self.config_manager, jobs=self.jobs, draft=self.draft)
+
+        ingest_names = []
+        for name, videos in self.ingest_manager.group(self.videos).items():
+            video = videos[0]
+            ingest = self.ingest_action(video, os.path.join(self.dir, name))
+            name = f"ingest:{name}"
+            graph.add(Task(name, ingest, keyed_outputs=True,
+                           fingerprint=lambda video=video: self.transport_stream_manager.get_key(video),
+                           outputs=lambda video=video: [self.transport_stream_manager.get_file_path(video)]))
+            ingest_names.append(name)
+
+        graph.add(Task('size', self.get_max_video_size, deps=ingest_names, always=True))
+
+        segment_names = []
+        for video in self.get_segment_videos():
+            name = f"segment:{video['video']}"
+            count = sum(segment_name.split('#')[0] == name for segment_name in segment_names)
+            name = f"{name}#{count + 1}" if count else name
+            graph.add(Task(name, lambda video=video: self.segment_render_manager.render_one(video), deps=['size'],
+                           keyed_outputs=True,
+                           fingerprint=lambda video=video: self.get_segment_path(video),
+                           outputs=lambda video=video: [self.get_segment_path(video)]))
+            segment_names.append(name)
+
+        output_file_path = os.path.join(self.dir, self.output_file)
+        graph.add(Task('assemble', self.stitch, deps=segment_names,
+                       fingerprint=self.get_assembly_fingerprint, outputs=lambda: [output_file_path]))
+        return graph
+
+    def emit_jobs(self, dir_queue):
+        """
+        Queue the segment renders and the assembly as jobs for worker.py, so several hosts can share the rendering.
+
+        The videos are ingested and sized here first, so the jobs only need the shared working directory. Jobs are
+        named after the segment and assembly keys, so emitting again only queues what changed.
+        :param dir_queue: the queue directory, on a filesystem every worker can reach
+        """
         self.prepare()
         self.get_max_video_size()
-        self.stitch()
 
-    def prepare(self):
+        job_queue_manager = JobQueueManager(dir_queue)
+        options = dict(self.segment_render_manager.get_options(), dir=os.path.abspath(self.dir))
+        segment_job_ids = []
+        for index, video in enumerate(self.get_segment_videos()):
+            segment = os.path.basename(self.get_segment_path(video))
+            job_id = f"segment-{os.path.splitext(segment)[0]}"
+            if os.path.isfile(self.get_segment_path(video)) or job_id in segment_job_ids:
+                continue
+            job_queue_manager.add(job_id, {'kind': 'segment', 'options': options, 'index': index, 'segment': segment})
+            segment_job_ids.append(job_id)
+
+        job_id = f"assemble-{self.cache_manager.key(self.get_assembly_fingerprint(), options)}"
+        job_queue_manager.add(job_id, {'kind': 'assemble', 'options': options}, deps=segment_job_ids)
+        print(f"Queued {len(segment_job_ids)} segment jobs and the assembly in {dir_queue}")
+        job_queue_manager.print_stats()
+
+    def run_job(self, payload):
         """
-        :return:
+        Run a job from emit_jobs.
+
+        :param payload: the job payload
+        :return: the path of the file the job wrote
         """
+        if payload['kind'] == 'segment':
+            video = self.get_segment_videos()[payload['index']]
+            if os.path.basename(self.get_segment_path(video)) != payload['segment']:
+                raise Exception("The config or the videos changed since the jobs were emitted")
+            file_path = self.render_segment(video)
+        else:
+            self.stitch()
+            file_path = os.path.join(self.dir, self.output_file)
+        profile_manager.flush()
+        return file_path
 
-        for video in self.videos:
-            file_path = self.get_file_path(video)
-            youtube_download(video.get('youtube-url'), file_path)
+    def ingest_action(self, video, file_path=None):
+        """
+        :param file_path: the summary entry of the ingest, the source file path by default
+        """
+        file_path = file_path or self.ingest_manager.get_file_path(video)
+
+        def ingest():
+            status, message = self.ingest_manager.ingest(video)
+            self.ingest_results[file_path] = (status, message)
+            print(f"  - {video['video']}: {status}")
+            if status not in (IngestManager.CONVERTED, IngestManager.CACHED):
+                raise Exception(message)
+        return ingest
 
-            if os.path.isfile(file_path):
-                stage_file_path = self.stage_video_manager.convert(file_path, video)
-                self.transport_stream_manager.convert(stage_file_path, video)
+    def print_ingest_summary(self, results):
+        """
+        Print the IngestManager summary for the ingest tasks of a graph run. An ingest that was up to date counts as
+        cached, one that did not get to run as failed.
+
+        :param results: dict of task name -> (status, seconds, message), from BuildGraphManager.run
+        """
+        summary = {}
+        for name, (status, _, message) in results.items():
+            if not name.startswith("ingest:"):
+                continue
+            file_path = os.path.join(self.dir, name[len("ingest:"):])
+            if file_path in self.ingest_results:
+                summary[file_path] = self.ingest_results[file_path]
+            elif status == BuildGraphManager.UP_TO_DATE:
+                summary[file_path] = (IngestManager.CACHED, message)
             else:
-                print(f"{file_path} does not exists")
+                summary[file_path] = (IngestManager.FAILED, message)
+        self.ingest_manager.print_summary(summary)
+
+    def get_assembly_fingerprint(self):
+        return {
+            'segments': [os.path.basename(self.get_segment_path(video)) for video in self.get_segment_videos()],
+            'assembly': self.assembly,
+            'watermark': self.config_manager.watermark,
+            # The render assembly adds the table of contents on top of the cached segment
+            'toc': self.videos if self.assembly == 'render' else None,
+            'toc_fade_time': self.toc_fade_time,
+            # Muxed into the output, and the output is only up to date under its own name
+            'chapters': self.config_manager.chapters,
+            'output_file': self.output_file,
+        }
+
+    def prepare(self):
+        """
+        Download, stage and convert all videos to transport streams on the ingest pool.
+        :return:
+        """
+        results = self.ingest_manager.run(self.videos)
+
+        failed = [file_path for file_path, (status, _) in results.items() if status == IngestManager.FAILED]
+        if failed:
+            raise Exception(f"Ingest failed for {len(failed)} videos")
 
     def get_max_video_size(self):
         """
-        Calculate max video size
+        Calculate max video size from the probe index, no clip is opened
         :param video:
         :return:
         """
@@ -72,10 +276,9 @@ class VideoData:
         max_height = 0
 
         for video in self.videos:
-            clip = self.video_clip(video)
-            size = clip.size
-            duration = clip.duration
-            clip.close()
+            info = self.media_probe_manager.probe(self.transport_stream_manager.get_file_path(video))
+            size = [info['width'], info['height']]
+            duration = self.get_clip_duration(video, info['duration'])
             print(f"  - Size is {size}")
             max_width = max(max_width, size[0])
             max_height = max(max_height, size[1])
@@ -87,11 +290,9 @@ class VideoData:
         self.size = (max_width, max_height)
         self.config_manager.size = self.size
 
-    def video_clip(self, video):
-        file_path = self.transport_stream_manager.get_file_path(video)
-        clip = VideoFileClip(file_path)
-
-        subclip_start = video.get('start', 0)
+    def get_subclip_times(self, video):
+        # Draft proxies are cut to start at the video's start when they are staged
+        subclip_start = 0 if self.draft else video.get('start', 0)
         max_duration = video.get('duration')
 
         subclip_end = None
@@ -100,6 +301,25 @@ class VideoData:
         elif max_duration is not None:
             subclip_end = subclip_start + max_duration
 
+        return subclip_start, subclip_end
+
+    def get_clip_duration(self, video, source_duration):
+        """
+        Duration of the clip video_clip builds from a source of source_duration seconds
+        """
+        subclip_start, subclip_end = self.get_subclip_times(video)
+        subclip_end = source_duration if subclip_end is None else min(subclip_end, source_duration)
+        return subclip_end - subclip_start
+
+    def video_clip(self, video):
+        background_color = video.get('background', False)
+        if background_color:
+            return self.background_clip(video, background_color)
+
+        file_path = self.transport_stream_manager.get_file_path(video)
+        clip = self.reader_manager.clip(file_path)
+
+        subclip_start, subclip_end = self.get_subclip_times(video)
         clip = clip.subclip(subclip_start, subclip_end)
         print(f"  - Start time: {subclip_start} seconds")
         print(f"  - End time: {subclip_end} seconds")
@@ -112,70 +332,148 @@ class VideoData:
             print(f"  - Fadeout: {self.fadeout} seconds")
             clip = clip.fx(vfx.fadeout, self.fadeout)
 
-        background_color = video.get('background', False)
-        if background_color:
-            # Ensure that the background color is not a string, and it has only 3 elements
-            assert isinstance(background_color, (list, tuple)) and len(background_color) == 3
-            background_color = tuple(map(int, background_color))  # Convert to a tuple of integers
+        txt_clip = self.title_clip(video, clip.duration)
+        if txt_clip is not None:
+            # Composite the TextClip and the original clip
+            clip = CompositeVideoClip([clip, txt_clip])
 
-            print(f"  - Rendering a {background_color} bg video with audio")
-            audio_clip = clip.audio
-            bg_clip = (ColorClip(clip.size, col=background_color)
-                       .set_duration(clip.duration)
-                       .set_audio(audio_clip)
-                       .set_mask(None)
-                       .set_ismask(False))
-            clip = bg_clip
+        return clip
 
-        if video.get('title', False):
-            color = video.get('color', 'white')
+    def background_clip(self, video, background_color):
+        """
+        A solid colour clip with the audio of video, for music and interludes. The size, frame rate and duration come
+        from the header of the source and only its audio is read, no video frame is decoded. The title is drawn onto
+        the background once, so every frame is the same image.
+        """
+        # Ensure that the background color is not a string, and it has only 3 elements
+        assert isinstance(background_color, (list, tuple)) and len(background_color) == 3
+        background_color = tuple(map(int, background_color))  # Convert to a tuple of integers
+        print(f"  - Rendering a {background_color} bg video with audio")
 
-            # Create a TextClip
-            txt_clip = TextClip(video.get('title'), fontsize=50, color=color)
+        file_path = self.transport_stream_manager.get_file_path(video)
+        infos = self.reader_manager.get_infos(file_path)
+        subclip_start, _ = self.get_subclip_times(video)
+        duration = self.get_clip_duration(video, infos['video_duration'])
+        print(f"  - Start time: {subclip_start} seconds")
+        print(f"  - End time: {subclip_start + duration} seconds")
+
+        clip = ColorClip(infos['video_size'], color=background_color, duration=duration)
+        txt_clip = self.title_clip(video, duration)
+        if txt_clip is not None:
+            clip = ImageClip(self.text_overlay_manager.static_layer_manager.flatten([clip, txt_clip], clip.size)
+                             .get_frame(0)).set_duration(duration)
+        clip = clip.set_fps(infos['video_fps'])
+
+        if infos['audio_found']:
+            audio_clip = self.reader_manager.audio_clip(file_path, infos['duration'])
+            clip = clip.set_audio(audio_clip.subclip(subclip_start, subclip_start + duration))
+        return clip
 
-            # Center it on the screen
-            txt_clip = txt_clip.set_position('center').set_duration(clip.duration)
+    def title_clip(self, video, duration):
+        if not video.get('title', False):
+            return None
 
-            # Composite the TextClip and the original clip
-            clip = CompositeVideoClip([clip, txt_clip])
+        color = video.get('color', 'white')
 
-        return clip
+        # Create a TextClip
+        txt_clip = self.text_cache_manager.text_clip(video.get('title'), fontsize=round(50 * self.scale), color=color)
+
+        # Center it on the screen
+        return txt_clip.set_position('center').set_duration(duration)
 
     def composite_video_clip(self, clips, size=None):
         clips = [clip for clip in clips if clip is not None]
         print(f"  - Composite Video: {len(clips)} clips")
         return CompositeVideoClip(clips, size=size if size else self.size) if len(clips) else None
 
-    def prepare_clip(self, video):
-        print(f"- Prepared '{video.get('type', 'demo')}' clip for '{video['video']}'")
+    def prepare_clip(self, video, watermark=False):
+        with profile_manager.span("prepare clip", 'clip', video=video['video'], backend=self.backend):
+            return self._prepare_clip(video, watermark)
 
-        # Create path if not exist
-        dir_cache = os.path.join(self.config_manager.dir, "cache/")
-        if not os.path.exists(dir_cache):
-            os.makedirs(dir_cache)
+    def _prepare_clip(self, video, watermark):
+        print(f"- Prepared '{video.get('type', 'demo')}' clip for '{video['video']}'")
 
-        # hash of video data
-        video_str = json.dumps(video, sort_keys=True)
-        hash = hashlib.md5(video_str.encode('utf-8')).hexdigest()
-        hash_file_path = os.path.join(dir_cache, hash + ".mp4")
-        if not os.path.isfile(hash_file_path):
+        hash_file_path = self.get_segment_file_path(video, watermark=watermark)
+        # A background is a solid colour under the audio of the source, with either backend the encoder generates it
+        # instead of every frame going through the moviepy writer
+        if not os.path.isfile(hash_file_path) and (self.backend == 'ffmpeg' or video.get('background', False)):
+            print(f"  - Clip '{video['video']}' being rendered by ffmpeg")
+            self.filtergraph_manager.render(video, hash_file_path, watermark=watermark)
+            comp = self.reader_manager.clip(hash_file_path)
+        elif not os.path.isfile(hash_file_path):
             print(f"  - Clip '{video['video']}' being built")
             clip = self.video_clip(video)
             txt_clip = self.text_overlay_manager.video_text_overlay_clip(video, clip_duration=clip.duration)
             clips = [clip, txt_clip, ]
             comp = self.composite_video_clip(clips)
-            # Save comp to disk
-            self.write_videofile(comp, hash_file_path)
+            if watermark:
+                comp = self.watermark_manager.embed(comp)
+            # Save comp to disk, then read it back so the source readers can be closed
+            self.write_segment(comp, hash_file_path, video=video if self.smart_render else None, watermark=watermark)
+            self.reader_manager.close(self.transport_stream_manager.get_file_path(video))
+            comp = self.reader_manager.clip(hash_file_path)
         else:
             print(f"  - Clip '{video['video']}' already exists")
-            #  Read from disk
-            comp = VideoFileClip(hash_file_path)
+            #  Read from disk, the readers are only opened when the timeline gets to the clip
+            comp = self.reader_manager.clip(hash_file_path)
+        self.cache_manager.touch('segment', hash_file_path)
 
         return comp
 
+    def write_segment(self, clip, file_path, video=None, watermark=False):
+        """
+        :param video: smart render the segment of video, only re-encoding where something is drawn on it
+        :param watermark: the watermark is burnt into clip
+        """
+        # Write via a temp file so an interrupted render is never picked up as cached
+        tmp_file_path = os.path.splitext(file_path)[0] + ".part.mp4"
+        if video is None or not self.smart_render_manager.render(video, clip, tmp_file_path, watermark=watermark):
+            self.write_videofile(clip, tmp_file_path)
+        os.replace(tmp_file_path, file_path)
+
+    def get_segment_file_path(self, video, watermark=False, toc=False):
+        """
+        The segment key covers every input that changes the rendered segment: the video config, the transport
+        stream content, the canvas size, the text and fade settings and the preview duration.
+        """
+        parts = ['segment', self.SEGMENT_VERSION, video, self.transport_stream_manager.get_key(video),
+                 list(self.size), self.txt_ticket_fontsize, self.fadein, self.fadeout, self.subclip_duration]
+        if watermark:
+            parts.append({'watermark': self.config_manager.watermark})
+        if self.backend == 'ffmpeg':
+            parts.append({'backend': self.backend})
+        elif self.smart_render:
+            parts.append({'smart_render': True})
+        if toc:
+            # The table of contents lists every video
+            parts.append({'toc': self.videos, 'toc_fade_time': self.toc_fade_time})
+        return self.cache_manager.get_path('segment', self.cache_manager.key(*parts), ".mp4")
+
+    def is_toc_video(self, video):
+        return video.get('type') == 'opening' and video.get('show toc', False)
+
+    def segment_watermark(self, video):
+        """
+        With stream copy assembly the watermark is burnt into the segments. The table of contents video gets it on top
+        of the table of contents instead, see prepare_segments.
+        """
+        return self.assembly == 'copy' and not self.is_toc_video(video)
+
+    def get_segment_videos(self):
+        """
+        The videos in timeline order: opening, middle and closing
+        """
+        return (self.opening_videos
+                + [video for video in self.videos if video.get('type') is None]
+                + self.closing_videos)
+
     def prepare_clips(self):
         print(f"Preparing clips for {self.project}")
 
+        # Render the missing segments in parallel, the passes below then read them from the cache
+        if self.jobs > 1:
+            self.segment_render_manager.render(self.get_segment_videos())
+
         # Prepare the opening clips
         print(f"Preparing opening clips:")
         self.clips = [self.table_of_contents_manager.prepare_clip(video, self.prepare_clip(video)) for video in
@@ -188,6 +486,51 @@ class VideoData:
         # Prepare the closing clips
         print(f"Preparing closing clips:")
         self.clips.extend([self.prepare_clip(video) for video in self.closing_videos])
+        self.clip_paths = [self.get_segment_file_path(video) for video in self.get_segment_videos()]
+
+    def prepare_segments(self):
+        """
+        Render every segment, watermark included, for the stream copy assembly.
+
+        :return: list of segment paths in timeline order
+        """
+        print(f"Preparing segments for {self.project}")
+
+        if self.jobs > 1:
+            self.segment_render_manager.render(self.get_segment_videos())
+
+        segment_file_paths = []
+        for video in self.get_segment_videos():
+            segment_file_paths.append(self.render_segment(video))
+
+        return segment_file_paths
+
+    def render_segment(self, video):
+        """
+        Render the segment of one video to the cache, unless it is cached already.
+
+        :return: the segment path
+        """
+        file_path = self.get_segment_path(video)
+        if self.assembly == 'copy' and self.is_toc_video(video):
+            if not os.path.isfile(file_path):
+                clip = self.table_of_contents_manager.prepare_clip(video, self.prepare_clip(video))
+                self.write_segment(self.watermark_manager.embed(clip), file_path)
+        elif not os.path.isfile(file_path):
+            self.prepare_clip(video, watermark=self.segment_watermark(video))
+        # Nothing reads the clips of this segment anymore
+        self.reader_manager.close_all()
+        self.cache_manager.touch('segment', file_path)
+        return file_path
+
+    def get_segment_path(self, video):
+        """
+        The segment stitch uses for video: with stream copy assembly every segment carries the watermark and the
+        table of contents video carries the table of contents too.
+        """
+        if self.assembly == 'copy':
+            return self.get_segment_file_path(video, watermark=True, toc=self.is_toc_video(video))
+        return self.get_segment_file_path(video)
 
     def stitch(self):
         """
@@ -196,36 +539,52 @@ class VideoData:
         """
         output_file_path = os.path.join(self.dir, self.output_file)
 
+        if self.assembly == 'copy':
+            segment_file_paths = self.prepare_segments()
+            start_times = self.assembly_manager.concat(segment_file_paths, output_file_path)
+            self.print_chapters(start_times, len(segment_file_paths))
+            self.write_chapters(output_file_path, start_times)
+            return
+
+        final_clip = self.final_clip()
+        self.chunk_render_manager.render(final_clip, output_file_path)
+        self.reader_manager.close_all()
+        self.write_chapters(output_file_path, final_clip.start_times, final_clip.duration)
+
+    def final_clip(self):
+        """
+        The whole timeline with the watermark on top, for the render assembly
+        """
         self.prepare_clips()
         final_clip = self.concatenate_with_chapters()
-        final_clip = self.watermark_manager.embed(final_clip)
-        self.write_videofile(final_clip, output_file_path)
+        return self.watermark_manager.embed(final_clip)
 
     def concatenate_with_chapters(self):
-        start_times = []  # To track start times for each clip
-        total_duration = 0  # To track total duration up to current clip
-        final_clip = None  # The final output clip
-
-        for clip in self.clips:
-            # Append the start time of current clip
-            start_times.append(total_duration)
-            # Increase total_duration with current clip duration
-            total_duration += clip.duration
-            # Concatenate the current clip to final clip
-            if final_clip is None:
-                final_clip = clip
-            else:
-                final_clip = concatenate_videoclips([final_clip, clip])
+        # Flat timeline, every frame is looked up with a binary search over the clip start times
+        with profile_manager.span("concatenate", clips=len(self.clips)):
+            final_clip = self.timeline_manager.concatenate(
+                self.clips, release=lambda i: self.reader_manager.close(self.clip_paths[i]))
+
+        print(f"Total duration: {final_clip.duration}")
+        self.print_chapters(final_clip.start_times, len(self.clips))
 
-        print(f"Total duration: {total_duration}")
-        print(f"Total clips: {len(final_clip.clips)}")
+        return final_clip
+
+    def print_chapters(self, start_times, clip_count):
+        print(f"Total clips: {clip_count}")
 
         # Print the starting times for each clip
         print("Starting times for each clip in the final video (in seconds):")
         for i, start_time in enumerate(start_times):
             print(f"Chapter {i + 1}: {start_time} sec")
 
-        return final_clip
+    def write_chapters(self, output_file_path, start_times, duration=None):
+        """
+        Add a chapter per clip to the output with stream copy, and write the YouTube chapters next to it
+        """
+        if self.config_manager.chapters:
+            chapters = self.chapter_manager.get_chapters(self.get_segment_videos(), start_times, duration)
+            self.chapter_manager.write(output_file_path, chapters)
 
     def get_file_path(self, video):
         return os.path.join(self.dir, video['video'])
@@ -236,4 +595,8 @@ class VideoData:
         # Another possible reason is that the audio codec was not compatible with the video codec.
         # For instance the video extensions 'ogv' and 'webm' only allow 'libvorbis' (default) as avideo codec.
 
-        clip.write_videofile(output_file_path, codec='libx264', audio_codec='aac')
\ No newline at end of file
+        with profile_manager.frame_loop(f"write {os.path.basename(output_file_path)}"):
+            clip.write_videofile(output_file_path, codec='libx264', audio_codec='aac', preset=self.get_preset())
+
+    def get_preset(self):
+        return 'ultrafast' if self.draft else 'medium'
\ No newline at end of file
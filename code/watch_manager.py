@@ -0,0 +1,204 @@
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from moviepy.editor import *
+
+from code.segment_render_manager import SegmentRenderManager
+from code.video_stitch import VideoData
+
+
+class WatchManager:
+    """
+    Watch mode: build, then build again every time the config or a source video changes, until interrupted.
+
+    Every build reads the config into a new VideoData, and the build graph only re-runs what the change affects,
+    usually one segment and the assembly. The process stays warm between builds: the worker pool is kept open, the
+    source fingerprints are carried over, and the probe results and text rasters come from their caches on disk.
+
+    Changes are found by polling the size and modification time of the watched files. With inotifywait on the PATH
+    the poll wakes up on filesystem events instead of waiting out the interval. A burst of changes, e.g. an editor
+    saving or a video being copied in, is debounced into one build once the files are quiet.
+    """
+
+    AUTO = 'auto'
+    POLL = 'poll'
+    INOTIFY = 'inotify'
+    # Seconds between polls, and between polls while waiting for inotify events
+    POLL_INTERVAL = 1.0
+    INOTIFY_POLL_INTERVAL = 30.0
+    # Seconds the files have to stay unchanged before a build starts
+    DEBOUNCE = 0.5
+
+    def __init__(self, options, mode=AUTO, poll_interval=None, debounce=None):
+        """
+        :param options: the VideoData constructor arguments
+        :param mode: 'poll', 'inotify' or 'auto' for inotify when inotifywait is installed
+        """
+        self.options = options
+        if mode == self.AUTO:
+            mode = self.INOTIFY if shutil.which('inotifywait') else self.POLL
+        self.mode = mode
+        self.poll_interval = poll_interval or (self.INOTIFY_POLL_INTERVAL if mode == self.INOTIFY
+                                               else self.POLL_INTERVAL)
+        self.debounce = self.DEBOUNCE if debounce is None else debounce
+        self.video_data = None
+        self.executor = None
+        self.jobs = None
+        self.event = threading.Event()
+        self.inotify_process = None
+        self.builds = 0
+
+    def run(self):
+        """
+        Build and keep building on every change, until interrupted with Ctrl+C
+        """
+        try:
+            snapshot = self.snapshot(self.get_file_paths())
+            self.build()
+            snapshot = self.refresh(snapshot)
+            while True:
+                print(f"Watching {len(snapshot)} files for changes ({self.mode}), Ctrl+C to stop")
+                snapshot = self.rebuild(snapshot)
+        except KeyboardInterrupt:
+            print("Stopped watching")
+        finally:
+            self.stop_inotify()
+            if self.executor is not None:
+                self.executor.shutdown()
+
+    def rebuild(self, snapshot):
+        """
+        Wait for a change, then build.
+
+        :param snapshot: the watched files as the last build saw them
+        :return: the snapshot to wait on next
+        """
+        snapshot, changed = self.wait(snapshot)
+        print(f"Changed: {', '.join(os.path.basename(file_path) for file_path in changed)}")
+        self.build()
+        return self.refresh(snapshot)
+
+    def refresh(self, snapshot):
+        """
+        Follow the files the config refers to after a build. Files watched before keep their state from before the
+        build, so a change saved while it ran still triggers the next one.
+        """
+        file_paths = self.get_file_paths()
+        current = self.snapshot([file_path for file_path in file_paths if file_path not in snapshot])
+        return {file_path: snapshot[file_path] if file_path in snapshot else current[file_path]
+                for file_path in file_paths}
+
+    def build(self):
+        """
+        Read the config into a new VideoData and run its build graph. A broken config or a failed build is reported,
+        the next change builds again.
+
+        :return: True when the build succeeded
+        """
+        self.builds += 1
+        start = time.perf_counter()
+        try:
+            self.video_data = self.load()
+            self.video_data.run()
+        except Exception as e:
+            print(f"Build {self.builds} failed: {type(e).__name__}: {e}")
+            return False
+        print(f"Build {self.builds} done in {time.perf_counter() - start:.1f}s")
+        return True
+
+    def load(self):
+        """
+        :return: VideoData for the config as it is now, with the warm state of the previous one
+        """
+        previous = self.video_data
+        video_data = VideoData(**self.options)
+        if previous is not None:
+            # Keyed on path, size and modification time, so they stay valid
+            video_data.cache_manager.fingerprints = previous.cache_manager.fingerprints
+
+        if video_data.jobs > 1:
+            if self.executor is not None and self.jobs != video_data.jobs:
+                self.executor.shutdown()
+                self.executor = None
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=video_data.jobs)
+                self.jobs = video_data.jobs
+            video_data.segment_render_manager = SegmentRenderManager(video_data, jobs=video_data.jobs,
+                                                                     executor=self.executor)
+        return video_data
+
+    def get_file_paths(self):
+        """
+        :return: the config file and every source video of the last config that could be read
+        """
+        dir, config = self.options['dir'], self.options.get('config', "config.yml")
+        file_paths = [os.path.join(dir, config)]
+        if self.video_data is not None:
+            for video in self.video_data.videos:
+                file_path = self.video_data.ingest_manager.get_file_path(video)
+                if file_path not in file_paths:
+                    file_paths.append(file_path)
+        return file_paths
+
+    def snapshot(self, file_paths):
+        """
+        :return: dict of file path -> (size, modification time), or None for a missing file
+        """
+        snapshot = {}
+        for file_path in file_paths:
+            try:
+                stat = os.stat(file_path)
+                snapshot[file_path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                snapshot[file_path] = None
+        return snapshot
+
+    def wait(self, snapshot):
+        """
+        Block until a watched file changed and then stayed the same for the debounce time.
+
+        :param snapshot: from snapshot
+        :return: (the new snapshot, list of changed file paths)
+        """
+        self.start_inotify(snapshot)
+        while True:
+            self.event.wait(self.poll_interval)
+            self.event.clear()
+            current = self.snapshot(snapshot)
+            if current == snapshot:
+                continue
+
+            # Wait for the writes to settle, every further change starts the debounce again
+            while True:
+                time.sleep(self.debounce)
+                settled = self.snapshot(snapshot)
+                if settled == current:
+                    break
+                current = settled
+            return current, [file_path for file_path in snapshot if current[file_path] != snapshot[file_path]]
+
+    def start_inotify(self, snapshot):
+        """
+        Run inotifywait on the directories of the watched files, every event wakes up wait
+        """
+        if self.mode != self.INOTIFY:
+            return
+        self.stop_inotify()
+        dirs = sorted({os.path.dirname(os.path.abspath(file_path)) for file_path in snapshot})
+        command = ("inotifywait -m -q -e close_write,moved_to,create,delete,attrib --format '%w%f' "
+                   + " ".join(f"'{dir}'" for dir in dirs if os.path.isdir(dir)))
+        self.inotify_process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, text=True)
+        threading.Thread(target=self._read_inotify, args=(self.inotify_process,), daemon=True).start()
+
+    def stop_inotify(self):
+        if self.inotify_process is not None:
+            self.inotify_process.terminate()
+            self.inotify_process.wait()
+            self.inotify_process = None
+
+    def _read_inotify(self, process):
+        for _ in process.stdout:
+            self.event.set()
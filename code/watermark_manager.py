@@ -1,18 +1,51 @@
-import io
+import hashlib
 
 import numpy as np
-import requests
 from PIL import Image
 from moviepy.editor import *
+from moviepy.video.fx.resize import resizer
+
+from code.asset_cache_manager import AssetCacheManager
+
+
+def resolve_position(position, size, clip_size):
+    """
+    Resolve a moviepy style position, e.g. ("right", "top"), "center" or (10, 20), to pixels, the way
+    CompositeVideoClip places a clip. Both backends place their layers with it.
+
+    :param position: moviepy style position
+    :param size: (width, height) of the canvas
+    :param clip_size: (width, height) of the clip
+    :return: (x, y) of the top left corner
+    """
+    if isinstance(position, str):
+        position = {'center': ['center', 'center'],
+                    'left': ['left', 'center'],
+                    'right': ['right', 'center'],
+                    'top': ['center', 'top'],
+                    'bottom': ['center', 'bottom']}[position]
+    x, y = position
+    if isinstance(x, str):
+        x = {'left': 0, 'center': (size[0] - clip_size[0]) / 2, 'right': size[0] - clip_size[0]}[x]
+    if isinstance(y, str):
+        y = {'top': 0, 'center': (size[1] - clip_size[1]) / 2, 'bottom': size[1] - clip_size[1]}[y]
+    return int(x), int(y)
+
 
 class WatermarkManager:
     """
     Class responsible for handling watermark_manager-related operations
+
+    The watermark is scaled and premultiplied once per canvas size, then blended into its bounding box of every frame.
+    A watermark url is fetched through the AssetCacheManager, and the decoded and scaled images are cached with it.
     """
 
-    def __init__(self, config_manager):
+    def __init__(self, config_manager, asset_cache_manager=None):
         self.watermark = None
         self.config_manager = config_manager
+        self.asset_cache_manager = asset_cache_manager if asset_cache_manager else AssetCacheManager(config_manager)
+        # canvas size -> (x, y, premultiplied rgb, 1 - alpha)
+        self.layers = {}
         self._load()
 
     def _load(self):
@@ -23,20 +56,79 @@ class WatermarkManager:
         watermark_path = self.config_manager.watermark.get('path', None)
 
         if watermark_url:
-            response = requests.get(watermark_url)
-            self.watermark = np.array(Image.open(io.BytesIO(response.content)))
+            file_path, sha256 = self.asset_cache_manager.fetch(watermark_url)
+            self.watermark = self.asset_cache_manager.array(['decoded', sha256],
+                                                            lambda: np.array(Image.open(file_path)))
         elif watermark_path:
             filepath = os.path.join(self.config_manager.dir, watermark_path)
             self.watermark = imageio.v2.imread(filepath)
 
     def embed(self, clip):
         if self.watermark is not None:
-            position = self.config_manager.watermark.get('position', ("right", "top"))
-            height_ratio = self.config_manager.watermark.get('height-ratio', 0.1)
+            x, y, rgb, inverse_alpha = self._layer(tuple(clip.size))
+            if rgb is None:
+                return clip
 
-            watermark = ImageClip(self.watermark, duration=clip.duration)
-            watermark = watermark.resize(height=int(clip.size[1] * height_ratio))
-            watermark = watermark.set_position(pos=position).set_duration(clip.duration)
-            clip = CompositeVideoClip([clip, watermark])
+            def blend(frame):
+                # Frames may be read only or shared with a reader's cache, so blend into a copy
+                frame = np.array(frame)
+                region = frame[y:y + rgb.shape[0], x:x + rgb.shape[1]]
+                blended = region * inverse_alpha
+                blended += rgb
+                # Round like the compositing of the ffmpeg backend, a cast alone truncates
+                region[...] = np.round(blended)
+                return frame
+
+            clip = clip.fl_image(blend)
 
         return clip
+
+    def _layer(self, size):
+        """
+        Scale, position and premultiply the watermark for a canvas of size, once.
+
+        :param size: (width, height) of the canvas
+        :return: (x, y, premultiplied rgb, 1 - alpha), cropped to the canvas. rgb is None when it is off the canvas.
+        """
+        if size not in self.layers:
+            x, y, rgba = self.image(size)
+            if rgba is None:
+                self.layers[size] = (0, 0, None, None)
+            else:
+                rgba = rgba.astype(np.float32)
+                alpha = rgba[:, :, 3:] / 255
+                self.layers[size] = (x, y, rgba[:, :, :3] * alpha, 1 - alpha)
+        return self.layers[size]
+
+    def image(self, size):
+        """
+        The watermark scaled and positioned for a canvas of size.
+
+        :param size: (width, height) of the canvas
+        :return: (x, y, RGBA uint8 array), cropped to the canvas. The array is None when it is off the canvas.
+        """
+        position = self.config_manager.watermark.get('position', ("right", "top"))
+        height_ratio = self.config_manager.watermark.get('height-ratio', 0.1)
+
+        rgba = self._rgba()
+        height = int(size[1] * height_ratio)
+        width = int(rgba.shape[1] * height / rgba.shape[0])
+        # Keyed by the pixels, the watermark may also come from a path or be set directly
+        digest = hashlib.sha1(rgba.tobytes() + str(rgba.shape).encode('utf-8')).hexdigest()
+        rgba = self.asset_cache_manager.array(['scaled', digest, width, height], lambda: resizer(rgba, (width, height)))
+
+        x, y = resolve_position(position, size, (width, height))
+        # Crop to the part on the canvas
+        left, top = max(0, -x), max(0, -y)
+        right, bottom = min(width, size[0] - x), min(height, size[1] - y)
+        if left >= right or top >= bottom:
+            return 0, 0, None
+        return x + left, y + top, rgba[top:bottom, left:right]
+
+    def _rgba(self):
+        watermark = self.watermark
+        if watermark.ndim == 2:
+            watermark = np.dstack(3 * [watermark])
+        if watermark.shape[2] == 3:
+            watermark = np.dstack([watermark, np.full(watermark.shape[:2], 255, dtype=watermark.dtype)])
+        return watermark.astype(np.uint8)
@@ -1,6 +1,9 @@
 import argparse
 
+from code.cache_manager import CacheManager
+from code.video_config_manager import VideoConfigManager
 from code.video_stitch import VideoData
+from code.watch_manager import WatchManager
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Stitch sprint videos")
@@ -10,11 +13,73 @@ if __name__ == '__main__':
                         help='Create preview clip in seconds of each video before stitching')
     parser.add_argument('-config', metavar='config', type=str, default="config.yml",
                         help='the yaml data config file for your videos in your working directory')
+    parser.add_argument('-jobs', metavar='jobs', type=int,
+                        help='Number of videos to process in parallel (overrides "jobs" in the config)')
+    parser.add_argument('-assembly', metavar='assembly', type=str, choices=['render', 'copy'],
+                        help='How the final video is assembled: "render" re-encodes the timeline, "copy" joins the '
+                             'cached segments with stream copy (overrides "assembly" in the config)')
+    parser.add_argument('-backend', metavar='backend', type=str, choices=['moviepy', 'ffmpeg'],
+                        help='How the segments are rendered: "moviepy" composites every frame in Python, "ffmpeg" '
+                             'renders each segment with one filtergraph (overrides "backend" in the config)')
+    parser.add_argument('-cache', metavar='cache', type=str, choices=['stats', 'prune'],
+                        help='Show the size of the stage/, ts/ and cache/ directories ("stats") or evict the least '
+                             'recently used files down to "cache_size_gb" and remove untracked files ("prune")')
+    parser.add_argument('-draft', action='store_true',
+                        help='Render a quick low resolution draft: the videos are cut and scaled down by "draft_scale" '
+                             'when they are staged, and everything is cached separately in draft/')
+    parser.add_argument('-plan', action='store_true',
+                        help='Print which tasks would run and why, without building anything')
+    parser.add_argument('-profile', metavar='profile', type=str, nargs='?', const='trace', choices=['trace', 'python'],
+                        help='Write a Chrome trace of every stage, clip and ffmpeg run to profile/trace.json '
+                             '("trace"), and profile the Python frame loops with cProfile too ("python")')
+    parser.add_argument('-emit-jobs', metavar='queue', type=str,
+                        help='Ingest the videos, then queue the segment renders and the assembly in the queue '
+                             'directory for worker.py instead of rendering them here')
+    parser.add_argument('-smart-render', action='store_true', default=None,
+                        help='Only re-encode the parts of a segment with a fade or an overlay on them, and stream copy '
+                             'the rest of the video. Only helps clips without a ticket and with '
+                             '"show duration: false", and not with -assembly copy: the default overlays and the '
+                             'watermark cover the whole clip (overrides "smart_render" in the config)')
+    parser.add_argument('-watch', metavar='watch', type=str, nargs='?', const=WatchManager.AUTO,
+                        choices=[WatchManager.AUTO, WatchManager.POLL, WatchManager.INOTIFY],
+                        help='Build, then stay running and build again whenever the config or a source video changes, '
+                             'only re-rendering what changed. Changes are found by polling ("poll") or with '
+                             'inotifywait ("inotify"), by default inotify when it is installed')
+    parser.add_argument('-show-preview', action='store_true',
+                        help='Show each text overlay and the table of contents in a window while rendering, the render '
+                             'waits until the window is closed')
     args = parser.parse_args()
+
+    if args.cache:
+        config_manager = VideoConfigManager(args.dir)
+        config_manager.load_and_verify_config(args.config)
+        cache_manager = CacheManager(config_manager, draft=args.draft)
+        if args.cache == 'prune':
+            files, size = cache_manager.prune(untracked=True)
+            print(f"Removed {files} files, {size / 1024 ** 2:.1f} MB")
+        cache_manager.print_stats()
+        exit(0)
+
     print(f"Stitching Sprint Video from directory: {args.dir}")
 
     if args.preview:
         print(f"PREVIEW MODE: All clips to be cut to {args.preview} seconds")
 
-    videos = VideoData(dir=args.dir, config=args.config, subclip_duration=args.preview)
-    videos.run()
+    if args.draft:
+        print(f"DRAFT MODE: Low resolution proxies in {args.dir}/draft/")
+
+    options = dict(dir=args.dir, config=args.config, subclip_duration=args.preview, jobs=args.jobs,
+                   assembly=args.assembly, backend=args.backend, draft=args.draft,
+                   profile=args.profile, show_preview=args.show_preview,
+                   smart_render=args.smart_render)
+    if args.watch:
+        WatchManager(options, mode=args.watch).run()
+        exit(0)
+
+    videos = VideoData(**options)
+    if args.plan:
+        videos.plan()
+    elif args.emit_jobs:
+        videos.emit_jobs(args.emit_jobs)
+    else:
+        videos.run()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from moviepy.editor import VideoFileClip
+
+from code.assembly_manager import AssemblyManager
+from code.cache_manager import CacheManager
+
+
+@unittest.skipUnless(shutil.which('ffmpeg'), "needs ffmpeg")
+class TestAssemblyManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_manager = Mock()
+        self.config_manager.dir = self.tmp_dir.name
+        self.config_manager.cache_size_gb = 1
+        # There may be no ffprobe, the stream parameters of the segments are known from how they are made
+        self.infos = {}
+        media_probe_manager = Mock()
+        media_probe_manager.probe.side_effect = lambda file_path: self.infos[file_path]
+        self.assembly_manager = AssemblyManager(self.config_manager, media_probe_manager,
+                                                CacheManager(self.config_manager))
+        self.output_file_path = os.path.join(self.tmp_dir.name, "output.mp4")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _segment(self, name, size=(64, 48), duration=1, audio=True):
+        file_path = os.path.join(self.tmp_dir.name, f"{name}.mp4")
+        sine = f"-f lavfi -i 'sine=frequency=440:duration={duration}' -c:a aac " if audio else ""
+        subprocess.run(f"ffmpeg -y -v error -f lavfi -i 'testsrc=size={size[0]}x{size[1]}:rate=10:duration={duration}' "
+                       f"{sine}-c:v libx264 -profile:v high -pix_fmt yuv420p '{file_path}'", shell=True, check=True)
+        info = {'duration': duration, 'codec': 'h264', 'profile': 'High', 'width': size[0], 'height': size[1],
+                'pix_fmt': 'yuv420p', 'r_frame_rate': '10/1'}
+        if audio:
+            info.update({'audio_codec': 'aac', 'sample_rate': 44100, 'channels': 1})
+        self.infos[file_path] = info
+        return file_path
+
+    def test_matching_segments_are_joined_by_stream_copy(self):
+        file_paths = [self._segment("a"), self._segment("b", duration=2), self._segment("c")]
+
+        with patch.object(AssemblyManager, 'conform') as conform:
+            start_times = self.assembly_manager.concat(file_paths, self.output_file_path)
+
+        conform.assert_not_called()
+        self.assertEqual(start_times, [0, 1, 3])
+        output = VideoFileClip(self.output_file_path)
+        self.assertAlmostEqual(output.duration, 4, delta=0.1)
+        self.assertEqual(list(output.size), [64, 48])
+        self.assertIsNotNone(output.audio)
+        output.close()
+        # The list file for the concat demuxer is cleaned up
+        self.assertFalse(os.path.isfile(os.path.join(self.tmp_dir.name, "output.segments.txt")))
+
+    def test_mismatched_segment_is_conformed(self):
+        file_paths = [self._segment("a"), self._segment("large", size=(128, 96), audio=False), self._segment("c")]
+
+        conform = AssemblyManager.conform
+        with patch.object(AssemblyManager, 'conform', autospec=True, side_effect=conform) as conformed:
+            start_times = self.assembly_manager.concat(file_paths, self.output_file_path)
+
+        self.assertEqual([call.args[1] for call in conformed.call_args_list], [file_paths[1]])
+        self.assertEqual(start_times, [0, 1, 2])
+        output = VideoFileClip(self.output_file_path)
+        self.assertAlmostEqual(output.duration, 3, delta=0.1)
+        self.assertEqual(list(output.size), [64, 48])
+        # The segment without audio got a silent track, the audio runs through the whole video
+        self.assertAlmostEqual(output.audio.duration, 3, delta=0.1)
+        self.assertEqual(output.get_frame(1.5).shape, (48, 64, 3))
+        output.close()
+
+        # Cached for the next assembly
+        conform_dir = self.assembly_manager.cache_manager.get_dir('conform')
+        self.assertEqual(len(os.listdir(conform_dir)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
+
+import numpy as np
+
+from code.asset_cache_manager import AssetCacheManager
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+    """
+    Serves server.content with an ETag and answers 304 when the client already has it.
+    """
+
+    def do_GET(self):
+        etag = '"' + hashlib.sha1(self.server.content).hexdigest() + '"'
+        self.server.requests.append(self.headers.get('If-None-Match'))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(self.server.content)))
+        self.end_headers()
+        self.wfile.write(self.server.content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAssetCacheManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ETagHandler)
+        self.server.content = b"watermark v1"
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/watermark.png"
+
+        self.config_manager = Mock()
+        self.config_manager.asset_cache_dir = self.tmp_dir.name
+        self.config_manager.asset_max_age = 0
+        self.asset_cache_manager = AssetCacheManager(self.config_manager)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def _read(self, file_path):
+        with open(file_path, 'rb') as asset_file:
+            return asset_file.read()
+
+    def test_revalidates_with_etag(self):
+        file_path, sha256 = self.asset_cache_manager.fetch(self.url)
+        self.assertEqual(self._read(file_path), b"watermark v1")
+        self.assertEqual(self.asset_cache_manager.fetch(self.url), (file_path, sha256))
+
+        self.server.content = b"watermark v2"
+        file_path, sha256 = self.asset_cache_manager.fetch(self.url)
+        self.assertEqual(self._read(file_path), b"watermark v2")
+        self.assertEqual(sha256, hashlib.sha256(b"watermark v2").hexdigest())
+
+        etag = '"' + hashlib.sha1(b"watermark v1").hexdigest() + '"'
+        self.assertEqual(self.server.requests, [None, etag, etag])
+
+    def test_fresh_and_offline_copies_need_no_server(self):
+        self.config_manager.asset_max_age = 3600
+        file_path, _ = self.asset_cache_manager.fetch(self.url)
+        self.asset_cache_manager.fetch(self.url)
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.server.shutdown()
+        self.server.server_close()
+        self.config_manager.asset_max_age = 0
+        self.assertEqual(self._read(self.asset_cache_manager.fetch(self.url)[0]), b"watermark v1")
+        with self.assertRaises(Exception):
+            self.asset_cache_manager.fetch(self.url + "?uncached")
+
+    def test_array_is_built_once(self):
+        build = Mock(return_value=np.arange(12, dtype=np.uint8).reshape(3, 4))
+
+        first = self.asset_cache_manager.array(['scaled', "abc", 4, 3], build)
+        second = AssetCacheManager(self.config_manager).array(['scaled', "abc", 4, 3], build)
+
+        build.assert_called_once()
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual(second.dtype, np.uint8)
+
+
+if __name__ == '__main__':
+    unittest.main()
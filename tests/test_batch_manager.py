@@ -0,0 +1,62 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from code.batch_manager import BatchManager
+from code.media_probe_manager import MediaProbeManager
+
+CONFIG = """
+Sprint: Batch
+Project: {project}
+Videos:
+  - type: opening
+    video: intro.mp4
+  - video: demo.mp4
+  - type: closing
+    video: intro.mp4
+"""
+
+
+class TestBatchManager(unittest.TestCase):
+    @unittest.skipUnless(shutil.which('ffmpeg'), "needs ffmpeg")
+    def test_shared_source_is_ingested_once(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, duration in (("intro.mp4", 1), ("demo.mp4", 2)):
+                subprocess.run(f"ffmpeg -y -v error -f lavfi -i 'testsrc=size=64x48:rate=10:duration={duration}' "
+                               f"-c:v libx264 -pix_fmt yuv420p '{os.path.join(tmp_dir, name)}'", shell=True, check=True)
+            projects = []
+            for project in ("team-a", "team-b"):
+                dir_project = os.path.join(tmp_dir, project)
+                os.makedirs(dir_project)
+                for name in ("intro.mp4", "demo.mp4"):
+                    shutil.copyfile(os.path.join(tmp_dir, name), os.path.join(dir_project, name))
+                with open(os.path.join(dir_project, "team.yml"), 'w') as config_file:
+                    config_file.write(CONFIG.format(project=project))
+                projects.append((dir_project, "team.yml"))
+
+            info = {'width': 64, 'height': 48, 'duration': 1.0}
+            with patch.object(MediaProbeManager, '_probe', return_value=info) as probe:
+                batch_manager = BatchManager(projects, jobs=2, text_cache_dir=os.path.join(tmp_dir, "text"))
+                graph = batch_manager.build_graph()
+                for name, task in graph.tasks.items():
+                    if '/ingest:' in name:
+                        task.action()
+
+                self.assertEqual(sorted(batch_manager.video_data), ["team-a:team", "team-b:team"])
+                team_a, team_b = batch_manager.video_data.values()
+                video = team_b.videos[0]
+                file_path = team_b.transport_stream_manager.get_file_path(video)
+                # team-b links both videos from team-a and stages nothing itself
+                self.assertTrue(os.path.samefile(file_path, team_a.transport_stream_manager.get_file_path(video)))
+                self.assertEqual(batch_manager.linked, 2)
+                self.assertFalse(os.path.exists(os.path.join(team_b.dir, "stage")))
+                self.assertEqual(team_b.media_probe_manager.probe(file_path), info)
+                self.assertEqual(probe.call_count, 2)
+                self.assertEqual(team_b.text_cache_manager.dir_text, os.path.join(tmp_dir, "text"))
+
+
+if __name__ == '__main__':
+    unittest.main()
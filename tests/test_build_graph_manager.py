@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from code.build_graph_manager import BuildGraphManager, Task
+
+
+class TestBuildGraphManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_manager = Mock()
+        self.config_manager.dir = self.tmp_dir.name
+        self.inputs = {'a': 'one', 'b': 'two'}
+        self.calls = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _output(self, name):
+        return os.path.join(self.tmp_dir.name, name + '.out')
+
+    def _build(self, name):
+        def action():
+            self.calls.append(name)
+            if self.inputs.get(name) == 'broken':
+                raise RuntimeError("broken input")
+            open(self._output(name), 'w').close()
+        return action
+
+    def _graph(self):
+        graph = BuildGraphManager(self.config_manager, jobs=2)
+        for name in ('a', 'b'):
+            graph.add(Task(name, self._build(name), fingerprint=lambda name=name: self.inputs[name],
+                           outputs=lambda name=name: [self._output(name)]))
+        graph.add(Task('final', self._build('final'), deps=['a', 'b'], outputs=lambda: [self._output('final')]))
+        return graph
+
+    def test_second_build_is_up_to_date(self):
+        self._graph().run()
+        self.assertEqual(sorted(self.calls), ['a', 'b', 'final'])
+
+        self.calls = []
+        results = self._graph().run()
+        self.assertEqual(self.calls, [])
+        self.assertEqual({result[0] for result in results.values()}, {BuildGraphManager.UP_TO_DATE})
+
+    def test_changed_input_only_rebuilds_its_task_and_dependents(self):
+        self._graph().run()
+        self.calls = []
+        self.inputs['a'] = 'changed'
+
+        plan = {name: (run, reason) for name, run, reason in self._graph().plan()}
+        self.assertEqual(plan['a'], (True, 'inputs changed'))
+        self.assertEqual(plan['b'], (False, BuildGraphManager.UP_TO_DATE))
+        self.assertEqual(plan['final'], (True, 'a runs first'))
+        self.assertEqual(self.calls, [])
+
+        self._graph().run()
+        self.assertEqual(self.calls, ['a', 'final'])
+
+    def test_missing_output_is_rebuilt(self):
+        self._graph().run()
+        self.calls = []
+        os.remove(self._output('b'))
+
+        self._graph().run()
+        self.assertEqual(self.calls, ['b', 'final'])
+
+    def test_failure_skips_dependents_only(self):
+        self.inputs['a'] = 'broken'
+        results = self._graph().run()
+
+        self.assertEqual(results['a'][0], BuildGraphManager.FAILED)
+        self.assertEqual(results['b'][0], BuildGraphManager.RUN)
+        self.assertEqual(results['final'][0], BuildGraphManager.SKIPPED)
+
+    def test_timings_are_recorded(self):
+        graph = self._graph()
+        graph.run()
+
+        state = graph._read_state()
+        self.assertEqual(sorted(state), ['a', 'b', 'final'])
+        self.assertEqual(state['a']['fingerprint'], 'one')
+        self.assertGreaterEqual(state['a']['seconds'], 0)
+
+    def test_included_graph_keeps_its_own_state(self):
+        batch = BuildGraphManager(None, jobs=2)
+        batch.include(self._graph(), "team-a/")
+        results = batch.run()
+
+        self.assertEqual(results['team-a/final'][0], BuildGraphManager.RUN)
+        self.assertEqual(sorted(self._graph()._read_state()), ['a', 'b', 'final'])
+
+        # The project on its own is up to date after the batch, and the other way round
+        self.calls = []
+        self._graph().run()
+        batch = BuildGraphManager(None)
+        batch.include(self._graph(), "team-a/")
+        self.assertEqual({result[0] for result in batch.run().values()}, {BuildGraphManager.UP_TO_DATE})
+        self.assertEqual(self.calls, [])
+
+    def test_unknown_dependency(self):
+        graph = BuildGraphManager(self.config_manager)
+        with self.assertRaises(Exception):
+            graph.add(Task('final', lambda: None, deps=['missing']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from code.cache_manager import CacheManager
+
+
+class TestCacheManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_manager = Mock()
+        self.config_manager.dir = self.tmp_dir.name
+        self.config_manager.cache_size_gb = 1
+        self.cache_manager = CacheManager(self.config_manager)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, file_path, size):
+        with open(file_path, 'wb') as cache_file:
+            cache_file.write(b"0" * size)
+        return file_path
+
+    def test_key_covers_all_parts(self):
+        video = {'video': 'a.mp4', 'ticket': 'T-1'}
+        self.assertEqual(self.cache_manager.key('segment', video, 10), self.cache_manager.key('segment', video, 10))
+        self.assertNotEqual(self.cache_manager.key('segment', video, 10), self.cache_manager.key('segment', video, 20))
+        self.assertNotEqual(self.cache_manager.key('segment', video, 10),
+                            self.cache_manager.key('segment', dict(video, ticket='T-2'), 10))
+
+    def test_fingerprint_follows_content(self):
+        file_path = self._write(os.path.join(self.tmp_dir.name, "source.mp4"), 100)
+        fingerprint = self.cache_manager.fingerprint(file_path)
+        self.assertEqual(fingerprint, self.cache_manager.fingerprint(file_path))
+
+        with open(file_path, 'r+b') as source_file:
+            source_file.write(b"1")
+        os.utime(file_path, ns=(1, 1))
+        self.assertNotEqual(fingerprint, self.cache_manager.fingerprint(file_path))
+
+    def test_prune_evicts_least_recently_used(self):
+        old_file_path = self._write(self.cache_manager.get_path('ts', 'old', '.ts'), 100)
+        new_file_path = self._write(self.cache_manager.get_path('segment', 'new', '.mp4'), 100)
+        self.cache_manager.touch('ts', old_file_path)
+        self.cache_manager.touch('segment', new_file_path)
+
+        stats = self.cache_manager.stats()
+        self.assertEqual(stats['total'], {'files': 2, 'size': 200})
+        self.assertEqual(stats['ts'], {'files': 1, 'size': 100})
+
+        self.assertEqual(self.cache_manager.prune(max_size=150), (1, 100))
+        self.assertFalse(os.path.isfile(old_file_path))
+        self.assertTrue(os.path.isfile(new_file_path))
+
+    def test_prune_untracked(self):
+        tracked_file_path = self._write(self.cache_manager.get_path('stage', 'tracked', '.mp4'), 10)
+        untracked_file_path = self._write(self.cache_manager.get_path('stage', 'untracked', '.mp4'), 10)
+        self.cache_manager.touch('stage', tracked_file_path)
+
+        self.assertEqual(self.cache_manager.stats()['untracked'], {'files': 1, 'size': 10})
+        self.cache_manager.prune(untracked=True)
+        self.assertTrue(os.path.isfile(tracked_file_path))
+        self.assertFalse(os.path.isfile(untracked_file_path))
+
+    def test_prune_untracked_keeps_parts_being_written(self):
+        # The temp names of the segment, conform, chunk and filtergraph renders
+        writing_file_paths = [self._write(self.cache_manager.get_path('segment', 'segment', '.part.mp4'), 10),
+                              self._write(self.cache_manager.get_path('conform', 'conform', '.mp4.part'), 10),
+                              self._write(self.cache_manager.get_path('chunk', 'chunk', '.part.mp4'), 10)]
+        stale_file_paths = [self._write(self.cache_manager.get_path('segment', 'stale', '.part.mp4'), 10),
+                            self._write(self.cache_manager.get_path('chunk', 'stale', '.mp4.part'), 10)]
+        for file_path in stale_file_paths:
+            mtime = os.path.getmtime(file_path) - CacheManager.PART_MAX_AGE - 60
+            os.utime(file_path, (mtime, mtime))
+
+        self.assertEqual(self.cache_manager.prune(untracked=True), (2, 20))
+        self.assertTrue(all(os.path.isfile(file_path) for file_path in writing_file_paths))
+        self.assertFalse(any(os.path.isfile(file_path) for file_path in stale_file_paths))
+
+    def test_prune_untracked_looks_into_the_chunk_directories(self):
+        dir_chunks = os.path.join(self.cache_manager.get_dir('chunk'), 'key')
+        os.makedirs(dir_chunks)
+        chunk_file_path = self._write(os.path.join(dir_chunks, "00000.mp4"), 10)
+        audio_file_path = self._write(os.path.join(dir_chunks, "audio.part.m4a"), 10)
+        mtime = os.path.getmtime(audio_file_path) - CacheManager.PART_MAX_AGE - 60
+        os.utime(audio_file_path, (mtime, mtime))
+
+        self.assertEqual(self.cache_manager.prune(untracked=True), (2, 20))
+        self.assertFalse(os.path.isfile(chunk_file_path))
+        self.assertFalse(os.path.isfile(audio_file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from code.chapter_manager import ChapterManager
+from code.video_stitch import VideoData
+
+
+class TestChapterManager(unittest.TestCase):
+    def setUp(self):
+        self.chapter_manager = ChapterManager(Mock())
+
+    def test_chapters_per_clip(self):
+        videos = [{'video': "intro.mp4", 'type': 'opening'},
+                  {'video': "demo.mp4", 'ticket': "TICKET-1", 'description': "Login; with = signs"},
+                  {'video': "music.mp4", 'title': "Interlude"}]
+
+        chapters = self.chapter_manager.get_chapters(videos, [0, 5.0, 65.5], duration=3700)
+
+        self.assertEqual([chapter['title'] for chapter in chapters], ["intro", "TICKET-1 Login; with = signs",
+                                                                      "Interlude"])
+        self.assertEqual(self.chapter_manager.youtube(chapters),
+                         "0:00 intro\n0:05 TICKET-1 Login; with = signs\n1:05 Interlude\n")
+        self.assertEqual(self.chapter_manager.ffmetadata(chapters[1:2]),
+                         ";FFMETADATA1\n\n[CHAPTER]\nTIMEBASE=1/1000\nSTART=5000\nEND=65500\n"
+                         "title=TICKET-1 Login\\; with \\= signs\n")
+
+    def test_parse_keeps_the_last_chapter(self):
+        chapters = self.chapter_manager.parse(["0:23:20 Start\n", "not a chapter\n", "1:27:45 Credits\n"])
+
+        self.assertEqual(chapters, [{'title': "Start", 'start': 1400, 'end': 5265},
+                                    {'title': "Credits", 'start': 5265, 'end': None}])
+        self.assertIn("[CHAPTER]\nTIMEBASE=1/1000\nSTART=5265000\ntitle=Credits",
+                      self.chapter_manager.ffmetadata(chapters))
+
+    def test_chapters_and_output_file_change_the_assembly(self):
+        fingerprints = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name in ("intro.mp4", "outro.mp4"):
+                open(os.path.join(tmp_dir, name), 'w').close()
+            # The output file is named after the author
+            for extra in ("", "chapters: false\n", "Author: someone\n"):
+                with open(os.path.join(tmp_dir, "config.yml"), 'w') as config_file:
+                    config_file.write(f"Sprint: Chapters\nProject: Chapters\n{extra}Videos:\n"
+                                      f"  - {{type: opening, video: intro.mp4}}\n"
+                                      f"  - {{type: closing, video: outro.mp4}}\n")
+                video_data = VideoData(tmp_dir, "config.yml")
+                video_data.size = (64, 48)
+                fingerprints.append(video_data.get_assembly_fingerprint())
+
+        self.assertNotEqual(fingerprints[0], fingerprints[1])
+        self.assertNotEqual(fingerprints[0], fingerprints[2])
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "needs ffmpeg")
+    def test_write_muxes_with_stream_copy(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, "output.mp4")
+            subprocess.run(f"ffmpeg -y -v error -f lavfi -i 'testsrc=size=64x48:rate=10:duration=3' "
+                           f"-c:v libx264 -pix_fmt yuv420p '{file_path}'", shell=True, check=True)
+            size = os.path.getsize(file_path)
+            chapters = self.chapter_manager.get_chapters([{'video': "a.mp4"}, {'video': "b.mp4"}], [0, 1.5], 3)
+
+            text_file_path = self.chapter_manager.write(file_path, chapters)
+
+            metadata = subprocess.run(f"ffmpeg -v error -i '{file_path}' -f ffmetadata -", shell=True, check=True,
+                                      capture_output=True, text=True).stdout
+            self.assertIn("START=1500", metadata)
+            self.assertIn("title=b", metadata)
+            self.assertLess(abs(os.path.getsize(file_path) - size), 1024)
+            with open(text_file_path) as text_file:
+                self.assertEqual(text_file.read(), "0:00 a\n0:01 b\n")
+            self.assertEqual(sorted(os.listdir(tmp_dir)), ["output.chapters.txt", "output.mp4"])
+
+
+if __name__ == '__main__':
+    unittest.main()
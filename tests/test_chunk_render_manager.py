@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+import numpy as np
+from moviepy.editor import AudioClip, ColorClip, VideoFileClip, concatenate_videoclips
+
+from code.assembly_manager import AssemblyManager
+from code.cache_manager import CacheManager
+from code.chunk_render_manager import ChunkRenderManager
+
+
+class TestChunkRenderManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_manager = Mock()
+        self.config_manager.dir = self.tmp_dir.name
+        self.config_manager.cache_size_gb = 1
+        self.config_manager.chunk_seconds = 1
+
+        cache_manager = CacheManager(self.config_manager)
+        self.video_data = Mock()
+        self.video_data.config_manager = self.config_manager
+        self.video_data.cache_manager = cache_manager
+        self.video_data.size = (32, 16)
+        self.video_data.get_assembly_fingerprint.return_value = {'segments': ['a', 'b']}
+        self.video_data.get_preset.return_value = 'ultrafast'
+        self.video_data.assembly_manager = AssemblyManager(self.config_manager, Mock(), cache_manager)
+        self.chunk_render_manager = ChunkRenderManager(self.video_data, jobs=1)
+
+        self.timeline = concatenate_videoclips([
+            ColorClip((32, 16), color=(255, 0, 0), duration=1.5),
+            ColorClip((32, 16), color=(0, 0, 255), duration=1.5),
+        ]).set_fps(10)
+        self.timeline = self.timeline.set_audio(AudioClip(lambda t: np.sin(440 * 2 * np.pi * t), duration=3, fps=44100))
+        self.output_file_path = os.path.join(self.tmp_dir.name, "output.mp4")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_jobs_fall_back_to_the_cores_only_when_unset(self):
+        self.assertEqual(ChunkRenderManager(self.video_data, jobs=1).jobs, 1)
+        self.assertEqual(ChunkRenderManager(self.video_data, jobs=3).jobs, 3)
+        self.assertEqual(ChunkRenderManager(self.video_data, jobs=None).jobs, os.cpu_count() or 1)
+
+    def test_chunks_cover_every_frame_once(self):
+        chunks = self.chunk_render_manager.get_chunks(3, 10)
+
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], 30)
+        for (_, end_frame), (start_frame, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end_frame, start_frame)
+
+    def test_chunks_do_not_depend_on_the_jobs(self):
+        # A run resumed with another -jobs picks up the chunks that are done
+        chunks = ChunkRenderManager(self.video_data, jobs=1).get_chunks(150, 10)
+        self.assertEqual(ChunkRenderManager(self.video_data, jobs=8).get_chunks(150, 10), chunks)
+        self.assertEqual(ChunkRenderManager(self.video_data, jobs=8).get_key(10, chunks),
+                         ChunkRenderManager(self.video_data, jobs=1).get_key(10, chunks))
+        self.assertEqual(chunks[1], (10, 20))
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "needs ffmpeg")
+    def test_resume_only_encodes_missing_chunks(self):
+        encode = ChunkRenderManager.encode
+        calls = []
+
+        def crash_on_second_chunk(*args):
+            calls.append(args[1])
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            encode(*args)
+
+        with patch.object(ChunkRenderManager, 'encode', side_effect=crash_on_second_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                self.chunk_render_manager.render(self.timeline, self.output_file_path)
+
+        calls.clear()
+        with patch.object(ChunkRenderManager, 'encode', side_effect=encode) as resumed:
+            self.chunk_render_manager.render(self.timeline, self.output_file_path)
+        self.assertEqual([call.args[1] for call in resumed.call_args_list], [10, 20])
+
+        output = VideoFileClip(self.output_file_path)
+        self.assertAlmostEqual(output.duration, 3, delta=0.1)
+        self.assertIsNotNone(output.audio)
+        self.assertGreater(output.get_frame(0.5)[8, 16, 0], 200)
+        self.assertGreater(output.get_frame(2.5)[8, 16, 2], 200)
+        output.close()
+        # The checkpoints are removed once the output is written
+        self.assertEqual(os.listdir(self.video_data.cache_manager.get_dir('chunk')), [])
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "needs ffmpeg")
+    def test_shared_executor_encodes_the_chunks_and_stays_open(self):
+        def encode_chunk(options, start_frame, end_frame, fps, file_path):
+            ChunkRenderManager.encode(self.timeline, start_frame, end_frame, fps, file_path, 'ultrafast')
+            return file_path
+
+        with ThreadPoolExecutor(max_workers=2) as executor, \
+                patch('code.chunk_render_manager._encode_chunk', side_effect=encode_chunk) as encode:
+            ChunkRenderManager(self.video_data, jobs=2, executor=executor).render(self.timeline,
+                                                                                 self.output_file_path)
+            self.assertEqual(encode.call_count, 3)
+            # Still open for the next project
+            self.assertEqual(executor.submit(lambda: 1).result(), 1)
+
+        output = VideoFileClip(self.output_file_path)
+        self.assertAlmostEqual(output.duration, 3, delta=0.1)
+        output.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import Mock
+
+import numpy as np
+from moviepy.editor import ImageClip
+
+from code.countdown_manager import CountdownManager
+
+
+def fake_text_clip(txt, font=None, fontsize=None, color=None):
+    # Every glyph is a 4x6 white block with a fully opaque mask
+    width = 2 if txt == ':' else 4
+    clip = ImageClip(np.full((6, width, 3), 255, dtype=np.uint8))
+    return clip.set_mask(ImageClip(np.ones((6, width)), ismask=True))
+
+
+class TestCountdownManager(unittest.TestCase):
+    def setUp(self):
+        self.config_manager = Mock()
+        self.config_manager.txt_ticket_fontsize = 22
+        self.text_cache_manager = Mock()
+        self.text_cache_manager.text_clip.side_effect = fake_text_clip
+        self.countdown_manager = CountdownManager(self.config_manager, self.text_cache_manager)
+
+    def test_atlas_is_rendered_once(self):
+        self.countdown_manager.clip(600, margin=5)
+        self.countdown_manager.clip(30, margin=5)
+        self.assertEqual(self.text_cache_manager.text_clip.call_count, len(CountdownManager.GLYPHS))
+
+    def test_clip_layout(self):
+        margin = 5
+        clip, width = self.countdown_manager.clip(65.5, margin=margin)
+
+        # 4 digits and a colon, 3px badge padding, 1px border and the margins
+        self.assertEqual(clip.size, (4 * 4 + 2 + 8 + 2 * margin, 6 + 8 + margin))
+        self.assertEqual(width, clip.w - margin)
+        self.assertEqual(clip.duration, 65.5)
+
+        frame = clip.get_frame(0)
+        mask = clip.mask.get_frame(0)
+        self.assertEqual(tuple(frame[0, margin]), (0, 0, 0))  # border
+        self.assertEqual(tuple(frame[1, margin + 1]), (255, 0, 0))  # badge
+        self.assertEqual(tuple(frame[4, margin + 4]), (255, 255, 255))  # first digit
+        self.assertEqual(mask[0, 0], 0.0)
+        self.assertEqual(mask[0, margin], 1.0)
+
+    def test_clip_counts_down(self):
+        clip, _ = self.countdown_manager.clip(65, margin=5)
+        self.assertEqual(self.countdown_manager._render_badge(65, clip.w, clip.h, 5)[0].tolist(),
+                         clip.get_frame(0.5).tolist())
+        self.assertEqual(self.countdown_manager._render_badge(1, clip.w, clip.h, 5)[0].tolist(),
+                         clip.get_frame(64.9).tolist())
+
+    def test_clip_shorter_than_a_second(self):
+        self.assertEqual(self.countdown_manager.clip(0.5, margin=5), (None, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
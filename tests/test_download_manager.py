@@ -0,0 +1,145 @@
+import hashlib
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
+
+from code.download_manager import DownloadManager
+
+CONTENT = os.urandom(300 * 1024)
+ETAG = '"v2"'
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves CONTENT with Range and If-Range support. The first full request is cut off half way, like a dropped
+    connection.
+    """
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get('Range'))
+        self.server.if_ranges.append(self.headers.get('If-Range'))
+        start = int(self.headers['Range'][len("bytes="):-1]) if self.headers.get('Range') else 0
+        if self.headers.get('If-Range') not in (None, ETAG):
+            # Changed since, the whole file is sent
+            start = 0
+        if start >= len(CONTENT):
+            self.send_response(416)
+            self.send_header('Content-Range', f"bytes */{len(CONTENT)}")
+            self.send_header('Content-Length', "0")
+            self.end_headers()
+            return
+        body = CONTENT[start:]
+
+        self.send_response(206 if start else 200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(body)))
+        if start:
+            self.send_header('Content-Range', f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}")
+        self.end_headers()
+        if self.server.drop_first and len(self.server.requests) == 1:
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownloadManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        self.server.requests = []
+        self.server.if_ranges = []
+        self.server.drop_first = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/demo.mp4"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def _download_manager(self, project):
+        config_manager = Mock()
+        config_manager.dir = os.path.join(self.tmp_dir.name, project)
+        config_manager.download_cache_dir = os.path.join(self.tmp_dir.name, "downloads")
+        config_manager.download_jobs = 4
+        os.makedirs(config_manager.dir, exist_ok=True)
+        return DownloadManager(config_manager)
+
+    def _read(self, file_path):
+        with open(file_path, 'rb') as downloaded_file:
+            return downloaded_file.read()
+
+    def test_dropped_download_resumes_with_range(self):
+        self.server.drop_first = True
+        download_manager = self._download_manager("sprint-1")
+
+        file_path = download_manager.download({'video': "demo.mp4", 'url': self.url})
+
+        self.assertEqual(self._read(file_path), CONTENT)
+        self.assertIsNone(self.server.requests[0])
+        # Continued from what the first request got, give or take the chunk that was being read
+        offset = int(self.server.requests[1][len("bytes="):-1])
+        self.assertGreater(offset, 0)
+        self.assertLessEqual(offset, len(CONTENT) // 2)
+        self.assertEqual(self.server.if_ranges[1], ETAG)
+
+    def _write_part(self, download_manager, content, validator):
+        file_path = os.path.join(download_manager.get_dir(), "stale.mp4")
+        with open(file_path + ".part", 'wb') as part_file:
+            part_file.write(content)
+        download_manager._write_info(file_path + ".part", {'validator': validator, 'size': len(CONTENT)})
+        return file_path
+
+    def test_changed_file_is_downloaded_again(self):
+        download_manager = self._download_manager("sprint-1")
+        file_path = self._write_part(download_manager, os.urandom(1000), '"v1"')
+
+        download_manager.fetch(self.url, file_path)
+
+        self.assertEqual(self._read(file_path), CONTENT)
+        self.assertEqual(self.server.if_ranges, ['"v1"'])
+        self.assertFalse(os.path.isfile(file_path + ".part.json"))
+
+    def test_too_large_partial_file_starts_over(self):
+        download_manager = self._download_manager("sprint-1")
+        file_path = self._write_part(download_manager, CONTENT + b"stale", ETAG)
+
+        download_manager.fetch(self.url, file_path)
+
+        self.assertEqual(self._read(file_path), CONTENT)
+        # 416 for the range after the partial file, then the whole file
+        self.assertEqual(self.server.requests, [f"bytes={len(CONTENT) + 5}-", None])
+
+    def test_cache_is_shared_between_working_directories(self):
+        videos = [{'video': f"demo-{i}.mp4", 'url': self.url} for i in range(3)]
+        self.assertEqual(self._download_manager("sprint-1").run(videos), {})
+        self.assertEqual(self._download_manager("sprint-2").run(videos[:1]), {})
+
+        self.assertEqual(len(self.server.requests), 1)
+        for project, count in (("sprint-1", 3), ("sprint-2", 1)):
+            for video in videos[:count]:
+                self.assertEqual(self._read(os.path.join(self.tmp_dir.name, project, video['video'])), CONTENT)
+
+    def test_checksum_mismatch_is_not_handed_on(self):
+        download_manager = self._download_manager("sprint-1")
+        video = {'video': "demo.mp4", 'url': self.url, 'sha256': "0" * 64}
+
+        errors = download_manager.run([video])
+
+        self.assertIn("sha256", errors[download_manager.get_file_path(video)])
+        self.assertFalse(os.path.isfile(download_manager.get_file_path(video)))
+
+        video['sha256'] = hashlib.sha256(CONTENT).hexdigest()
+        self.assertEqual(self._read(download_manager.download(video)), CONTENT)
+
+
+if __name__ == '__main__':
+    unittest.main()
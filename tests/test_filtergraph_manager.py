@@ -0,0 +1,124 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from PIL import Image
+from moviepy.editor import ImageClip, VideoFileClip
+
+from code.media_probe_manager import MediaProbeManager
+from code.video_stitch import VideoData
+
+CONFIG = """
+Sprint: Parity
+Project: Parity
+Watermark:
+  path: watermark.png
+  height-ratio: 0.25
+Videos:
+  - type: opening
+    video: source.mp4
+  - video: source.mp4
+    ticket: TICKET-1
+    description: A description
+    title: Title
+  - video: source.mp4
+    background: [0, 128, 255]
+  - type: closing
+    video: source.mp4
+    show duration: False
+"""
+
+
+def fake_text_clip(txt, size=None, color=None, bg_color=None, fontsize=None, font=None):
+    # Solid 4x12 blocks per character with a soft edge, no ImageMagick needed
+    image = np.full((12, 4 * len(txt), 3), 230, dtype=np.uint8)
+    alpha = np.ones(image.shape[:2])
+    alpha[:, 0] = 0.5
+    return ImageClip(image).set_mask(ImageClip(alpha, ismask=True))
+
+
+@unittest.skipUnless(shutil.which('ffmpeg'), "needs ffmpeg")
+class TestFilterGraphManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.source_file_path = os.path.join(self.tmp_dir.name, "source.mp4")
+        subprocess.run(f"ffmpeg -y -v error -f lavfi -i 'testsrc=size=96x64:rate=10:duration=4' "
+                       f"-f lavfi -i 'sine=duration=4' -c:v libx264 -pix_fmt yuv420p -c:a aac "
+                       f"'{self.source_file_path}'", shell=True, check=True)
+        watermark = np.zeros((20, 40, 4), dtype=np.uint8)
+        watermark[:, :, 1] = 255
+        watermark[4:16, 4:36, 3] = 255
+        Image.fromarray(watermark).save(os.path.join(self.tmp_dir.name, "watermark.png"))
+        with open(os.path.join(self.tmp_dir.name, "config.yml"), 'w') as config_file:
+            config_file.write(CONFIG)
+
+        info = {'width': 96, 'height': 64, 'duration': 4.0, 'fps': 10.0}
+        self.patchers = [
+            patch('code.text_cache_manager.TextClip', side_effect=fake_text_clip),
+            patch.object(MediaProbeManager, 'probe', return_value=info),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def _render(self, backend, video_index):
+        video_data = VideoData(self.tmp_dir.name, "config.yml", backend=backend)
+        video_data.transport_stream_manager.get_file_path = lambda video: self.source_file_path
+        video_data.size = video_data.config_manager.size = (320, 96)
+        video = video_data.videos[video_index]
+        video['duration'] = 4.0
+        video_data.prepare_clip(video, watermark=True).close()
+        return VideoFileClip(video_data.get_segment_file_path(video, watermark=True))
+
+    def test_filtergraph_matches_moviepy(self):
+        for video_index in (1, 2, 3):
+            moviepy_clip = self._render('moviepy', video_index)
+            ffmpeg_clip = self._render('ffmpeg', video_index)
+
+            self.assertEqual(ffmpeg_clip.size, moviepy_clip.size)
+            self.assertAlmostEqual(ffmpeg_clip.duration, moviepy_clip.duration, delta=0.2)
+            # Sampled during the fade in, the description, the countdown and the fade out
+            for t in (0.5, 1.5, 2.5, 3.5):
+                difference = np.abs(ffmpeg_clip.get_frame(t).astype(int) - moviepy_clip.get_frame(t).astype(int))
+                self.assertLess(difference.mean(), 3, f"video {video_index} at {t}s")
+            moviepy_clip.close()
+            ffmpeg_clip.close()
+
+    def test_background_only_reads_the_audio(self):
+        video_data = VideoData(self.tmp_dir.name, "config.yml")
+        video_data.transport_stream_manager.get_file_path = lambda video: self.source_file_path
+        video_data.size = video_data.config_manager.size = (320, 96)
+        clip = video_data.video_clip(video_data.videos[2])
+        clip.audio.get_frame(1.0)
+        clip.get_frame(1.0)
+        self.assertEqual(set(video_data.reader_manager.readers), {(self.source_file_path, 'audio')})
+
+        info = {'width': 96, 'height': 64, 'duration': 4.0, 'fps': 10.0, 'audio_codec': 'aac'}
+        with patch.object(MediaProbeManager, 'probe', return_value=info), \
+                patch('code.filtergraph_manager.subprocess.run', wraps=subprocess.run) as run:
+            segment = self._render('ffmpeg', 2)
+        self.assertIn("-c:a copy", run.call_args[0][0])
+        self.assertAlmostEqual(segment.audio.duration, 4.0, delta=0.2)
+        segment.close()
+
+    def test_moviepy_backend_generates_the_background_in_the_encoder(self):
+        info = {'width': 96, 'height': 64, 'duration': 4.0, 'fps': 10.0, 'audio_codec': 'aac'}
+        with patch.object(MediaProbeManager, 'probe', return_value=info), \
+                patch('code.filtergraph_manager.subprocess.run', wraps=subprocess.run) as run:
+            segment = self._render('moviepy', 2)
+        self.assertIn("color=c=0x0080ff", run.call_args[0][0])
+        # The background fills the source area in the top left corner of the canvas
+        np.testing.assert_allclose(segment.get_frame(1.0)[32, 10], [0, 128, 255], atol=6)
+        segment.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
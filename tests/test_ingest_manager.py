@@ -0,0 +1,116 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from code.build_graph_manager import BuildGraphManager
+from code.ingest_manager import IngestManager
+from code.video_stitch import VideoData
+
+DRAFT_CONFIG = """
+Sprint: Draft
+Project: Draft
+Videos:
+  - type: opening
+    video: source.mp4
+  - video: source.mp4
+    start: 1
+  - type: closing
+    video: source.mp4
+    start: 2
+"""
+
+
+class TestIngestManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_manager = Mock()
+        self.config_manager.dir = self.tmp_dir.name
+        for name in ('good.mp4', 'bad.mp4'):
+            open(os.path.join(self.tmp_dir.name, name), 'w').close()
+
+        self.stage_video_manager = Mock()
+        self.stage_video_manager.convert.side_effect = self._stage_convert
+        self.transport_stream_manager = Mock()
+        self.transport_stream_manager.get_file_path.side_effect = lambda video: os.path.join(
+            self.tmp_dir.name, video['video'] + '.ts')
+        self.ingest_manager = IngestManager(self.config_manager, self.stage_video_manager,
+                                            self.transport_stream_manager, jobs=4)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _stage_convert(self, file_path, video):
+        if video['video'] == 'bad.mp4':
+            raise RuntimeError("broken file")
+        return file_path
+
+    def test_run_isolates_errors(self):
+        videos = [{'video': 'good.mp4'}, {'video': 'bad.mp4'}, {'video': 'missing.mp4'}]
+        results = self.ingest_manager.run(videos)
+
+        self.assertEqual(results[os.path.join(self.tmp_dir.name, 'good.mp4')][0], IngestManager.CONVERTED)
+        self.assertEqual(results[os.path.join(self.tmp_dir.name, 'bad.mp4')][0], IngestManager.FAILED)
+        self.assertEqual(results[os.path.join(self.tmp_dir.name, 'missing.mp4')][0], IngestManager.SKIPPED)
+
+    def test_run_converts_shared_source_once(self):
+        videos = [{'video': 'good.mp4'}, {'video': 'good.mp4', 'start': 10}]
+        results = self.ingest_manager.run(videos)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(self.stage_video_manager.convert.call_count, 1)
+
+    def test_ingest_skips_existing_transport_stream(self):
+        open(os.path.join(self.tmp_dir.name, 'good.mp4.ts'), 'w').close()
+        status, _ = self.ingest_manager.ingest({'video': 'good.mp4'})
+
+        self.assertEqual(status, IngestManager.CACHED)
+        self.stage_video_manager.convert.assert_not_called()
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "needs ffmpeg")
+    def test_draft_ingests_a_proxy_per_start(self):
+        subprocess.run(f"ffmpeg -y -v error -f lavfi -i 'testsrc=size=64x48:rate=10:duration=3' "
+                       f"-c:v libx264 -pix_fmt yuv420p '{os.path.join(self.tmp_dir.name, 'source.mp4')}'",
+                       shell=True, check=True)
+        with open(os.path.join(self.tmp_dir.name, "config.yml"), 'w') as config_file:
+            config_file.write(DRAFT_CONFIG)
+        video_data = VideoData(self.tmp_dir.name, "config.yml", draft=True)
+
+        graph = video_data.build_graph()
+        ingest_names = [name for name in graph.tasks if name.startswith('ingest:')]
+        self.assertEqual(ingest_names, ['ingest:source.mp4', 'ingest:source.mp4#2', 'ingest:source.mp4#3'])
+        for name in ingest_names:
+            graph.tasks[name].action()
+
+        file_paths = {video_data.transport_stream_manager.get_file_path(video) for video in video_data.videos}
+        self.assertEqual(len(file_paths), 3)
+        self.assertTrue(all(os.path.isfile(file_path) for file_path in file_paths))
+
+    def test_graph_run_prints_the_ingest_summary(self):
+        with open(os.path.join(self.tmp_dir.name, "config.yml"), 'w') as config_file:
+            config_file.write(DRAFT_CONFIG)
+        video_data = VideoData(self.tmp_dir.name, "config.yml", draft=True)
+        video_data.ingest_manager.print_summary = Mock()
+        # The source is missing, so the ingest is skipped and its task fails
+        with self.assertRaises(Exception):
+            video_data.ingest_action(video_data.videos[0], os.path.join(self.tmp_dir.name, 'source.mp4'))()
+
+        video_data.print_ingest_summary({
+            'ingest:source.mp4': (BuildGraphManager.FAILED, 0, "missing"),
+            'ingest:source.mp4#2': (BuildGraphManager.UP_TO_DATE, 0, "up to date"),
+            'ingest:source.mp4#3': (BuildGraphManager.SKIPPED, 0, "a dependency failed"),
+            'size': (BuildGraphManager.RUN, 0, ""),
+        })
+
+        summary = video_data.ingest_manager.print_summary.call_args.args[0]
+        self.assertEqual({os.path.basename(file_path): result[0] for file_path, result in summary.items()}, {
+            'source.mp4': IngestManager.SKIPPED,
+            'source.mp4#2': IngestManager.CACHED,
+            'source.mp4#3': IngestManager.FAILED,
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+
+from code.job_queue_manager import JobQueueManager
+
+
+def write_output(payload):
+    # O_EXCL fails when a job runs twice
+    fd = os.open(payload['path'], os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    with os.fdopen(fd, 'w') as output_file:
+        output_file.write(str(os.getpid()))
+    if payload.get('inputs'):
+        missing = [path for path in payload['inputs'] if not os.path.isfile(path)]
+        assert not missing, f"ran before its dependencies: {missing}"
+    time.sleep(0.05)
+    return payload['path']
+
+
+def fail(payload):
+    raise RuntimeError("broken job")
+
+
+def work(dir_queue, worker_id):
+    JobQueueManager(dir_queue, heartbeat_interval=0.1, stale_after=5).work(write_output, worker_id=worker_id,
+                                                                           poll_interval=0.05)
+
+
+class TestJobQueueManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir_queue = os.path.join(self.tmp_dir.name, "queue")
+        self.job_queue_manager = JobQueueManager(self.dir_queue, heartbeat_interval=0.1, stale_after=5)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_workers_run_every_job_once(self):
+        segments = [f"segment-{i:02d}" for i in range(12)]
+        for job_id in segments:
+            self.job_queue_manager.add(job_id, {'path': self._path(job_id)})
+        self.job_queue_manager.add('assemble', {'path': self._path('assemble'),
+                                                'inputs': [self._path(job_id) for job_id in segments]},
+                                   deps=segments)
+
+        workers = [multiprocessing.Process(target=work, args=(self.dir_queue, f"worker-{i}")) for i in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=60)
+            self.assertEqual(worker.exitcode, 0)
+
+        status = self.job_queue_manager.status()
+        self.assertEqual(set(status.values()), {JobQueueManager.DONE})
+        self.assertEqual(self.job_queue_manager.result('assemble'), self._path('assemble'))
+        # The jobs were shared out over the workers
+        pids = set()
+        for job_id in segments:
+            with open(self._path(job_id)) as output_file:
+                pids.add(output_file.read())
+        self.assertGreater(len(pids), 1)
+
+    def test_stale_claim_is_taken_over(self):
+        self.job_queue_manager.add('segment', {'path': self._path('segment')})
+        lock_path = os.path.join(self.dir_queue, "claimed", "segment.lock")
+        with open(lock_path, 'w') as lock_file:
+            lock_file.write("dead-worker/0")
+        self.assertIsNone(self.job_queue_manager.claim('worker'))
+
+        # No heartbeat for longer than stale_after
+        os.utime(lock_path, (time.time() - 10, time.time() - 10))
+        self.job_queue_manager.work(write_output, worker_id='worker', poll_interval=0.05)
+
+        self.assertEqual(self.job_queue_manager.status(), {'segment': JobQueueManager.DONE})
+        with open(os.path.join(self.dir_queue, "jobs", "segment.json")) as job_file:
+            attempts = json.load(job_file)['attempts']
+        self.assertEqual(attempts, [{'worker': 'dead-worker', 'error': "No heartbeat"}])
+
+    def test_failed_job_is_retried_then_fails_its_dependents(self):
+        self.job_queue_manager.add('segment', {})
+        self.job_queue_manager.add('assemble', {}, deps=['segment'])
+
+        counts = self.job_queue_manager.work(fail, worker_id='worker', poll_interval=0.05)
+
+        self.assertEqual(counts, {JobQueueManager.DONE: 0, JobQueueManager.FAILED: 3})
+        self.assertEqual(self.job_queue_manager.status(), {'segment': JobQueueManager.FAILED,
+                                                           'assemble': JobQueueManager.FAILED})
+        # Adding a failed job again queues it for another round
+        self.assertTrue(self.job_queue_manager.add('segment', {}))
+        self.assertEqual(self.job_queue_manager.status()['segment'], JobQueueManager.PENDING)
+
+
+if __name__ == '__main__':
+    unittest.main()
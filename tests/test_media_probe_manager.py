@@ -0,0 +1,77 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from code.media_probe_manager import MediaProbeManager
+
+
+class TestMediaProbeManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_manager = Mock()
+        self.config_manager.dir = self.tmp_dir.name
+        self.file_path = os.path.join(self.tmp_dir.name, "video.ts")
+        with open(self.file_path, 'wb') as video_file:
+            video_file.write(b"0" * 10)
+        self.info = {'width': 1920, 'height': 1080, 'duration': 12.5, 'fps': 25.0, 'codec': 'h264',
+                     'keyframe_times': [0.0, 10.0], 'keyframes': 2}
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_probe_is_indexed_across_instances(self):
+        with patch.object(MediaProbeManager, '_probe', return_value=self.info) as probe:
+            self.assertEqual(MediaProbeManager(self.config_manager).probe(self.file_path), self.info)
+            self.assertEqual(MediaProbeManager(self.config_manager).probe(self.file_path), self.info)
+
+        self.assertEqual(probe.call_count, 1)
+
+    def test_changed_file_is_probed_again(self):
+        media_probe_manager = MediaProbeManager(self.config_manager)
+        with patch.object(MediaProbeManager, '_probe', return_value=self.info) as probe:
+            media_probe_manager.probe(self.file_path)
+            with open(self.file_path, 'ab') as video_file:
+                video_file.write(b"1")
+            media_probe_manager.probe(self.file_path)
+
+        self.assertEqual(probe.call_count, 2)
+
+    def test_rotation_swaps_size(self):
+        media_probe_manager = MediaProbeManager(self.config_manager)
+        self.assertEqual(media_probe_manager._rotation({'side_data_list': [{'rotation': -90}]}), 90)
+        self.assertEqual(media_probe_manager._rotation({'tags': {'rotate': '180'}}), 180)
+        self.assertEqual(media_probe_manager._rotation({}), 0)
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "needs ffmpeg")
+    def test_without_ffprobe_the_size_comes_from_ffmpeg(self):
+        file_path = os.path.join(self.tmp_dir.name, "video.mp4")
+        subprocess.run(f"ffmpeg -y -v error -f lavfi -i 'testsrc=size=64x48:rate=10:duration=2' "
+                       f"-f lavfi -i 'sine=duration=2' -c:v libx264 -c:a aac '{file_path}'", shell=True, check=True)
+        media_probe_manager = MediaProbeManager(self.config_manager)
+
+        with patch.object(MediaProbeManager, 'has_ffprobe', return_value=False):
+            info = media_probe_manager.probe(file_path)
+
+        self.assertEqual((info['width'], info['height'], info['fps']), (64, 48, 10))
+        self.assertAlmostEqual(info['duration'], 2, delta=0.1)
+        self.assertEqual(info['sample_rate'], 44100)
+        # Read in full once ffprobe is there
+        with patch.object(MediaProbeManager, 'has_ffprobe', return_value=True), \
+                patch.object(MediaProbeManager, '_probe', return_value=self.info) as probe:
+            self.assertEqual(media_probe_manager.probe(file_path), self.info)
+            self.assertEqual(media_probe_manager.probe(file_path), self.info)
+        self.assertEqual(probe.call_count, 1)
+
+    def test_failed_ffprobe_names_the_file(self):
+        error = subprocess.CalledProcessError(1, "ffprobe", stderr="Invalid data found when processing input\n")
+        with patch.object(MediaProbeManager, 'has_ffprobe', return_value=True), \
+                patch('code.media_probe_manager.subprocess.run', side_effect=error):
+            with self.assertRaisesRegex(Exception, "ffprobe could not read .*video.ts.*Invalid data"):
+                MediaProbeManager(self.config_manager)._probe(self.file_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+
+from code.profile_manager import ProfileManager
+
+
+def work_in_worker(dir_profile):
+    profile_manager = ProfileManager()
+    profile_manager.enable(dir_profile, python=True)
+    with profile_manager.frame_loop("worker loop"):
+        sum(range(1000))
+    profile_manager.flush()
+
+
+class TestProfileManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dir_profile = os.path.join(self.tmp_dir.name, "profile")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_disabled_records_nothing(self):
+        profile_manager = ProfileManager()
+        with profile_manager.span("stage"):
+            with profile_manager.frame_loop("loop"):
+                pass
+
+        self.assertEqual(profile_manager.events, [])
+        self.assertIsNone(profile_manager.merge())
+
+    def test_nested_spans(self):
+        profile_manager = ProfileManager()
+        profile_manager.enable(self.dir_profile)
+        with profile_manager.span("stage", 'task'):
+            with profile_manager.span("ffmpeg stage", 'ffmpeg', video="demo.mp4"):
+                time.sleep(0.01)
+
+        inner, outer = profile_manager.events
+        self.assertEqual(inner['args'], {'video': "demo.mp4"})
+        self.assertGreaterEqual(inner['dur'], 10000)
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(outer['ts'] + outer['dur'], inner['ts'] + inner['dur'])
+
+    def test_merge_combines_processes(self):
+        profile_manager = ProfileManager()
+        profile_manager.enable(self.dir_profile, python=True)
+        profile_manager.reset()
+        with profile_manager.span("run"):
+            worker = multiprocessing.Process(target=work_in_worker, args=(self.dir_profile,))
+            worker.start()
+            worker.join()
+
+        trace_file_path = profile_manager.merge()
+
+        with open(trace_file_path) as trace_file:
+            events = json.load(trace_file)['traceEvents']
+        names = {event['name']: event['pid'] for event in events if event['ph'] == 'X'}
+        self.assertEqual(names, {'run': os.getpid(), 'worker loop': worker.pid})
+        self.assertEqual(len([event for event in events if event['ph'] == 'M']), 2)
+        self.assertTrue(os.path.isfile(os.path.join(self.dir_profile, "python.prof")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+import numpy as np
+from moviepy.editor import VideoFileClip
+
+from code.reader_manager import ReaderManager
+from code.timeline_manager import TimelineManager
+
+
+@unittest.skipUnless(shutil.which('ffmpeg'), "needs ffmpeg")
+class TestReaderManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_manager = Mock()
+        self.config_manager.max_open_readers = 2
+        self.file_paths = []
+        for i, pattern in enumerate(('testsrc', 'smptebars', 'rgbtestsrc')):
+            file_path = os.path.join(self.tmp_dir.name, f"{pattern}.mp4")
+            subprocess.run(f"ffmpeg -y -v error -f lavfi -i '{pattern}=size=64x48:rate=10:duration=1' "
+                           f"-f lavfi -i 'sine=frequency={440 * (i + 1)}:duration=1' -c:v libx264 -pix_fmt yuv420p "
+                           f"-c:a aac '{file_path}'", shell=True, check=True)
+            self.file_paths.append(file_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_clips_open_readers_on_demand(self):
+        reader_manager = ReaderManager(self.config_manager)
+        clips = [reader_manager.clip(file_path) for file_path in self.file_paths]
+        self.assertEqual(reader_manager.open_count(), 0)
+
+        for clip, file_path in zip(clips, self.file_paths):
+            source = VideoFileClip(file_path)
+            self.assertEqual(list(clip.size), list(source.size))
+            self.assertEqual(clip.duration, source.duration)
+            np.testing.assert_array_equal(clip.get_frame(0.5), source.get_frame(0.5))
+            source.close()
+            self.assertLessEqual(reader_manager.open_count(), 2)
+
+        # The least recently used reader went first
+        self.assertEqual(set(reader_manager.readers), {(path, 'video') for path in self.file_paths[1:]})
+        clips[2].close()
+        self.assertEqual(reader_manager.open_count(), 1)
+
+    def test_timeline_closes_clips_it_has_passed(self):
+        reader_manager = ReaderManager(self.config_manager, max_open_readers=10)
+        clips = [reader_manager.clip(file_path) for file_path in self.file_paths]
+        timeline = TimelineManager().concatenate(clips, release=lambda i: reader_manager.close(self.file_paths[i]))
+
+        open_counts = []
+        for frame in range(int(timeline.duration * timeline.fps)):
+            timeline.get_frame(frame / timeline.fps)
+            open_counts.append(reader_manager.open_count())
+
+        self.assertEqual(max(open_counts), 1)
+        self.assertEqual(timeline.audio.to_soundarray(fps=8000).shape[1], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from moviepy.editor import ImageClip, VideoFileClip
+
+from code.segment_render_manager import SegmentRenderManager
+from code.video_stitch import VideoData
+
+CONFIG = """
+Sprint: Segments
+Project: Segments
+Videos:
+  - type: opening
+    video: intro.mp4
+  - video: demo.mp4
+  - video: demo.mp4
+    start: 1
+  - type: closing
+    video: outro.mp4
+"""
+
+TOC_CONFIG = """
+Sprint: Segments
+Project: Segments
+Videos:
+  - type: opening
+    video: intro.mp4
+    show toc: true
+  - video: demo.mp4
+    ticket: TICKET-1
+    description: Login
+  - type: closing
+    video: outro.mp4
+"""
+
+
+def fake_text_clip(txt, size=None, color=None, bg_color=None, fontsize=None, font=None):
+    return ImageClip(np.zeros((10, 8 * len(txt), 3), dtype=np.uint8))
+
+
+def render_segment(video_data, video):
+    """
+    Stands in for VideoData.render_segment in the workers: a lavfi clip at the canvas size, and a line in
+    renders.log with the worker and how many segments its VideoData rendered
+    """
+    video_data.renders = getattr(video_data, 'renders', 0) + 1
+    if video_data.assembly == 'copy' and video_data.is_toc_video(video):
+        # Lists every video with its duration
+        video_data.table_of_contents_manager.clip()
+    file_path = video_data.get_segment_path(video)
+    width, height = video_data.size
+    subprocess.run(f"ffmpeg -y -v error -f lavfi -i 'testsrc=size={width}x{height}:rate=10:duration=1' "
+                   f"-c:v libx264 -pix_fmt yuv420p '{file_path}'", shell=True, check=True)
+    with open(os.path.join(video_data.dir, "renders.log"), 'a') as log_file:
+        log_file.write(f"{os.getpid()} {video_data.renders}\n")
+    return file_path
+
+
+@unittest.skipUnless(shutil.which('ffmpeg'), "needs ffmpeg")
+# The workers are forked with the patched render_segment
+@unittest.skipUnless(multiprocessing.get_start_method() == 'fork', "needs forked workers")
+class TestSegmentRenderManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmp_dir.name, "config.yml"), 'w') as config_file:
+            config_file.write(CONFIG)
+        for name in ("intro.mp4", "demo.mp4", "outro.mp4"):
+            open(os.path.join(self.tmp_dir.name, name), 'w').close()
+        self.video_data = VideoData(self.tmp_dir.name, "config.yml", jobs=2)
+        self.video_data.size = (64, 48)
+        self.patcher = patch.object(VideoData, 'render_segment', render_segment)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def _renders(self):
+        with open(os.path.join(self.tmp_dir.name, "renders.log")) as log_file:
+            return [tuple(int(value) for value in line.split()) for line in log_file]
+
+    def _assert_segment(self, file_path):
+        self.assertTrue(os.path.isfile(file_path))
+        segment = VideoFileClip(file_path)
+        self.assertEqual(list(segment.size), [64, 48])
+        segment.close()
+
+    def test_render_fans_out_and_skips_cached_segments(self):
+        segment_render_manager = SegmentRenderManager(self.video_data, jobs=2)
+        videos = self.video_data.videos[:2]
+
+        rendered = segment_render_manager.render(videos)
+
+        self.assertEqual(sorted(rendered), sorted(self.video_data.get_segment_path(video) for video in videos))
+        for file_path in rendered:
+            self._assert_segment(file_path)
+        self.assertTrue(all(pid != os.getpid() for pid, _ in self._renders()))
+        self.assertEqual(segment_render_manager.render(self.video_data.videos[:2]), [])
+
+    def test_render_one_keeps_a_video_data_per_worker(self):
+        segment_render_manager = SegmentRenderManager(self.video_data, jobs=2)
+        try:
+            for video in self.video_data.videos:
+                file_path = segment_render_manager.render_one(video)
+                self.assertEqual(file_path, self.video_data.get_segment_path(video))
+                self._assert_segment(file_path)
+            executor = segment_render_manager.executor
+
+            # A changed config sets the worker up again
+            config_file_path = os.path.join(self.tmp_dir.name, "config.yml")
+            mtime = os.path.getmtime(config_file_path) + 10
+            os.utime(config_file_path, (mtime, mtime))
+            segment_render_manager.render_one(self.video_data.videos[0])
+        finally:
+            segment_render_manager.shutdown()
+
+        renders = self._renders()
+        self.assertEqual(len(renders), 5)
+        # Every worker counts up on the VideoData it set up for its first segment
+        for pid in {pid for pid, _ in renders[:4]}:
+            self.assertEqual([count for worker, count in renders[:4] if worker == pid],
+                             list(range(1, sum(worker == pid for worker, _ in renders[:4]) + 1)))
+        self.assertEqual(renders[4][1], 1)
+        # The pool lived until shutdown
+        self.assertIsNotNone(executor)
+        self.assertIsNone(segment_render_manager.executor)
+
+    def test_copy_assembly_renders_the_table_of_contents_in_a_worker(self):
+        with open(os.path.join(self.tmp_dir.name, "config.yml"), 'w') as config_file:
+            config_file.write(TOC_CONFIG)
+        video_data = VideoData(self.tmp_dir.name, "config.yml", jobs=2, assembly='copy')
+        video_data.size = (64, 48)
+        # As VideoData.get_max_video_size leaves them, the config has no durations
+        for video in video_data.videos:
+            video.update(size=[64, 48], duration=1.5)
+
+        with patch('code.text_cache_manager.TextClip', side_effect=fake_text_clip):
+            rendered = SegmentRenderManager(video_data, jobs=2).render(video_data.videos)
+
+        # The workers key the segments as the parent does, the table of contents one included
+        self.assertEqual(sorted(rendered), sorted(video_data.get_segment_path(video) for video in video_data.videos))
+        self.assertTrue(video_data.is_toc_video(video_data.videos[0]))
+        self.assertEqual(SegmentRenderManager(video_data, jobs=2).render(video_data.videos), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
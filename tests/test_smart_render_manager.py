@@ -0,0 +1,93 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+from moviepy.editor import ImageClip, VideoFileClip
+
+from code.media_probe_manager import MediaProbeManager
+from code.smart_render_manager import SmartRenderManager
+from code.video_stitch import VideoData
+
+CONFIG = """
+Sprint: Smart
+Project: Smart
+Videos:
+  - type: opening
+    video: source.mp4
+  - video: source.mp4
+    description: A description
+    show duration: False
+  - type: closing
+    video: source.mp4
+"""
+
+
+def fake_text_clip(txt, size=None, color=None, bg_color=None, fontsize=None, font=None):
+    # Solid 4x12 blocks per character, no ImageMagick needed
+    return ImageClip(np.full((12, 4 * len(txt), 3), 230, dtype=np.uint8))
+
+
+class TestSmartRenderManager(unittest.TestCase):
+    def test_plan_copies_whole_gops_between_windows(self):
+        smart_render_manager = SmartRenderManager(Mock())
+        keyframe_times = [2.0 * i for i in range(10)]
+
+        # Clip from 1s to 17s of the source, a fade in (with a description) and a fade out
+        parts = smart_render_manager.plan([(0, 3), (15, 16)], keyframe_times, 1.0, 16)
+
+        self.assertEqual(parts, [('encode', 0, 3.0), ('copy', 3.0, 15.0), ('encode', 15.0, 16)])
+        self.assertEqual(smart_render_manager.plan([(0, 16)], keyframe_times, 1.0, 16), [('encode', 0, 16)])
+
+    @unittest.skipUnless(shutil.which('ffmpeg'), "needs ffmpeg")
+    def test_smart_render_matches_full_render(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source_file_path = os.path.join(tmp_dir, "source.mp4")
+            # A keyframe every second
+            subprocess.run(f"ffmpeg -y -v error -f lavfi -i 'testsrc=size=96x64:rate=10:duration=10' "
+                           f"-f lavfi -i 'sine=duration=10' -c:v libx264 -pix_fmt yuv420p -g 10 -keyint_min 10 "
+                           f"-sc_threshold 0 -c:a aac '{source_file_path}'", shell=True, check=True)
+            with open(os.path.join(tmp_dir, "config.yml"), 'w') as config_file:
+                config_file.write(CONFIG)
+
+            info = {'width': 96, 'height': 64, 'duration': 10.0, 'start_time': 0.0, 'fps': 10.0, 'codec': 'h264',
+                    'pix_fmt': 'yuv420p', 'keyframe_times': [float(i) for i in range(10)]}
+            with patch('code.text_cache_manager.TextClip', side_effect=fake_text_clip), \
+                    patch.object(MediaProbeManager, 'probe', return_value=info):
+                segments = {}
+                for smart_render in (False, True):
+                    video_data = VideoData(tmp_dir, "config.yml", smart_render=smart_render)
+                    video_data.transport_stream_manager.get_file_path = lambda video: source_file_path
+                    video_data.size = video_data.config_manager.size = (96, 64)
+                    video = video_data.videos[1]
+                    video['duration'] = 10.0
+                    with patch.object(video_data, 'write_videofile', wraps=video_data.write_videofile) as write:
+                        video_data.prepare_clip(video).close()
+                    segments[smart_render] = VideoFileClip(video_data.get_segment_file_path(video))
+                    if smart_render:
+                        # The fade in with the description and the fade out, the 6 seconds in between are copied
+                        self.assertEqual([call[0][0].duration for call in write.call_args_list], [3, 1])
+
+            full, smart = segments[False], segments[True]
+            self.assertAlmostEqual(smart.duration, full.duration, delta=0.15)
+            self.assertAlmostEqual(smart.audio.duration, full.audio.duration, delta=0.15)
+            # The encoded parts look like the full render, the copied GOPs decode to the frames of the source
+            for t in (0.05, 0.55, 2.95, 9.05, 9.55):
+                difference = np.abs(smart.get_frame(t).astype(int) - full.get_frame(t).astype(int))
+                self.assertLess(difference.mean(), 3, f"at {t}s")
+            frames, source_frames = self.get_frame_hashes(smart.filename), self.get_frame_hashes(source_file_path)
+            self.assertEqual(frames[30:90], source_frames[30:90])
+            for clip in (full, smart):
+                clip.close()
+
+    def get_frame_hashes(self, file_path):
+        framemd5 = subprocess.run(f"ffmpeg -v error -i '{file_path}' -map 0:v -f framemd5 -", shell=True, check=True,
+                                  capture_output=True, text=True).stdout
+        return [line.split(',')[-1].strip() for line in framemd5.splitlines() if not line.startswith('#')]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from code.cache_manager import CacheManager
+from code.stage_video_manager import StageVideoManager
+
+
+class TestStageVideoManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_manager = Mock()
+        self.config_manager.dir = self.tmp_dir.name
+        self.config_manager.cache_size_gb = 1
+        with open(os.path.join(self.tmp_dir.name, "demo.mp4"), 'wb') as video_file:
+            video_file.write(b"0" * 10)
+        self.video = {'video': "demo.mp4", 'start': 12}
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_full_render_ignores_trim(self):
+        stage_video_manager = StageVideoManager(self.config_manager, CacheManager(self.config_manager),
+                                                subclip_duration=10)
+        self.assertEqual(stage_video_manager.get_command(self.video), StageVideoManager.COMMAND)
+
+    def test_background_copies_the_video(self):
+        stage_video_manager = StageVideoManager(self.config_manager, CacheManager(self.config_manager))
+        background = dict(self.video, background=[0, 0, 0])
+
+        self.assertIn("-c:v copy", stage_video_manager.get_command(background))
+        self.assertNotEqual(stage_video_manager.get_key(background), stage_video_manager.get_key(self.video))
+
+    def test_draft_seeks_trims_and_scales(self):
+        stage_video_manager = StageVideoManager(self.config_manager, CacheManager(self.config_manager, draft=True),
+                                                draft_scale=0.5, subclip_duration=10)
+        command = stage_video_manager.get_command(self.video)
+
+        self.assertIn("-ss 12 -t 10 -i '{input}'", command)
+        self.assertIn("iw*0.5", command)
+        self.assertIn("-preset ultrafast", command)
+
+    def test_draft_is_cached_separately(self):
+        full = StageVideoManager(self.config_manager, CacheManager(self.config_manager))
+        draft = StageVideoManager(self.config_manager, CacheManager(self.config_manager, draft=True),
+                                  draft_scale=0.5)
+
+        self.assertNotEqual(full.get_key(self.video), draft.get_key(self.video))
+        self.assertTrue(draft.get_file_path(self.video).startswith(os.path.join(self.tmp_dir.name, "draft", "stage")))
+
+
+if __name__ == '__main__':
+    unittest.main()
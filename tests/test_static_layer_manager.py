@@ -0,0 +1,76 @@
+import unittest
+
+import numpy as np
+from moviepy.editor import ColorClip, CompositeVideoClip, ImageClip, vfx
+
+from code.static_layer_manager import StaticLayerManager
+
+
+class TestStaticLayerManager(unittest.TestCase):
+    def setUp(self):
+        self.static_layer_manager = StaticLayerManager()
+        self.size = (64, 48)
+
+    def _text(self, color, size, pos):
+        # Stands in for a rendered text: a coloured block with a soft edge in its mask
+        mask = np.ones(size[::-1])
+        mask[:, 0] = 0.5
+        return ImageClip(np.full(size[::-1] + (3,), color, dtype=np.uint8)) \
+            .set_mask(ImageClip(mask, ismask=True)).set_position(pos)
+
+    def test_is_static(self):
+        text = self._text(200, (10, 5), (3, 4))
+        self.assertTrue(self.static_layer_manager.is_static(text))
+        self.assertTrue(self.static_layer_manager.is_static(CompositeVideoClip([text], size=self.size)))
+        self.assertFalse(self.static_layer_manager.is_static(text.fx(vfx.fadein, 1)))
+        self.assertFalse(self.static_layer_manager.is_static(
+            CompositeVideoClip([text.set_duration(2)], size=self.size).fx(vfx.fadein, 1)))
+        moving = text.set_position(lambda t: (int(10 * t), 0))
+        self.assertFalse(self.static_layer_manager.is_static(
+            CompositeVideoClip([moving.set_duration(2)], size=self.size)))
+
+    def test_flattened_rows_match_the_composite(self):
+        rows = [self._text(50 + 20 * i, (12 + i, 5), ((i * 7) % 40, 6 * i + 2)) for i in range(6)]
+        background = ColorClip(self.size, color=(0, 0, 255), duration=3)
+
+        # Each row straight onto the background, a nested composite would apply the soft edges twice
+        expected = CompositeVideoClip([background] + [row.set_duration(3).fx(vfx.fadein, 1.0).fx(vfx.fadeout, 1.0)
+                                                      for row in rows])
+        flattened = self.static_layer_manager.flatten(rows, self.size).set_duration(3)
+        self.assertLess(flattened.w, self.size[0])
+        actual = CompositeVideoClip([background, self.static_layer_manager.fade(flattened, 1.0, 1.0)])
+
+        for t in (0, 0.25, 1.5, 2.5, 2.9):
+            np.testing.assert_allclose(actual.get_frame(t), expected.get_frame(t), atol=1)
+
+    def test_semi_transparent_layer_matches_direct_compositing(self):
+        layer = ImageClip(np.full((6, 10, 3), 200, dtype=np.uint8)) \
+            .set_mask(ImageClip(np.full((6, 10), 0.5), ismask=True)).set_position((3, 4))
+        background = ColorClip(self.size, color=(0, 0, 255), duration=1)
+
+        expected = CompositeVideoClip([background, layer.set_duration(1)]).get_frame(0)
+        actual = CompositeVideoClip([background, self.static_layer_manager.flatten([layer], self.size)
+                                    .set_duration(1)]).get_frame(0)
+
+        np.testing.assert_allclose(actual, expected, atol=1)
+        np.testing.assert_allclose(actual[5, 5], [100, 100, 227], atol=1)
+
+    def test_flatten_layers_keeps_order_and_timing(self):
+        ticket = self._text(255, (10, 6), (0, 40)).set_duration(3)
+        bar = self._text(100, (30, 6), (12, 40)).set_duration(3)
+        countdown = ColorClip((8, 6), color=(0, 255, 0)).set_duration(3).set_position((50, 40))
+        layers = [
+            {'clip': ticket, 'fadein': None, 'fadeout': 1.0, 'fps': None},
+            {'clip': bar, 'fadein': None, 'fadeout': 1.0, 'fps': None},
+            {'clip': countdown, 'fadein': None, 'fadeout': None, 'fps': 1},
+        ]
+
+        flattened = self.static_layer_manager.flatten_layers(layers, self.size)
+
+        self.assertEqual(len(flattened), 2)
+        self.assertEqual((flattened[0]['clip'].duration, flattened[0]['fadeout']), (3, 1.0))
+        self.assertIs(flattened[1]['clip'], countdown)
+
+
+if __name__ == '__main__':
+    unittest.main()
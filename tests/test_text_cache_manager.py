@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import numpy as np
+from moviepy.editor import ImageClip
+
+from code.text_cache_manager import TextCacheManager
+
+
+def fake_text_clip(txt, size=None, color=None, bg_color=None, fontsize=None, font=None):
+    image = np.random.randint(0, 255, (10, 8 * len(txt), 3), dtype=np.uint8)
+    alpha = np.random.randint(0, 255, image.shape[:2]) / 255
+    return ImageClip(image).set_mask(ImageClip(alpha, ismask=True))
+
+
+class TestTextCacheManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_manager = Mock()
+        self.config_manager.dir = self.tmp_dir.name
+        self.config_manager.text_cache_size_mb = 256
+        self.config_manager.text_cache_dir = None
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @patch('code.text_cache_manager.TextClip', side_effect=fake_text_clip)
+    def test_warm_cache_does_not_render(self, text_clip):
+        cold = TextCacheManager(self.config_manager).text_clip("TICKET-1", fontsize=22, color='red')
+        warm_manager = TextCacheManager(self.config_manager)
+        warm = warm_manager.text_clip("TICKET-1", fontsize=22, color='red')
+
+        self.assertEqual(text_clip.call_count, 1)
+        self.assertEqual(warm_manager.hits, 1)
+        np.testing.assert_array_equal(cold.get_frame(0), warm.get_frame(0))
+        np.testing.assert_array_equal(cold.mask.get_frame(0), warm.mask.get_frame(0))
+
+    @patch('code.text_cache_manager.TextClip', side_effect=fake_text_clip)
+    def test_key_covers_style(self, text_clip):
+        text_cache_manager = TextCacheManager(self.config_manager)
+        text_cache_manager.text_clip("TICKET-1", fontsize=22, color='red')
+        text_cache_manager.text_clip("TICKET-1", fontsize=22, color='blue')
+        text_cache_manager.text_clip("TICKET-1", fontsize=24, color='red')
+        text_cache_manager.text_clip("TICKET-1", font='Amiri-Bold', fontsize=22, color='red')
+
+        self.assertEqual(text_clip.call_count, 4)
+
+    @patch('code.text_cache_manager.TextClip', side_effect=fake_text_clip)
+    def test_evicts_least_recently_used(self, text_clip):
+        text_cache_manager = TextCacheManager(self.config_manager)
+        text_cache_manager.text_clip("first " * 20)
+        text_cache_manager.text_clip("second " * 20)
+        first_file_path, second_file_path = sorted(
+            (entry.path for entry in os.scandir(text_cache_manager.dir_text)), key=os.path.getmtime)
+        os.utime(first_file_path, (1, 1))
+        os.utime(second_file_path, (2, 2))
+
+        text_cache_manager.max_size = os.path.getsize(second_file_path) + os.path.getsize(first_file_path) - 1
+        text_cache_manager.evict()
+
+        self.assertFalse(os.path.isfile(first_file_path))
+        self.assertTrue(os.path.isfile(second_file_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
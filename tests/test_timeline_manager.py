@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+from moviepy.editor import AudioClip, ColorClip
+
+from code.timeline_manager import TimelineManager
+
+
+class TestTimelineManager(unittest.TestCase):
+    def setUp(self):
+        self.timeline_manager = TimelineManager()
+        self.clips = [
+            ColorClip((32, 16), color=(255, 0, 0), duration=1.0).set_fps(10),
+            ColorClip((32, 16), color=(0, 255, 0), duration=0.5).set_fps(10),
+            ColorClip((32, 16), color=(0, 0, 255), duration=2.0).set_fps(25),
+        ]
+
+    def test_start_times_and_duration(self):
+        timeline = self.timeline_manager.concatenate(self.clips)
+
+        self.assertEqual(timeline.start_times, [0, 1.0, 1.5])
+        self.assertEqual(timeline.duration, 3.5)
+        self.assertEqual(timeline.size, (32, 16))
+        self.assertEqual(timeline.fps, 25)
+
+    def test_frames_at_and_just_before_each_boundary(self):
+        released = []
+        timeline = self.timeline_manager.concatenate(self.clips, release=released.append)
+
+        for t, channel in ((0, 0), (0.999, 0), (1.0, 1), (1.499, 1), (1.5, 2), (3.499, 2)):
+            frame = timeline.get_frame(t)
+            self.assertEqual(list(frame[8, 16]), [255 if i == channel else 0 for i in range(3)], t)
+        # A clip is released once the frames have moved on to the next one
+        self.assertEqual(released, [0, 1])
+
+    def test_mask_is_opaque_for_clips_without_one(self):
+        faded = self.clips[1].add_mask()
+        faded.mask = faded.mask.fl_image(lambda frame: 0.5 * frame)
+        timeline = self.timeline_manager.concatenate([self.clips[0], faded, self.clips[2]])
+
+        self.assertEqual(timeline.mask.get_frame(0.5)[8, 16], 1)
+        self.assertEqual(timeline.mask.get_frame(1.2)[8, 16], 0.5)
+        self.assertEqual(timeline.mask.get_frame(2.0)[8, 16], 1)
+        self.assertIsNone(self.timeline_manager.concatenate(self.clips).mask)
+
+    def test_audio_with_a_silent_clip_and_mixed_channels(self):
+        mono = AudioClip(lambda t: 0.25 * np.ones_like(t), duration=1.0, fps=44100)
+        stereo = AudioClip(lambda t: np.array([0.5 * np.ones_like(t), -0.5 * np.ones_like(t)]).T,
+                           duration=2.0, fps=22050)
+        clips = [self.clips[0].set_audio(mono), self.clips[1], self.clips[2].set_audio(stereo)]
+        timeline = self.timeline_manager.concatenate(clips)
+
+        self.assertEqual(timeline.audio.nchannels, 2)
+        self.assertEqual(timeline.audio.fps, 44100)
+        samples = timeline.audio.get_frame(np.array([0.5, 0.999, 1.0, 1.499, 1.5, 3.4]))
+        self.assertEqual(samples.shape, (6, 2))
+        # The mono clip plays on both channels, the clip without audio is silent
+        np.testing.assert_allclose(samples, [[0.25, 0.25], [0.25, 0.25], [0, 0], [0, 0], [0.5, -0.5], [0.5, -0.5]])
+        np.testing.assert_allclose(timeline.audio.get_frame(1.2), [0, 0])
+
+    def test_no_audio_when_no_clip_has_any(self):
+        self.assertIsNone(self.timeline_manager.concatenate(self.clips).audio)
+
+
+if __name__ == '__main__':
+    unittest.main()
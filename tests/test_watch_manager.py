@@ -0,0 +1,90 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from code.watch_manager import WatchManager
+
+CONFIG = """
+Sprint: Watch
+Project: Watch
+Videos:
+  - type: opening
+    video: intro.mp4
+  - video: demo.mp4
+    description: {description}
+  - type: closing
+    video: intro.mp4
+"""
+
+
+class TestWatchManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config_file_path = os.path.join(self.tmp_dir.name, "config.yml")
+        self._write_config("First")
+        self.watch_manager = WatchManager({'dir': self.tmp_dir.name, 'config': "config.yml", 'jobs': 2},
+                                          mode=WatchManager.POLL, poll_interval=0.05, debounce=0.2)
+
+    def tearDown(self):
+        if self.watch_manager.executor is not None:
+            self.watch_manager.executor.shutdown()
+        self.tmp_dir.cleanup()
+
+    def _write_config(self, description):
+        with open(self.config_file_path, 'w') as config_file:
+            config_file.write(CONFIG.format(description=description))
+
+    def test_burst_of_writes_is_one_change(self):
+        snapshot = self.watch_manager.snapshot([self.config_file_path])
+
+        def edit():
+            for i in range(4):
+                time.sleep(0.1)
+                self._write_config(f"Edit {i}")
+        thread = threading.Thread(target=edit)
+        thread.start()
+        snapshot, changed = self.watch_manager.wait(snapshot)
+        waited_after = thread.is_alive()
+        thread.join()
+
+        self.assertEqual(changed, [self.config_file_path])
+        self.assertFalse(waited_after)
+        self.assertEqual(snapshot, self.watch_manager.snapshot([self.config_file_path]))
+
+    def test_edit_during_build_triggers_the_next_build(self):
+        descriptions = []
+
+        def build():
+            self.watch_manager.video_data = self.watch_manager.load()
+            descriptions.append(self.watch_manager.video_data.videos[1]['description'])
+            # Saved while the build runs
+            if len(descriptions) == 1:
+                self._write_config("Saved during the build")
+        self.watch_manager.build = build
+
+        snapshot = self.watch_manager.snapshot(self.watch_manager.get_file_paths())
+        self._write_config("Second")
+        snapshot = self.watch_manager.rebuild(snapshot)
+        self.assertNotEqual(snapshot, self.watch_manager.snapshot(list(snapshot)))
+        self.watch_manager.rebuild(snapshot)
+
+        self.assertEqual(descriptions, ["Second", "Saved during the build"])
+
+    def test_reload_keeps_the_worker_pool(self):
+        first = self.watch_manager.video_data = self.watch_manager.load()
+        self._write_config("Second")
+        second = self.watch_manager.load()
+
+        self.assertEqual(second.videos[1]['description'], "Second")
+        self.assertIs(second.segment_render_manager.executor, first.segment_render_manager.executor)
+        self.assertIs(second.cache_manager.fingerprints, first.cache_manager.fingerprints)
+        self.watch_manager.video_data = second
+        self.assertEqual(self.watch_manager.get_file_paths(),
+                         [self.config_file_path] + [os.path.join(self.tmp_dir.name, name)
+                                                    for name in ("intro.mp4", "demo.mp4")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,40 +1,102 @@
 import io
 import os
+import tempfile
+import threading
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import Mock
 
-import requests
+import numpy as np
 from PIL import Image
+from moviepy.editor import ColorClip, CompositeVideoClip, ImageClip
 
-from code.watermark_manager import WatermarkManager
+from code.watermark_manager import WatermarkManager, resolve_position
 
 
-class TestWatermarkManager(unittest.TestCase):
-    def setUp(self):
-        self.config_manager = Mock()
-        mock_response = Mock()
-        # Create mock image and assign to response
+class PngHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
         image = Image.new('RGB', (50, 50))
         img_byte_arr = io.BytesIO()
         image.save(img_byte_arr, format='PNG')
-        img_byte_arr = img_byte_arr.getvalue()
-        mock_response.content = img_byte_arr
-        #
-        self.get_patcher = unittest.mock.patch.object(requests, 'get', return_value=mock_response)
-        self.get_patcher.start()
+        self.send_response(200)
+        self.send_header('ETag', '"black-50"')
+        self.end_headers()
+        self.wfile.write(img_byte_arr.getvalue())
+
+    def log_message(self, *args):
+        pass
+
+
+class TestWatermarkManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), PngHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.config_manager = Mock()
+        self.config_manager.watermark = {'url': f"http://127.0.0.1:{self.server.server_address[1]}/watermark.png"}
+        self.config_manager.asset_cache_dir = self.tmp_dir.name
+        self.config_manager.asset_max_age = 3600
         self.watermark_manager = WatermarkManager(self.config_manager)
 
     def tearDown(self):  # This method gets called after each test
-        self.get_patcher.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
 
     def test_load_watermark_from_path(self):
         pass
 
     def test_load_watermark_from_url(self):
-        pass
+        self.assertEqual(self.watermark_manager.watermark.shape, (50, 50, 3))
 
     def test_embed_with_watermark(self):
-        pass
+        self.config_manager.watermark = {'position': ("right", "top"), 'height-ratio': 0.2}
+        self.watermark_manager.watermark = np.full((10, 20, 3), 200, dtype=np.uint8)
+        clip = ColorClip((100, 50), color=(10, 20, 30), duration=2)
+
+        frame = self.watermark_manager.embed(clip).get_frame(1)
+
+        self.assertEqual(frame.shape, (50, 100, 3))
+        self.assertTrue((frame[:10, 80:] == 200).all())
+        self.assertEqual(tuple(frame[10, 80]), (10, 20, 30))
+        self.assertEqual(tuple(frame[0, 79]), (10, 20, 30))
+        # The source frame is left untouched
+        self.assertEqual(tuple(clip.get_frame(1)[0, 99]), (10, 20, 30))
+
+    def test_embed_matches_composite(self):
+        self.config_manager.watermark = {'position': ("center", "bottom"), 'height-ratio': 0.3}
+        rgba = np.zeros((20, 20, 4), dtype=np.uint8)
+        rgba[:, :, 0] = 255
+        rgba[5:15, 5:15, 3] = 255
+        self.watermark_manager.watermark = rgba
+        clip = ColorClip((64, 40), color=(0, 0, 255), duration=1)
+
+        watermark = ImageClip(rgba, duration=1).resize(height=12).set_position(("center", "bottom"))
+        expected = CompositeVideoClip([clip, watermark]).get_frame(0)
+
+        self.assertEqual(self.watermark_manager.embed(clip).get_frame(0).tolist(), expected.tolist())
+
+    def test_embed_rounds_the_blend(self):
+        self.config_manager.watermark = {'position': (0, 0), 'height-ratio': 0.5}
+        rgba = np.zeros((20, 20, 4), dtype=np.uint8)
+        rgba[:, :, 0] = 101
+        rgba[:, :, 3] = 128
+        self.watermark_manager.watermark = rgba
+        clip = ColorClip((64, 40), color=(0, 0, 200), duration=1)
+
+        frame = self.watermark_manager.embed(clip).get_frame(0)
+
+        # 101 * 128 / 255 = 50.7 and 200 * 127 / 255 = 99.6
+        self.assertEqual(tuple(frame[10, 10]), (51, 0, 100))
+        self.assertEqual(tuple(frame[10, 30]), (0, 0, 200))
+
+    def test_resolve_position(self):
+        # Both backends place their layers with it
+        self.assertEqual(resolve_position(("right", "top"), (100, 50), (20, 10)), (80, 0))
+        self.assertEqual(resolve_position("center", (100, 50), (21, 11)), (39, 19))
+        self.assertEqual(resolve_position("bottom", (100, 50), (20, 10)), (40, 40))
+        self.assertEqual(resolve_position(("left", 7.6), (100, 50), (20, 10)), (0, 7))
 
     def test_embed_without_watermark(self):
         mock_clip = Mock()
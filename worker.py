@@ -0,0 +1,45 @@
+import argparse
+import os
+
+from code.job_queue_manager import JobQueueManager
+from code.video_stitch import VideoData
+
+# One VideoData per project, set up again when its config changes
+_video_data = {}
+
+
+def run_job(payload):
+    options = payload['options']
+    config_file_path = os.path.join(options['dir'], options['config'])
+    key = (tuple(sorted(options.items())), os.path.getmtime(config_file_path))
+    if key not in _video_data:
+        video_data = VideoData(**options)
+        video_data.get_max_video_size()
+        _video_data[key] = video_data
+    return _video_data[key].run_job(payload)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Render jobs queued with main.py -emit-jobs")
+
+    parser.add_argument('-queue', required=True, metavar='queue', type=str,
+                        help='the queue directory, shared by every worker')
+    parser.add_argument('-worker-id', metavar='worker_id', type=str,
+                        help='name of this worker in the claims (defaults to host and pid)')
+    parser.add_argument('-poll', metavar='poll', type=float, default=1,
+                        help='seconds between looking for jobs while other workers are busy')
+    parser.add_argument('-heartbeat', metavar='heartbeat', type=float, default=5,
+                        help='seconds between heartbeats on a claimed job')
+    parser.add_argument('-stale-after', metavar='stale_after', type=float, default=60,
+                        help='seconds without a heartbeat before a claimed job is taken over')
+    parser.add_argument('-attempts', metavar='attempts', type=int, default=3,
+                        help='attempts per job before it is failed')
+    parser.add_argument('-wait', action='store_true',
+                        help='keep waiting for new jobs once the queue is empty')
+    args = parser.parse_args()
+
+    job_queue_manager = JobQueueManager(args.queue, heartbeat_interval=args.heartbeat, stale_after=args.stale_after,
+                                        max_attempts=args.attempts)
+    counts = job_queue_manager.work(run_job, worker_id=args.worker_id, poll_interval=args.poll, wait=args.wait)
+    print(f"Worker done: {counts[JobQueueManager.DONE]} jobs done, {counts[JobQueueManager.FAILED]} failed")
+    job_queue_manager.print_stats()